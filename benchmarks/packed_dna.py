@@ -0,0 +1,96 @@
+"""Memory and throughput benchmark of packed DNA data matrices compared to the byte (S1) layout.
+
+For each MSA, the memory of the data matrix and the run time of the feature computation, the column entropies, and
+the pairwise distances are reported for the byte layout and for the 2-bit and 4-bit packed layouts.
+
+Usage:
+    python -m benchmarks.packed_dna [msa_file ...] [--taxa 200] [--sites 200000] [--gaps 0.0 0.005 0.2]
+
+Without MSA files, random DNA matrices of the given size with the given proportions of gaps are used.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from predict.custom_types import DataType
+from predict.msa import MSA
+
+
+def _random_msa(n_taxa: int, n_sites: int, gap_proportion: float, seed: int) -> MSA:
+    rng = np.random.default_rng(seed)
+    codes = np.frombuffer(b"ACGT", dtype=np.uint8)[
+        rng.integers(0, 4, (n_taxa, n_sites))
+    ]
+    codes[rng.random((n_taxa, n_sites)) < gap_proportion] = ord("-")
+    taxa = np.array([f"taxon{i}" for i in range(n_taxa)])
+    return MSA(taxa, codes, DataType.DNA, f"random (gaps={gap_proportion})")
+
+
+def _timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def benchmark(msa: MSA, n_distance_taxa: int) -> None:
+    n_chars = msa.n_taxa * msa.n_sites
+    print(f"{msa.name}: {msa.n_taxa} taxa x {msa.n_sites} sites")
+    print(
+        f"  {'layout':<8}{'MB':>10}{'pack s':>10}{'features s':>12}{'MB/s':>10}"
+        f"{'entropy s':>11}{'distances s':>13}"
+    )
+
+    # the distances are computed for a subset of the taxa to keep the quadratic part short
+    distance_taxa = min(msa.n_taxa, n_distance_taxa)
+    codes = msa.codes
+    for bits in (None, 2, 4):
+        layout = MSA(msa.taxa, codes, msa.data_type, msa.name)
+        subset = MSA(
+            msa.taxa[:distance_taxa], codes[:distance_taxa], msa.data_type, msa.name
+        )
+        pack_time = 0.0
+        if bits is not None:
+            pack_time = _timed(lambda: layout.pack(bits))
+            subset.pack(bits)
+        nbytes = layout.packed.nbytes if bits is not None else layout.codes.nbytes
+
+        features_time = _timed(layout.compute_features)
+        entropy_time = _timed(layout.column_entropy)
+        distances_time = _timed(subset.pairwise_distances)
+        print(
+            f"  {'S1' if bits is None else f'{bits}-bit':<8}{nbytes / 2**20:>10.1f}{pack_time:>10.2f}"
+            f"{features_time:>12.2f}{n_chars / features_time / 2**20:>10.1f}"
+            f"{entropy_time:>11.2f}{distances_time:>13.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("msa_files", nargs="*", help="DNA MSA files to benchmark")
+    parser.add_argument("--taxa", type=int, default=200)
+    parser.add_argument("--sites", type=int, default=200_000)
+    parser.add_argument("--gaps", type=float, nargs="+", default=[0.0, 0.005, 0.2])
+    parser.add_argument(
+        "--distance-taxa",
+        type=int,
+        default=200,
+        help="number of taxa to compute the pairwise distances for",
+    )
+    args = parser.parse_args()
+
+    if args.msa_files:
+        msas = [MSA(msa_file, cache_dir=None) for msa_file in args.msa_files]
+    else:
+        msas = [
+            _random_msa(args.taxa, args.sites, gaps, seed=i)
+            for i, gaps in enumerate(args.gaps)
+        ]
+
+    for msa in msas:
+        benchmark(msa, args.distance_taxa)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import io
+import pathlib
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.msa_cache import _CACHE_VERSION, _write_cache_file
+from predict.sites import (
+    GAP_ORD,
+    _SiteSummary,
+    _count_chars,
+    _fingerprint_sites,
+    _get_alphabet,
+    _reduce_state_masks,
+    _site_entropies,
+    _unique_fingerprints,
+)
+
+
+class _FeatureAccumulators:
+    # Per-site intermediates of all features that can be updated when sequences or sites are appended to an MSA.
+    # The patterns are kept as a table of the unique site fingerprints (in no particular order) and the number of sites
+    # of each pattern. All arrays are views of larger buffers that grow geometrically like the data matrix (see
+    # MSA._resize_codes), and the patterns of new sites are looked up in a dictionary of the table, so the amortized
+    # cost of appending sites is proportional to the number of new sites.
+    SITE_ARRAYS = ("site_counts", "site_masks", "site_fingerprints", "entropies")
+    PATTERN_ARRAYS = ("pattern_fingerprints", "pattern_weights")
+
+    def __init__(
+        self,
+        alphabet: npt.NDArray[np.uint8],
+        site_counts: npt.NDArray[np.int32],
+        site_masks: npt.NDArray,
+        site_fingerprints: npt.NDArray[np.uint64],
+        entropies: npt.NDArray[np.float64],
+        pattern_fingerprints: npt.NDArray[np.uint64],
+        pattern_weights: npt.NDArray[np.int64],
+    ):
+        self.alphabet = alphabet
+        self.n_sites = site_counts.shape[0]
+        self.n_patterns = pattern_weights.shape[0]
+        self._buffers = {
+            "site_counts": site_counts,
+            "site_masks": site_masks,
+            "site_fingerprints": site_fingerprints,
+            "entropies": entropies,
+            "pattern_fingerprints": pattern_fingerprints,
+            "pattern_weights": pattern_weights,
+        }
+        # maps the fingerprint of each pattern to its row in the pattern table, built on demand
+        self._pattern_index = None
+
+    @property
+    def site_counts(self) -> npt.NDArray[np.int32]:
+        return self._buffers["site_counts"][: self.n_sites]
+
+    @property
+    def site_masks(self) -> npt.NDArray:
+        return self._buffers["site_masks"][: self.n_sites]
+
+    @property
+    def site_fingerprints(self) -> npt.NDArray[np.uint64]:
+        return self._buffers["site_fingerprints"][: self.n_sites]
+
+    @property
+    def entropies(self) -> npt.NDArray[np.float64]:
+        return self._buffers["entropies"][: self.n_sites]
+
+    @property
+    def pattern_fingerprints(self) -> npt.NDArray[np.uint64]:
+        return self._buffers["pattern_fingerprints"][: self.n_patterns]
+
+    @property
+    def pattern_weights(self) -> npt.NDArray[np.int64]:
+        return self._buffers["pattern_weights"][: self.n_patterns]
+
+    def arrays(self) -> dict[str, npt.NDArray]:
+        # the accumulators without the unused capacity of the buffers
+        return {
+            "alphabet": self.alphabet,
+            **{name: getattr(self, name) for name in self.SITE_ARRAYS},
+            **{name: getattr(self, name) for name in self.PATTERN_ARRAYS},
+        }
+
+    def summary(self) -> _SiteSummary:
+        gap_columns = self.alphabet == GAP_ORD
+        return _SiteSummary(
+            pattern_fingerprints=self.pattern_fingerprints,
+            pattern_weights=self.pattern_weights,
+            gap_counts=self.site_counts[:, gap_columns].sum(axis=1, dtype=np.int64),
+            invariant=self.site_masks != 0,
+            entropies=self.entropies,
+        )
+
+    def extend_alphabet(self, sequences: npt.NDArray[np.uint8]) -> None:
+        # adds the characters of sequences that are not in the alphabet yet as new (zero) count columns
+        alphabet = np.union1d(self.alphabet, _get_alphabet(sequences))
+        if alphabet.shape[0] == self.alphabet.shape[0]:
+            return
+        buffer = self._buffers["site_counts"]
+        site_counts = np.zeros((buffer.shape[0], alphabet.shape[0]), np.int32)
+        site_counts[:, np.searchsorted(alphabet, self.alphabet)] = buffer
+        self.alphabet, self._buffers["site_counts"] = alphabet, site_counts
+
+    def _append(self, name: str, size: int, values: npt.NDArray) -> None:
+        # writes values after the first size rows of the buffer, which grows by a factor of 1.5 if it is full
+        buffer = self._buffers[name]
+        if size + values.shape[0] > buffer.shape[0]:
+            capacity = max(size + values.shape[0], int(buffer.shape[0] * 1.5))
+            grown = np.empty((capacity, *buffer.shape[1:]), dtype=buffer.dtype)
+            grown[:size] = buffer[:size]
+            self._buffers[name] = buffer = grown
+        buffer[size : size + values.shape[0]] = values
+
+    def append_sites(
+        self, sequences: npt.NDArray[np.uint8], state_masks: npt.NDArray
+    ) -> None:
+        # the per-site intermediates are computed for the new sites only, and their patterns are merged into the table
+        site_fingerprints = self.append_site_intermediates(sequences, state_masks)
+        fingerprints, _, _, weights = _unique_fingerprints(site_fingerprints)
+        if self._pattern_index is None:
+            self._pattern_index = {
+                key: row
+                for row, key in enumerate(
+                    map(tuple, self.pattern_fingerprints.tolist())
+                )
+            }
+        rows = np.array(
+            [
+                self._pattern_index.get(key, -1)
+                for key in map(tuple, fingerprints.tolist())
+            ],
+            dtype=np.intp,
+        )
+        self.pattern_weights[rows[rows >= 0]] += weights[rows >= 0]
+
+        is_new = rows < 0
+        for row, key in enumerate(
+            map(tuple, fingerprints[is_new].tolist()), self.n_patterns
+        ):
+            self._pattern_index[key] = row
+        self._append("pattern_fingerprints", self.n_patterns, fingerprints[is_new])
+        self._append("pattern_weights", self.n_patterns, weights[is_new])
+        self.n_patterns += int(np.count_nonzero(is_new))
+
+    def append_site_intermediates(
+        self, sequences: npt.NDArray[np.uint8], state_masks: npt.NDArray
+    ) -> npt.NDArray[np.uint64]:
+        # appends the per-site intermediates of new sites without updating the pattern table, see rebuild_patterns,
+        # and returns the fingerprints of the new sites
+        self.extend_alphabet(sequences)
+        site_counts = _count_chars(sequences, self.alphabet).astype(np.int32)
+        site_fingerprints = _fingerprint_sites(sequences)
+        for name, values in (
+            ("site_counts", site_counts),
+            ("site_masks", _reduce_state_masks(sequences, state_masks)),
+            ("site_fingerprints", site_fingerprints),
+            ("entropies", _site_entropies(site_counts, self.alphabet)),
+        ):
+            self._append(name, self.n_sites, values)
+        self.n_sites += sequences.shape[1]
+        return site_fingerprints
+
+    def rebuild_patterns(self) -> None:
+        # rebuilds the pattern table from the fingerprints of all sites
+        fingerprints, _, _, weights = _unique_fingerprints(self.site_fingerprints)
+        self._buffers["pattern_fingerprints"] = fingerprints
+        self._buffers["pattern_weights"] = weights
+        self.n_patterns = weights.shape[0]
+        self._pattern_index = None
+
+    def append_sequences(
+        self, sequences: npt.NDArray[np.uint8], state_masks: npt.NDArray
+    ) -> None:
+        # all sites change, but each site is only updated by the characters of the new sequences
+        self.extend_alphabet(sequences)
+        char_index = np.zeros(256, dtype=np.intp)
+        char_index[self.alphabet] = np.arange(self.alphabet.shape[0])
+        sites = np.arange(self.n_sites)
+
+        site_counts, site_masks = self.site_counts, self.site_masks
+        for seq in sequences:
+            site_counts[sites, char_index[seq]] += 1
+            site_masks &= state_masks[seq]
+
+        self.site_fingerprints[:] = _fingerprint_sites(
+            sequences, self.site_fingerprints
+        )
+        self.entropies[:] = _site_entropies(site_counts, self.alphabet)
+        self.rebuild_patterns()
+
+
+def _build_feature_accumulators(
+    get_codes: Callable[[int, int], npt.NDArray[np.uint8]],
+    n_sites: int,
+    alphabet: npt.NDArray[np.uint8],
+    state_masks: npt.NDArray,
+    block_size: int,
+) -> _FeatureAccumulators:
+    # builds the accumulators of all sites in a single pass over blocks of sites, the pattern table is built at once
+    accumulators = _FeatureAccumulators(
+        alphabet=alphabet,
+        site_counts=np.zeros((0, alphabet.shape[0]), dtype=np.int32),
+        site_masks=np.zeros(0, dtype=state_masks.dtype),
+        site_fingerprints=np.zeros((0, 2), dtype=np.uint64),
+        entropies=np.zeros(0),
+        pattern_fingerprints=np.zeros((0, 2), dtype=np.uint64),
+        pattern_weights=np.zeros(0, dtype=np.int64),
+    )
+    for start in range(0, n_sites, block_size):
+        accumulators.append_site_intermediates(
+            get_codes(start, start + block_size), state_masks
+        )
+    accumulators.rebuild_patterns()
+    return accumulators
+
+
+def _get_accumulator_file(cache_file: pathlib.Path) -> pathlib.Path:
+    # the accumulators are stored next to the cache file of the MSA
+    return cache_file.with_suffix(".acc")
+
+
+def _write_accumulators(
+    accumulator_file: pathlib.Path,
+    accumulators: _FeatureAccumulators,
+    n_taxa: int,
+    cache_file: pathlib.Path,
+) -> None:
+    # the accumulators are stored with the cache version, the number of taxa, and the key of the cache file they belong
+    # to, so that _read_accumulators can reject accumulators of another MSA
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        version=_CACHE_VERSION,
+        n_taxa=n_taxa,
+        cache_key=cache_file.stem,
+        **accumulators.arrays(),
+    )
+    _write_cache_file(accumulator_file, [buffer.getvalue()])
+
+
+def _read_accumulators(
+    accumulator_file: pathlib.Path, n_taxa: int, n_sites: int, cache_file: pathlib.Path
+) -> Optional[_FeatureAccumulators]:
+    # Returns the accumulators stored in the given file, or None if the file does not exist, was written by another
+    # cache version, or does not match the cache file, the number of taxa, or the number of sites.
+    try:
+        with np.load(accumulator_file) as arrays:
+            if (
+                int(arrays["version"]) != _CACHE_VERSION
+                or int(arrays["n_taxa"]) != n_taxa
+                or str(arrays["cache_key"]) != cache_file.stem
+            ):
+                return None
+            accumulators = _FeatureAccumulators(
+                alphabet=arrays["alphabet"],
+                **{
+                    name: arrays[name]
+                    for name in _FeatureAccumulators.SITE_ARRAYS
+                    + _FeatureAccumulators.PATTERN_ARRAYS
+                },
+            )
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    site_arrays = [getattr(accumulators, name) for name in accumulators.SITE_ARRAYS]
+    if any(array.shape[0] != n_sites for array in site_arrays):
+        return None
+    return accumulators
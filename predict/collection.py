@@ -0,0 +1,284 @@
+import functools
+import glob
+import io
+import json
+import math
+import multiprocessing
+import pathlib
+from typing import Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+from predict.custom_types import DataType, FileFormat
+from predict.msa import MSAFeatures, parse_msa
+
+
+class MSAFeaturesResult(NamedTuple):
+    """Result of the feature computation for a single MSA of an `MSACollection`.
+
+    Attributes:
+        msa_file (str): Path to the MSA file
+        data_type (DataType): Data type of the MSA. None if the MSA could not be parsed.
+        features (MSAFeatures): Features of the MSA. None if parsing the MSA or computing the features failed.
+        error (str): Error message if parsing the MSA or computing the features failed, None otherwise.
+        column_entropies (npt.NDArray): Column entropies of the MSA, see `MSA.column_entropy`.
+            Only set if requested and the computation succeeded.
+        treelikeness (float): Treelikeness of the MSA, see `MSA.treelikeness_score`. Only set if requested, the
+            computation succeeded, and the MSA has at least four taxa.
+    """
+
+    msa_file: str
+    data_type: Optional[DataType]
+    features: Optional[MSAFeatures]
+    error: Optional[str]
+    column_entropies: Optional[npt.NDArray[np.float32]] = None
+    treelikeness: Optional[float] = None
+
+
+def _compute_collection_features(
+    indexed_msa_file: tuple[int, str],
+    file_format: Optional[FileFormat],
+    data_type: Optional[DataType],
+    memory_budget: Optional[int],
+    cache_dir: Optional[pathlib.Path],
+    timings: bool,
+    column_entropies: bool,
+    treelikeness: bool,
+) -> tuple[int, MSAFeaturesResult]:
+    # Computes the features of a single MSA of an MSACollection, possibly in a worker process.
+    # Any error is reported as part of the result so that a single invalid MSA does not abort the batch.
+    index, msa_file = indexed_msa_file
+    try:
+        msa = parse_msa(
+            pathlib.Path(msa_file),
+            file_format=file_format,
+            data_type=data_type,
+            memory_budget=memory_budget,
+            cache_dir=cache_dir,
+        )
+        features = msa.compute_features(timings=timings)
+        entropies = msa.column_entropy() if column_entropies else None
+        # the treelikeness is computed in the worker process, so a single thread is used per MSA
+        treelikeness_score = (
+            msa.treelikeness_score(n_threads=1, seed=0)
+            if treelikeness and msa.n_taxa >= 4
+            else None
+        )
+    except Exception as e:
+        return index, MSAFeaturesResult(
+            msa_file, None, None, f"{type(e).__name__}: {e}"
+        )
+    return index, MSAFeaturesResult(
+        msa_file, msa.data_type, features, None, entropies, treelikeness_score
+    )
+
+
+# columns of the MSACollection feature table: MSAFeatures attribute, dtype, value for failed MSAs
+# fmt: off
+_FEATURE_COLUMNS = [
+    ("n_taxa",                  np.int64,   -1),
+    ("n_sites",                 np.int64,   -1),
+    ("n_patterns",              np.int64,   -1),
+    ("proportion_gaps",         np.float64, np.nan),
+    ("proportion_invariant",    np.float64, np.nan),
+    ("entropy",                 np.float64, np.nan),
+    ("pattern_entropy",         np.float64, np.nan),
+    ("bollback",                np.float64, np.nan),
+]
+# fmt: on
+
+
+class MSACollection:
+    """Collection of MSA files for computing the features of many MSAs in a single process pool.
+
+    The MSAs are parsed and processed by a pool of worker processes, each handling one MSA at a time. Only the features
+    are sent back to the calling process, so the memory usage is bounded by the number of workers times the size of the
+    largest MSA (or the memory budget).
+
+    Args:
+        msa_files (str | list[pathlib.Path]): List of paths to MSA files, or a glob pattern (e.g. `data/**/*.phy`).
+        file_format (FileFormat): File format of the MSAs. Defaults to None. In this case, the format of each MSA is
+            inferred from its file.
+        data_type (DataType): Data type of the MSAs. Defaults to None. In this case, the data type of each MSA is
+            inferred from its characters.
+        memory_budget (int): Approximate number of bytes available per MSA, see `MSA`. Defaults to None (no limit).
+        cache_dir (pathlib.Path): Directory of the binary MSA cache, see `parse_msa`. Defaults to None (no cache).
+        n_workers (int): Number of worker processes. Defaults to None. In this case, all MSAs are processed in the
+            calling process. Set to -1 to use all available CPUs.
+
+    Attributes:
+        msa_files (list[str]): Paths to the MSA files in the order of the input (sorted for glob patterns)
+
+    Raises:
+        PyPythiaException: If the glob pattern does not match any file.
+    """
+
+    def __init__(
+        self,
+        msa_files: Union[str, list[Union[str, pathlib.Path]]],
+        file_format: Optional[FileFormat] = None,
+        data_type: Optional[DataType] = None,
+        memory_budget: Optional[int] = None,
+        cache_dir: Optional[Union[str, pathlib.Path]] = None,
+        n_workers: Optional[int] = None,
+    ):
+        if isinstance(msa_files, str):
+            pattern = msa_files
+            msa_files = sorted(glob.glob(pattern, recursive=True))
+            if not msa_files:
+                raise PyPythiaException(f"No MSA files found matching {pattern}.")
+
+        self.msa_files = [str(msa_file) for msa_file in msa_files]
+        self.file_format = file_format
+        self.data_type = data_type
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.n_workers = multiprocessing.cpu_count() if n_workers == -1 else n_workers
+
+    def __len__(self) -> int:
+        return len(self.msa_files)
+
+    def _iter_indexed_results(
+        self, timings: bool, column_entropies: bool = False, treelikeness: bool = False
+    ) -> Iterator[tuple[int, MSAFeaturesResult]]:
+        compute = functools.partial(
+            _compute_collection_features,
+            file_format=self.file_format,
+            data_type=self.data_type,
+            memory_budget=self.memory_budget,
+            cache_dir=self.cache_dir,
+            timings=timings,
+            column_entropies=column_entropies,
+            treelikeness=treelikeness,
+        )
+        indexed_msa_files = list(enumerate(self.msa_files))
+
+        if self.n_workers is None or self.n_workers <= 1 or len(self) <= 1:
+            yield from map(compute, indexed_msa_files)
+            return
+
+        with multiprocessing.Pool(min(self.n_workers, len(self))) as pool:
+            # MSAs differ widely in size, so they are distributed one at a time
+            yield from pool.imap_unordered(compute, indexed_msa_files)
+
+    def iter_features(
+        self,
+        timings: bool = False,
+        column_entropies: bool = False,
+        treelikeness: bool = False,
+    ) -> Iterator[MSAFeaturesResult]:
+        """Computes the features of all MSAs and yields the results as soon as they are available.
+
+        The results are yielded in the order of completion, which differs from the order of `msa_files` if multiple
+        workers are used. Use `MSAFeaturesResult.msa_file` to identify the MSA of a result.
+
+        Args:
+            timings (bool): Whether to measure the time spent on each feature. Defaults to False.
+            column_entropies (bool): Whether to also compute the column entropies of each MSA. Defaults to False.
+            treelikeness (bool): Whether to also compute the treelikeness of each MSA with at least four taxa.
+                Defaults to False.
+
+        Yields:
+            MSAFeaturesResult object for each MSA. If parsing the MSA or computing its features failed, the features
+            are None and the error is set.
+        """
+        for _, result in self._iter_indexed_results(
+            timings, column_entropies, treelikeness
+        ):
+            yield result
+
+    def compute_features(
+        self, output_file: Optional[pathlib.Path] = None, as_dataframe: bool = True
+    ):
+        """Computes the features of all MSAs and returns them as a table.
+
+        The table contains one row per MSA in the order of `msa_files` with the columns `msa_file`, `data_type`,
+        `error`, and one column per `MSAFeatures` attribute (except for the timings). For MSAs that could not be
+        processed, the error is set, integer features are -1, and float features are NaN.
+
+        Args:
+            output_file (pathlib.Path): Optional JSON Lines file to stream the results to as soon as they are
+                available (one JSON object per MSA with the columns of the table as keys). Missing values are written
+                as null. Defaults to None.
+            as_dataframe (bool): Whether to return the table as pandas DataFrame. Defaults to True. Set to False to
+                get a dictionary mapping each column name to a numpy array, which does not require pandas.
+
+        Returns:
+            pandas DataFrame with one row per MSA, or the columnar table if `as_dataframe` is False.
+
+        Raises:
+            PyPythiaException: If `as_dataframe` is True and pandas is not installed.
+        """
+        if as_dataframe:
+            # fail before computing the features of all MSAs
+            _import_pandas()
+
+        results = [None] * len(self)
+        with (
+            open(output_file, "w") if output_file is not None else io.StringIO()
+        ) as output:
+            for index, result in self._iter_indexed_results(timings=False):
+                results[index] = result
+                output.write(json.dumps(_to_json_row(result)) + "\n")
+                output.flush()
+
+        table = {
+            "msa_file": np.array(self.msa_files, dtype=object),
+            "data_type": np.array(
+                [r.data_type.value if r.data_type else None for r in results],
+                dtype=object,
+            ),
+            "error": np.array([r.error for r in results], dtype=object),
+        }
+        for field, dtype, missing in _FEATURE_COLUMNS:
+            table[field] = np.array(
+                [
+                    getattr(r.features, field) if r.features is not None else missing
+                    for r in results
+                ],
+                dtype=dtype,
+            )
+        return to_dataframe(table) if as_dataframe else table
+
+
+def _to_json_row(result: MSAFeaturesResult) -> dict:
+    # row of the JSON Lines output of MSACollection.compute_features
+    # JSON has no NaN, so missing and undefined (NaN) feature values are written as null
+    row = {
+        "msa_file": result.msa_file,
+        "data_type": result.data_type.value if result.data_type else None,
+        "error": result.error,
+    }
+    for field, _, _ in _FEATURE_COLUMNS:
+        value = getattr(result.features, field) if result.features is not None else None
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        row[field] = value
+    return row
+
+
+def _import_pandas():
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise PyPythiaException(
+            "Converting the feature table to a DataFrame requires pandas."
+        ) from e
+    return pd
+
+
+def to_dataframe(table: dict[str, npt.NDArray]):
+    """Converts a feature table as returned by `MSACollection.compute_features(as_dataframe=False)` to a DataFrame.
+
+    Args:
+        table (dict[str, npt.NDArray]): Feature table
+
+    Returns:
+        pandas DataFrame with one row per MSA.
+
+    Raises:
+        PyPythiaException: If pandas is not installed.
+    """
+    return _import_pandas().DataFrame(table)
@@ -1,3 +1,4 @@
+import os
 import pathlib
 import shutil
 
@@ -9,4 +10,16 @@ DEFAULT_MODEL_FILE = pathlib.Path(__file__).parent / "predictors" / "latest.txt"
 
 DEFAULT_IQTREE_EXE = (
     pathlib.Path(shutil.which("iqtree2")) if shutil.which("iqtree2") else None
-)
\ No newline at end of file
+)
+
+# Directory of the binary cache of parsed MSAs. The cache is opt-in: pass this directory as `cache_dir` to use it.
+# Can be changed using the PYPYTHIA_MSA_CACHE_DIR environment variable, setting it to an empty string disables the cache.
+DEFAULT_MSA_CACHE_DIR = pathlib.Path(
+    os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache"), "pypythia", "msa"
+)
+if "PYPYTHIA_MSA_CACHE_DIR" in os.environ:
+    DEFAULT_MSA_CACHE_DIR = (
+        pathlib.Path(os.environ["PYPYTHIA_MSA_CACHE_DIR"])
+        if os.environ["PYPYTHIA_MSA_CACHE_DIR"]
+        else None
+    )
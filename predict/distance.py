@@ -0,0 +1,317 @@
+import itertools
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+
+# Number of taxa per block and number of 64-bit words (64 sites each) per chunk that are compared at once.
+# A block pair of 64 x 64 taxa and 256 words requires temporary arrays of 8 MB.
+_TAXON_BLOCK_SIZE = 64
+_WORD_CHUNK_SIZE = 256
+# approximate number of bytes of the gathered bitplanes per batch when computing the distances of a list of pairs
+_PAIR_BATCH_BYTES = 2**25
+
+# positions of the six taxon pairs (x, y), (u, v), (x, u), (y, v), (x, v), (y, u) of a quartet (x, y, u, v),
+# see delta_plot_treelikeness_from_pairs
+QUARTET_PAIRS = np.array([[0, 1], [2, 3], [0, 2], [1, 3], [0, 3], [1, 2]])
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_sum(words: npt.NDArray[np.uint64]) -> npt.NDArray[np.int64]:
+    # number of set bits summed over the last axis
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    # numpy < 2.0: count the bits of each byte using a lookup table
+    counts = _POPCOUNT_TABLE[words.view(np.uint8)]
+    return counts.reshape(*words.shape[:-1], -1).sum(axis=-1, dtype=np.int64)
+
+
+def pack_state_masks(
+    sequences: npt.NDArray[np.uint8], state_masks: npt.NDArray
+) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint64]]:
+    """Packs the state masks of all characters of an MSA into bitplanes.
+
+    For each taxon and state, bit `i` of the bitplane is set if the character at site `i` can be resolved to the
+    state. A site is determined for a taxon unless its character can be resolved to any state (e.g. gaps or `N`).
+
+    Args:
+        sequences (npt.NDArray): Data matrix of state codes
+        state_masks (npt.NDArray): Bitmask of the states each state code can be resolved to, indexed by state code
+
+    Returns:
+        The bitplanes of shape `(n_taxa, n_states, n_words)` and the bitplane of determined sites of shape
+        `(n_taxa, n_words)`, using 64 sites per word. Bits of padding sites are not set.
+    """
+    n_taxa, n_sites = sequences.shape
+    n_states = int(state_masks.max()).bit_length()
+    full_mask = (1 << n_states) - 1
+    n_words = math.ceil(n_sites / 64)
+
+    planes = np.zeros((n_taxa, n_states, n_words), dtype=np.uint64)
+    determined = np.zeros((n_taxa, n_words), dtype=np.uint64)
+    # the sites of each taxon are packed separately, so the temporary arrays are of size n_sites
+    for i, seq in enumerate(sequences):
+        masks = state_masks[seq]
+        for state in range(n_states):
+            bits = np.packbits((masks >> state) & 1, bitorder="little")
+            planes[i, state].view(np.uint8)[: bits.shape[0]] = bits
+        bits = np.packbits(masks != full_mask, bitorder="little")
+        determined[i].view(np.uint8)[: bits.shape[0]] = bits
+    return planes, determined
+
+
+def _count_mismatches(
+    a_planes: npt.NDArray[np.uint64],
+    a_determined: npt.NDArray[np.uint64],
+    b_planes: npt.NDArray[np.uint64],
+    b_determined: npt.NDArray[np.uint64],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Counts the mismatching and the comparable sites of pairs of taxa.
+
+    The bitplanes of `a` and `b` are broadcast against each other, e.g. a block of taxa of shape `(n, 1, ...)` and
+    a block of shape `(1, m, ...)` yields the counts of all `n x m` pairs. Two characters match if they can be resolved
+    to a common state. A site is comparable if it is determined for both taxa.
+
+    Returns:
+        The number of mismatching sites and the number of comparable sites of each pair.
+    """
+    shape = np.broadcast_shapes(a_determined.shape[:-1], b_determined.shape[:-1])
+    mismatches = np.zeros(shape, dtype=np.int64)
+    comparable = np.zeros(shape, dtype=np.int64)
+
+    for start in range(0, a_determined.shape[-1], _WORD_CHUNK_SIZE):
+        words = slice(start, start + _WORD_CHUNK_SIZE)
+        match = a_planes[..., 0, words] & b_planes[..., 0, words]
+        tmp = np.empty_like(match)
+        for state in range(1, a_planes.shape[-2]):
+            np.bitwise_and(
+                a_planes[..., state, words], b_planes[..., state, words], out=tmp
+            )
+            match |= tmp
+
+        valid = a_determined[..., words] & b_determined[..., words]
+        comparable += _popcount_sum(valid)
+        np.invert(match, out=match)
+        match &= valid
+        mismatches += _popcount_sum(match)
+    return mismatches, comparable
+
+
+def _distances_from_counts(
+    mismatches: npt.NDArray[np.int64],
+    comparable: npt.NDArray[np.int64],
+    n_states: int,
+    corrected: bool,
+) -> npt.NDArray[np.float64]:
+    # p-distance or Jukes-Cantor corrected distance, nan if two taxa do not share a comparable site
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distances = mismatches / comparable
+        if corrected:
+            # generalized Jukes-Cantor correction for n_states states, saturated distances are infinite
+            b = (n_states - 1) / n_states
+            distances = np.where(
+                distances < b, -b * np.log1p(-distances / b), np.inf
+            ) * np.where(comparable > 0, 1.0, np.nan)
+    return distances
+
+
+def pairwise_distances(
+    sequences: npt.NDArray[np.uint8],
+    state_masks: npt.NDArray,
+    pairs: Optional[npt.NDArray[np.intp]] = None,
+    corrected: bool = False,
+    n_threads: Optional[int] = None,
+) -> npt.NDArray[np.float64]:
+    """Computes the distances between the taxa of an MSA.
+
+    The distance between two taxa is the proportion of mismatching sites among the sites that are determined for both
+    taxa (p-distance), optionally corrected using the Jukes-Cantor model for the number of states of the data type.
+    Ambiguous characters match all characters they share a state with.
+
+    The characters are packed into bitplanes of 64 sites per word, see `pack_state_masks`, so a comparison of two
+    taxa requires a few bitwise operations and a popcount per 64 sites. All pairs are processed in blocks of taxa and
+    sites that fit into the CPU caches. The blocks are distributed across a thread pool, NumPy releases the GIL for
+    the bitwise operations.
+
+    Args:
+        sequences (npt.NDArray): Data matrix of state codes
+        state_masks (npt.NDArray): Bitmask of the states each state code can be resolved to, indexed by state code
+        pairs (npt.NDArray): Pairs of taxon indices of shape `(n_pairs, 2)` to compute the distances for.
+            Defaults to None. In this case, the distances of all pairs of taxa are computed.
+        corrected (bool): Whether to apply the Jukes-Cantor correction. Defaults to False.
+        n_threads (int): Number of threads. Defaults to None. In this case, the number of CPUs is used.
+
+    Returns:
+        The symmetric distance matrix of shape `(n_taxa, n_taxa)`, or the distance of each pair if `pairs` is given.
+        The distance is nan if two taxa do not share any determined site.
+    """
+    planes, determined = pack_state_masks(sequences, state_masks)
+    return pairwise_distances_from_planes(
+        planes, determined, pairs=pairs, corrected=corrected, n_threads=n_threads
+    )
+
+
+def pairwise_distances_from_planes(
+    planes: npt.NDArray[np.uint64],
+    determined: npt.NDArray[np.uint64],
+    pairs: Optional[npt.NDArray[np.intp]] = None,
+    corrected: bool = False,
+    n_threads: Optional[int] = None,
+) -> npt.NDArray[np.float64]:
+    """Computes the distances between the taxa of an MSA from the bitplanes of their state masks.
+
+    See `pairwise_distances` for details. The bitplanes are computed by `pack_state_masks` or, for packed DNA data,
+    by `predict.packed.PackedDNA.state_planes`.
+
+    Args:
+        planes (npt.NDArray): Bitplanes of shape `(n_taxa, n_states, n_words)`
+        determined (npt.NDArray): Bitplane of the determined sites of shape `(n_taxa, n_words)`
+        pairs (npt.NDArray): Pairs of taxon indices of shape `(n_pairs, 2)` to compute the distances for.
+            Defaults to None. In this case, the distances of all pairs of taxa are computed.
+        corrected (bool): Whether to apply the Jukes-Cantor correction for `n_states` states. Defaults to False.
+        n_threads (int): Number of threads. Defaults to None. In this case, the number of CPUs is used.
+
+    Returns:
+        The symmetric distance matrix of shape `(n_taxa, n_taxa)`, or the distance of each pair if `pairs` is given.
+    """
+    n_taxa, n_states = planes.shape[:2]
+    n_threads = n_threads or os.cpu_count() or 1
+
+    if pairs is not None:
+        pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+        mismatches = np.zeros(pairs.shape[0], dtype=np.int64)
+        comparable = np.zeros(pairs.shape[0], dtype=np.int64)
+        batch_size = max(1, _PAIR_BATCH_BYTES // (2 * planes[0].nbytes + 1))
+
+        def compute_batch(start: int) -> None:
+            batch = pairs[start : start + batch_size]
+            counts = _count_mismatches(
+                planes[batch[:, 0]],
+                determined[batch[:, 0]],
+                planes[batch[:, 1]],
+                determined[batch[:, 1]],
+            )
+            mismatches[start : start + batch_size] = counts[0]
+            comparable[start : start + batch_size] = counts[1]
+
+        tasks = range(0, pairs.shape[0], batch_size)
+    else:
+        mismatches = np.zeros((n_taxa, n_taxa), dtype=np.int64)
+        comparable = np.zeros((n_taxa, n_taxa), dtype=np.int64)
+
+        def compute_batch(block: tuple[int, int]) -> None:
+            rows = slice(block[0], block[0] + _TAXON_BLOCK_SIZE)
+            cols = slice(block[1], block[1] + _TAXON_BLOCK_SIZE)
+            counts = _count_mismatches(
+                planes[rows, np.newaxis],
+                determined[rows, np.newaxis],
+                planes[np.newaxis, cols],
+                determined[np.newaxis, cols],
+            )
+            mismatches[rows, cols], comparable[rows, cols] = counts
+            mismatches[cols, rows], comparable[cols, rows] = counts[0].T, counts[1].T
+
+        # the matrix is symmetric, so only the blocks on and above the diagonal are computed
+        starts = range(0, n_taxa, _TAXON_BLOCK_SIZE)
+        tasks = [(i, j) for i in starts for j in starts if i <= j]
+
+    if n_threads > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(n_threads) as executor:
+            # consume the results to propagate exceptions
+            list(executor.map(compute_batch, tasks))
+    else:
+        for task in tasks:
+            compute_batch(task)
+
+    # characters that cannot be resolved to any state (e.g. J or * in protein data) do not match any character,
+    # but the distance of a taxon to itself is zero
+    if pairs is not None:
+        mismatches[pairs[:, 0] == pairs[:, 1]] = 0
+    else:
+        np.fill_diagonal(mismatches, 0)
+    return _distances_from_counts(mismatches, comparable, n_states, corrected)
+
+
+def sample_quartets(
+    n_taxa: int, n_quartets: int, seed: Optional[int] = None
+) -> npt.NDArray[np.intp]:
+    """Samples quartets of distinct taxa uniformly at random.
+
+    If the number of quartets of the taxa does not exceed `n_quartets`, all quartets are returned.
+
+    Args:
+        n_taxa (int): Number of taxa
+        n_quartets (int): Number of quartets to sample
+        seed (int): Seed of the random number generator. Defaults to None.
+
+    Returns:
+        Array of shape `(n_quartets, 4)` containing the taxon indices of each quartet.
+
+    Raises:
+        PyPythiaException: If there are less than four taxa.
+    """
+    if n_taxa < 4:
+        raise PyPythiaException("At least four taxa are required to sample quartets.")
+    if math.comb(n_taxa, 4) <= n_quartets:
+        return np.array(list(itertools.combinations(range(n_taxa), 4)), dtype=np.intp)
+
+    rng = np.random.default_rng(seed)
+    quartets = np.empty((0, 4), dtype=np.intp)
+    while quartets.shape[0] < n_quartets:
+        # sample with replacement and reject quartets with repeated taxa
+        candidates = np.sort(rng.integers(0, n_taxa, size=(n_quartets, 4)), axis=1)
+        distinct = np.all(candidates[:, 1:] != candidates[:, :-1], axis=1)
+        quartets = np.concatenate([quartets, candidates[distinct]])
+    return quartets[:n_quartets]
+
+
+def delta_plot_treelikeness(
+    quartets: npt.NDArray[np.intp], distances: npt.NDArray[np.float64]
+) -> float:
+    """Computes the mean delta value of the given quartets (Holland et al., 2002).
+
+    For a quartet `(x, y, u, v)`, the sums `d(x,y) + d(u,v)`, `d(x,u) + d(y,v)`, and `d(x,v) + d(y,u)` are sorted
+    descendingly into `m1 >= m2 >= m3` and `delta = (m1 - m2) / (m1 - m3)` (zero if all sums are equal).
+    A delta of zero corresponds to perfectly tree-like data, larger values indicate conflicting signal.
+
+    Args:
+        quartets (npt.NDArray): Taxon indices of shape `(n_quartets, 4)`
+        distances (npt.NDArray): Distance matrix of shape `(n_taxa, n_taxa)`
+
+    Returns:
+        The mean delta value of all quartets with finite distances, nan if there is no such quartet.
+    """
+    pairs = quartets[:, QUARTET_PAIRS]
+    return delta_plot_treelikeness_from_pairs(distances[pairs[..., 0], pairs[..., 1]])
+
+
+def delta_plot_treelikeness_from_pairs(
+    quartet_distances: npt.NDArray[np.float64],
+) -> float:
+    """Computes the mean delta value of quartets given the distances of their taxon pairs.
+
+    See `delta_plot_treelikeness` for details. Unlike `delta_plot_treelikeness`, this does not require a distance
+    matrix of all taxa, only the distances of the six taxon pairs of each quartet.
+
+    Args:
+        quartet_distances (npt.NDArray): Distances of shape `(n_quartets, 6)`. Entry `[i, j]` is the distance of the
+            taxon pair `QUARTET_PAIRS[j]` of quartet `i`.
+
+    Returns:
+        The mean delta value of all quartets with finite distances, nan if there is no such quartet.
+    """
+    sums = quartet_distances[:, 0::2] + quartet_distances[:, 1::2]
+    sums = np.sort(sums[np.all(np.isfinite(sums), axis=1)], axis=1)
+    if sums.shape[0] == 0:
+        return np.nan
+
+    m3, m2, m1 = sums.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deltas = np.where(m1 > m3, (m1 - m2) / (m1 - m3), 0.0)
+    return float(np.mean(deltas))
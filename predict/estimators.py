@@ -0,0 +1,162 @@
+import math
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+
+class FeatureEstimate(NamedTuple):
+    """Estimate of a feature with its confidence interval.
+
+    Attributes:
+        value (float): Estimated value
+        lower (float): Lower bound of the confidence interval
+        upper (float): Upper bound of the confidence interval
+    """
+
+    value: float
+    lower: float
+    upper: float
+
+
+@dataclass
+class EstimatedMSAFeatures:
+    """Features of an MSA as estimated by `MSA.estimate_features`.
+
+    Attributes:
+        n_taxa (int): Number of taxa
+        n_sites (int): Number of sites
+        n_sampled_sites (int): Number of sites the estimates are based on
+        confidence (float): Confidence level of the confidence intervals
+        n_patterns (FeatureEstimate): Estimated number of unique patterns, see `MSA.n_patterns`.
+            None if the number of patterns was not estimated.
+        proportion_gaps (FeatureEstimate): Estimated proportion of gap characters, see `MSA.proportion_gaps`
+        proportion_invariant (FeatureEstimate): Estimated proportion of invariant sites, see `MSA.proportion_invariant`
+        entropy (FeatureEstimate): Estimated mean site entropy, see `MSA.entropy`
+    """
+
+    n_taxa: int
+    n_sites: int
+    n_sampled_sites: int
+    confidence: float
+    n_patterns: Optional[FeatureEstimate]
+    proportion_gaps: FeatureEstimate
+    proportion_invariant: FeatureEstimate
+    entropy: FeatureEstimate
+
+
+# number of index bits of the HyperLogLog sketch used to estimate the number of patterns (2^14 registers)
+_HLL_PRECISION = 14
+
+
+def _leading_zeros(values: npt.NDArray[np.uint64]) -> npt.NDArray[np.int64]:
+    # number of leading zero bits of each 64-bit value, computed on the 32-bit halves which are exact as float64
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        high_zeros = 31 - np.floor(np.log2(high))
+        low_zeros = 63 - np.floor(np.log2(low))
+    return np.where(high > 0, high_zeros, np.where(low > 0, low_zeros, 64)).astype(
+        np.int64
+    )
+
+
+def _hll_add(registers: npt.NDArray[np.uint8], hashes: npt.NDArray[np.uint64]):
+    # adds the 64-bit hashes to the HyperLogLog registers: the first bits select the register,
+    # the register keeps the maximum position of the first one bit in the remaining bits
+    precision = int(registers.shape[0]).bit_length() - 1
+    index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    rank = np.minimum(
+        _leading_zeros(hashes << np.uint64(precision)) + 1, 64 - precision + 1
+    )
+    np.maximum.at(registers, index, rank.astype(np.uint8))
+
+
+def _hll_estimate(registers: npt.NDArray[np.uint8]) -> float:
+    # HyperLogLog cardinality estimate (Flajolet et al., 2007) with linear counting for small cardinalities
+    m = registers.shape[0]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    empty_registers = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and empty_registers:
+        estimate = m * math.log(m / empty_registers)
+    return float(estimate)
+
+
+def _ratio_estimates(
+    sums: npt.NDArray[np.float64],
+    stratum_sizes: npt.NDArray[np.int64],
+    sample_sizes: npt.NDArray[np.int64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Combined ratio estimates and their standard errors for stratified sampling without replacement.
+
+    Each feature is the ratio `sum(y) / sum(x)` over all sites, e.g. the number of gaps divided by the number of
+    characters in non-full-gap sites. The variance is estimated by linearization, see Cochran, Sampling Techniques
+    (1977), Section 6.11.
+
+    Args:
+        sums (npt.NDArray): Per-stratum sums of `y, x, y^2, x^2, x*y` of the sampled sites for each feature,
+            of shape `(n_features, 5, n_strata)`
+        stratum_sizes (npt.NDArray): Number of sites in each stratum
+        sample_sizes (npt.NDArray): Number of sampled sites in each stratum
+
+    Returns:
+        The estimate and its standard error for each feature.
+    """
+    y, x, yy, xx, xy = np.moveaxis(sums, 1, 0)
+    n = np.maximum(sample_sizes, 1)
+    total_y = np.sum(stratum_sizes * y / n, axis=-1)
+    total_x = np.sum(stratum_sizes * x / n, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = total_y / total_x
+        r = ratio[:, np.newaxis]
+        # sample variance of the residuals d = y - r * x in each stratum
+        d_sum = y - r * x
+        d_square_sum = yy - 2 * r * xy + r * r * xx
+        d_variance = (d_square_sum - d_sum * d_sum / n) / np.maximum(n - 1, 1)
+        variance = np.sum(
+            stratum_sizes**2
+            * (1 - sample_sizes / stratum_sizes)
+            * np.maximum(d_variance, 0)
+            / n,
+            axis=-1,
+        )
+        standard_error = np.sqrt(variance) / np.abs(total_x)
+    return ratio, standard_error
+
+
+def _sample_new_sites(
+    rng: np.random.Generator,
+    n_sites: int,
+    sampled: npt.NDArray[np.int64],
+    size: int,
+) -> npt.NDArray[np.int64]:
+    """Draws `size` distinct random sites of `range(n_sites)` that are not in `sampled`.
+
+    As long as at most half of the sites are sampled, the sites are drawn by rejection sampling, so the cost depends
+    on the number of sampled sites rather than on `n_sites`. Otherwise, the sites are drawn from the unsampled sites.
+
+    Args:
+        rng (np.random.Generator): Random number generator
+        n_sites (int): Number of sites to sample from
+        sampled (npt.NDArray): Sorted array of the sites that are already sampled
+        size (int): Number of sites to draw, at most `n_sites - len(sampled)`
+
+    Returns:
+        The drawn sites in random order.
+    """
+    if 2 * (sampled.shape[0] + size) > n_sites:
+        unsampled = np.setdiff1d(np.arange(n_sites), sampled, assume_unique=True)
+        return rng.choice(unsampled, size, replace=False)
+
+    sites = np.empty(0, dtype=np.int64)
+    while sites.shape[0] < size:
+        candidates = np.concatenate(
+            [sites, rng.integers(0, n_sites, 2 * (size - sites.shape[0]))]
+        )
+        candidates = candidates[~np.isin(candidates, sampled)]
+        # removes duplicates but keeps the sites in the order in which they were drawn
+        _, first = np.unique(candidates, return_index=True)
+        sites = candidates[np.sort(first)]
+    return sites[:size]
@@ -1,10 +1,11 @@
 import pathlib
 import subprocess
-from tempfile import TemporaryDirectory
+import warnings
 from typing import Optional, Tuple
 
 from predict.config import DEFAULT_IQTREE_EXE
 from predict.custom_errors import IQTreeError
+from predict.rfdistance import compute_rfdistances, read_trees
 
 def run_iqtree_command(cmd: list[str]) -> None:
     """Helper method to run an IQ-TREE command.
@@ -116,23 +117,6 @@ class IQTree:
             *additional_settings,
         ]
 
-    def _run_rfdist(self, trees_file: pathlib.Path, prefix: pathlib.Path, **kwargs) -> None:
-        additional_settings = []
-        for key, value in kwargs.items():
-            if value is None:
-                additional_settings.append(f"--{key}")
-            else:
-                additional_settings.extend([f"--{key}", str(value)])
-
-        cmd = [
-            str(self.exe_path.absolute()),
-            "--rf_all",
-            "-", str(trees_file.absolute()),
-            "-pre", str(prefix.absolute()),
-            *additional_settings,
-        ]
-        run_iqtree_command(cmd)
-
     def infer_parsimony_trees(
         self,
         msa_file: pathlib.Path,
@@ -169,18 +153,22 @@ class IQTree:
         """
         Compute the number of unique topologies and relative RF-Distance.
 
+        The RF-Distances are computed in-process (see `predict.rfdistance`), IQ-TREE is not run.
+
         Args:
             trees_file (pathlib.Path): Path to the file with trees.
-            prefix (Optional[pathlib.Path]): Prefix for IQ-TREE output.
-            **kwargs: Additional flags for IQ-TREE.
+            prefix (Optional[pathlib.Path]): Deprecated and ignored, IQ-TREE does not write any output.
+            **kwargs: Deprecated and ignored, there are no IQ-TREE flags.
 
         Returns:
             Tuple[int, float]: (num_topos, rel_rfdist)
         """
-        with TemporaryDirectory() as tmpdir:
-            tmpdir = pathlib.Path(tmpdir)
-            if not prefix:
-                prefix = tmpdir / "rfdist"
-            self._run_rfdist(trees_file, prefix, **kwargs)
-            log_file = pathlib.Path(f"{prefix}.iqtree.log")
-            return get_iqtree_rfdist_results(log_file)
+        if prefix is not None or kwargs:
+            warnings.warn(
+                "The prefix and IQ-TREE flags of get_rfdistance_results are ignored since the RF-Distances are "
+                "computed in-process.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+        rfdistances = compute_rfdistances(read_trees(trees_file))
+        return rfdistances.num_topos, rfdistances.avg_rel_rfdist
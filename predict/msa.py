@@ -1,21 +1,73 @@
+import gzip
+import hashlib
+import io
 import math
+import mmap
+import multiprocessing
+import os
 import pathlib
-from collections import Counter
+import statistics
+import tempfile
+import weakref
+from dataclasses import dataclass, replace
 from functools import cached_property
-from io import StringIO
-from typing import Optional, Union
+from multiprocessing.shared_memory import SharedMemory
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Union
 
 import numpy as np
 import numpy.typing as npt
-from Bio import AlignIO, SeqIO    # đọc và ghi file sinh học
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord   
-
+from Bio import AlignIO  # đọc và ghi file sinh học
+
+from predict.accumulators import (
+    _build_feature_accumulators,
+    _FeatureAccumulators,
+    _get_accumulator_file,
+    _read_accumulators,
+    _write_accumulators,
+)
 from predict.custom_errors import PyPythiaException
 from predict.custom_types import DataType, FileFormat
+from predict.distance import (
+    QUARTET_PAIRS,
+    delta_plot_treelikeness_from_pairs,
+    pack_state_masks,
+    pairwise_distances_from_planes,
+    sample_quartets,
+)
+from predict.estimators import (
+    _HLL_PRECISION,
+    EstimatedMSAFeatures,
+    FeatureEstimate,
+    _hll_add,
+    _hll_estimate,
+    _ratio_estimates,
+    _sample_new_sites,
+)
+from predict.msa_cache import (
+    _cache_chunks,
+    _cache_metadata,
+    _get_cache_file,
+    _read_cache_file,
+    _update_cache_metadata,
+    _write_cache_file,
+)
+from predict.packed import PackedDNA
+from predict.partition import Partition, parse_partition_file
+from predict.sites import (
+    GAP_ORD,
+    _count_chars,
+    _fingerprint_sites,
+    _get_char_counts,
+    _merge_site_summaries,
+    _scatter_site_summaries,
+    _site_entropies,
+    _SiteSummary,
+    _summarize_sites,
+    _timed,
+    _unique_fingerprints,
+)
 
 GAP = b"-"
-GAP_ORD = ord(GAP)
 GAP_CHARS = [GAP, b"?", b".", b"X", b"*"]
 
 NUCLEOTIDES = [b"A", b"C", b"G", b"T", b"U"]
@@ -104,6 +156,62 @@ AA_AMBIGUITY_MAP: dict[bytes, set[int]] = {
 AA_CHARS = AMINO_ACIDS + AA_AMBIGUITY_CHARS + GAP_CHARS
 
 
+def _build_state_masks(ambiguity_map: dict[bytes, set[int]]) -> npt.NDArray:
+    # assigns one bit per state of the ambiguity map and sets the bit of a state for all characters that can
+    # represent this state
+    dtype = np.uint8 if len(ambiguity_map) <= 8 else np.uint32
+    state_masks = np.zeros(256, dtype=dtype)
+    for bit, allowed in enumerate(ambiguity_map.values()):
+        state_masks[list(allowed)] |= 1 << bit
+    return state_masks
+
+
+# These lookup tables map each ASCII ordinal to a bitmask of the states the respective character can be resolved to.
+# Each state of the respective ambiguity map corresponds to one bit, a gap character can be resolved to any state and
+# characters that are not part of the ambiguity map cannot be resolved to any state.
+# A site is invariant if the bitwise AND of the masks of all its characters is non-zero.
+# For example, for DNA data A = 0b00001, M = 0b00011 (A or C), and '-' = 0b11111.
+DNA_STATE_MASKS = _build_state_masks(DNA_AMBIGUITY_MAP)
+AA_STATE_MASKS = _build_state_masks(AA_AMBIGUITY_MAP)
+
+# Lookup table used to fold lowercase ASCII characters to uppercase directly in the uint8 data matrix.
+_UPPERCASE_LUT = np.arange(256, dtype=np.uint8)
+_UPPERCASE_LUT[ord("a") : ord("z") + 1] -= ord("a") - ord("A")
+
+
+def _build_char_table(chars: list[bytes]) -> npt.NDArray[np.bool_]:
+    # 256-entry table that is True for the ASCII ordinals of the given characters
+    table = np.zeros(256, dtype=np.bool_)
+    table[[ord(c) for c in chars]] = True
+    return table
+
+
+# Character tables used to infer the data type from a byte histogram of the MSA.
+_DIGIT_TABLE = _build_char_table([str(d).encode() for d in range(10)])
+_DNA_CHAR_TABLE = _build_char_table(DNA_CHARS)
+_AA_CHAR_TABLE = _build_char_table(AA_CHARS)
+
+
+def _get_normalization_lut(data_type: DataType) -> npt.NDArray[np.uint8]:
+    # Lookup table mapping each raw byte of an MSA file to its state code, i.e. the uppercase character with all
+    # gap characters replaced by GAP (and U replaced by T for DNA data).
+    char_mapping = {c: GAP for c in GAP_CHARS}
+    if data_type == DataType.DNA:
+        # replace all U characters with a T for convenience
+        char_mapping.update({b"U": b"T"})
+        char_mapping.update({c: GAP for c in DNA_GAP_CHARS})
+
+    lut = np.arange(256, dtype=np.uint8)
+    for old_char, new_char in char_mapping.items():
+        lut[ord(old_char)] = ord(new_char)
+    return lut[_UPPERCASE_LUT]
+
+
+_WHITESPACE = b" \t\r\n"
+_WHITESPACE_TABLE = np.zeros(256, dtype=np.bool_)
+_WHITESPACE_TABLE[list(_WHITESPACE)] = True
+
+
 def _get_file_format(msa_file: pathlib.Path) -> FileFormat:
     first_line = msa_file.open().readline().strip()
 
@@ -124,26 +232,623 @@ def _get_file_format(msa_file: pathlib.Path) -> FileFormat:
         ) from e
 
 
+def _get_block_size(n_taxa: int, memory_budget: Optional[int] = None) -> int:
+    # Number of sites per block when processing the MSA in column blocks.
+    # Processing a block requires roughly 3 bytes per character plus 128 bytes per site for temporary arrays.
+    if memory_budget is None:
+        # blocks of roughly 16 MB, but at least 65536 sites to keep the per-sequence operations vectorized
+        return max(2**16, 2**24 // max(1, n_taxa))
+    return max(1, memory_budget // (3 * n_taxa + 128))
+
+
+def _allocate_sequences(
+    n_taxa: int, n_sites: int, memory_budget: Optional[int] = None
+) -> npt.NDArray[np.uint8]:
+    """Allocates an uninitialized `n_taxa x n_sites` uint8 data matrix.
+
+    If the data matrix exceeds the memory budget, the matrix is memory-mapped to a temporary file. The file is
+    removed once the matrix is garbage collected (or when the interpreter exits). Worker processes can map the
+    same file by its name, see `_summarize_sites_parallel`. The location of the file can be controlled via the
+    TMPDIR environment variable.
+    """
+    size = n_taxa * n_sites
+    if memory_budget is None or size <= memory_budget:
+        return np.empty((n_taxa, n_sites), dtype=np.uint8)
+
+    fd, path = tempfile.mkstemp(prefix="pypythia-msa-", suffix=".tmp")
+    try:
+        sequences = np.memmap(path, dtype=np.uint8, mode="w+", shape=(n_taxa, n_sites))
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        os.close(fd)
+    # views of the matrix keep it alive, so the file is only removed once no view is left
+    weakref.finalize(sequences, _remove_file, path)
+    return sequences
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _memmap_location(
+    sequences: npt.NDArray[np.uint8],
+) -> Optional[tuple[str, int, tuple[int, int], tuple[int, int]]]:
+    # Returns the file, the byte offset of the first element, the shape, and the strides of a memory-mapped data
+    # matrix (or a view of it), or None if the data matrix is not backed by a named file.
+    root = sequences
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    if (
+        not isinstance(root, np.memmap)
+        or root.filename is None
+        or sequences.size == 0
+        or any(stride < 0 for stride in sequences.strides)
+    ):
+        return None
+    offset = root.offset + (
+        sequences.__array_interface__["data"][0] - root.__array_interface__["data"][0]
+    )
+    return root.filename, offset, sequences.shape, sequences.strides
+
+
+def _strip_bounds(buffer: mmap.mmap, start: int, end: int) -> tuple[int, int]:
+    # returns the bounds of buffer[start:end] without leading and trailing whitespace
+    while start < end and buffer[start] in _WHITESPACE:
+        start += 1
+    while end > start and buffer[end - 1] in _WHITESPACE:
+        end -= 1
+    return start, end
+
+
+def _iter_lines(buffer: mmap.mmap, start: int = 0):
+    # yields the stripped bounds of all non-empty lines in buffer starting at position start
+    size = len(buffer)
+    while start < size:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = size
+        line_start, line_end = _strip_bounds(buffer, start, end)
+        if line_start < line_end:
+            yield line_start, line_end
+        start = end + 1
+
+
+def _copy_sequence(
+    buffer: mmap.mmap, start: int, end: int, out: npt.NDArray[np.uint8]
+) -> int:
+    """Copies the raw sequence data in buffer[start:end] to out, removing whitespace.
+
+    If the sequence data does not contain whitespace, the data is read directly from the buffer without an
+    intermediate copy.
+
+    Returns:
+        The number of characters written to out or -1 if the sequence data does not fit into out.
+    """
+    if any(buffer.find(c, start, end) != -1 for c in (b" ", b"\t", b"\r", b"\n")):
+        data = buffer[start:end].translate(None, _WHITESPACE)
+        seq = np.frombuffer(data, dtype=np.uint8)
+    else:
+        seq = np.frombuffer(buffer, dtype=np.uint8, count=end - start, offset=start)
+
+    n_chars = seq.shape[0]
+    if n_chars > out.shape[0]:
+        return -1
+
+    out[:n_chars] = seq
+    return n_chars
+
+
+def _read_phylip_header(buffer: mmap.mmap, lines) -> Optional[tuple[int, int]]:
+    # returns the number of taxa and sites from the first line of PHYLIP data or None if it is not a valid header
+    try:
+        start, end = next(lines)
+        n_taxa, n_sites, *_ = buffer[start:end].split()
+        n_taxa = int(n_taxa)
+        n_sites = int(n_sites)
+    except (StopIteration, ValueError):
+        return None
+
+    if n_taxa < 1:
+        return None
+    return n_taxa, n_sites
+
+
+def _find_phylip_name_end(buffer: mmap.mmap, start: int, end: int) -> int:
+    # the taxon name ends at the first space or tab, returns -1 if the line does not contain a sequence
+    separators = [buffer.find(c, start, end) for c in (b" ", b"\t")]
+    return min((pos for pos in separators if pos != -1), default=-1)
+
+
+def _read_phylip(
+    buffer: mmap.mmap, memory_budget: Optional[int] = None
+) -> Optional[tuple[npt.NDArray, npt.NDArray[np.uint8]]]:
+    # Reads sequential or interleaved relaxed PHYLIP data.
+    # Returns None if the content does not follow this dialect.
+    lines = _iter_lines(buffer)
+    header = _read_phylip_header(buffer, lines)
+    if header is None:
+        return None
+
+    n_taxa, n_sites = header
+
+    sequences = _allocate_sequences(n_taxa, n_sites, memory_budget)
+    filled = [0] * n_taxa
+    taxa = []
+
+    for i, (start, end) in enumerate(lines):
+        row = i % n_taxa
+
+        if i < n_taxa:
+            # the first block contains the taxon name followed by whitespace and the sequence data
+            name_end = _find_phylip_name_end(buffer, start, end)
+            if name_end == -1:
+                return None
+            taxa.append(buffer[start:name_end].decode())
+            start, _ = _strip_bounds(buffer, name_end, end)
+
+        n_chars = _copy_sequence(buffer, start, end, sequences[row, filled[row] :])
+        if n_chars == -1:
+            return None
+        filled[row] += n_chars
+
+    if len(taxa) != n_taxa or any(f != n_sites for f in filled):
+        return None
+
+    return np.array(taxa), sequences
+
+
+def _read_fasta(
+    buffer: mmap.mmap, memory_budget: Optional[int] = None
+) -> Optional[tuple[npt.NDArray, npt.NDArray[np.uint8]]]:
+    # Reads FASTA data with single-line or wrapped sequences.
+    # Returns None if the content does not follow this dialect.
+    located = _locate_fasta_records(buffer)
+    if located is None:
+        return None
+
+    # second pass: the first record determines the number of sites, then copy all records into a preallocated matrix
+    taxa, records = located
+    n_sites = _count_fasta_sites(buffer, *records[0])
+    sequences = _allocate_sequences(len(records), n_sites, memory_budget)
+
+    for row, (seq_start, seq_end) in enumerate(records):
+        seq_start, seq_end = _strip_bounds(buffer, seq_start, seq_end)
+        if (
+            _copy_sequence(buffer, seq_start, seq_end, sequences[row])
+            != sequences.shape[1]
+        ):
+            return None
+
+    return np.array(taxa), sequences
+
+
+def _locate_fasta_records(
+    buffer: mmap.mmap,
+) -> Optional[tuple[list[str], list[tuple[int, int]]]]:
+    # First pass of the FASTA reader: locates all records without touching the sequence data.
+    # Returns the taxon names and the bounds of the sequence data of each record or None if the data is not FASTA.
+    start, _ = _strip_bounds(buffer, 0, len(buffer))
+    if start == len(buffer) or buffer[start] != ord(">"):
+        return None
+
+    taxa = []
+    records = []
+    while True:
+        header_end = buffer.find(b"\n", start)
+        if header_end == -1:
+            header_end = len(buffer)
+        header = buffer[start + 1 : header_end].decode().split(None, 1)
+        taxa.append(header[0] if header else "")
+
+        next_record = buffer.find(b"\n>", header_end - 1)
+        if next_record == -1:
+            records.append((header_end, len(buffer)))
+            break
+        records.append((header_end, next_record))
+        start = next_record + 1
+
+    return taxa, records
+
+
+def _count_fasta_sites(buffer: mmap.mmap, start: int, end: int) -> int:
+    # number of characters in the sequence data of a FASTA record
+    data = buffer[start:end]
+    return len(data) - sum(data.count(c) for c in _WHITESPACE)
+
+
+def _read_msa_native(
+    msa_file: pathlib.Path,
+    file_format: FileFormat,
+    memory_budget: Optional[int] = None,
+) -> Optional[tuple[npt.NDArray, npt.NDArray[np.uint8]]]:
+    """Reads the taxon names and the uppercase sequence data of the given MSA file.
+
+    The file is memory-mapped and the sequence data is written directly into a preallocated `n_taxa x n_sites`
+    uint8 matrix. If the matrix exceeds the memory budget, it is memory-mapped to a temporary file.
+
+    Returns:
+        Tuple of taxon names and sequence matrix, or None if the file content uses a dialect not supported
+        by the native reader.
+    """
+    reader = _read_fasta if file_format == FileFormat.FASTA else _read_phylip
+
+    with msa_file.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return reader(buffer, memory_budget)
+
+
+def _read_msa_biopython(
+    msa_file: pathlib.Path,
+    file_format: FileFormat,
+    memory_budget: Optional[int] = None,
+) -> tuple[npt.NDArray, npt.NDArray[np.uint8]]:
+    # fallback for all MSA dialects the native reader does not support
+    _msa = AlignIO.read(msa_file, format=file_format.value)
+    sequences = np.frombuffer(
+        b"".join([bytes(rec.seq) for rec in _msa]), dtype=np.uint8
+    ).reshape(len(_msa), -1)
+    taxon_names = np.array([rec.id for rec in _msa])
+
+    out = _allocate_sequences(*sequences.shape, memory_budget)
+    out[:] = sequences
+    return taxon_names, out
+
+
 def _guess_dtype(sequences: npt.NDArray) -> DataType:
-    seq_chars = np.unique(sequences)
+    return _guess_dtype_from_char_counts(_get_char_counts(sequences.view(np.uint8)))
+
+
+def _guess_dtype_from_char_counts(char_counts: npt.NDArray[np.int64]) -> DataType:
+    # The data type is inferred from the byte histogram of the data, folded to uppercase characters.
+    # This also works for raw (not normalized) data.
+    present = _map_char_counts(char_counts, _UPPERCASE_LUT) > 0
 
     # First, check if any character is a digit, if yes: morphological data
-    if np.any(np.char.isdigit(seq_chars)):
+    if np.any(present & _DIGIT_TABLE):
         return DataType.MORPH
 
     # Next, check if all characters are valid DNA_CHARS, if yes: DNA data
-    if np.all(np.isin(seq_chars, DNA_CHARS)):
+    if not np.any(present & ~_DNA_CHAR_TABLE):
         return DataType.DNA
 
     # Next, check if all characters are valid AA_CHARS, if yes: AA data
-    if np.all(np.isin(seq_chars, AA_CHARS)):
+    if not np.any(present & ~_AA_CHAR_TABLE):
         return DataType.AA
 
     raise PyPythiaException(
-        f"Data type for character set could not be inferred: {[c.decode() for c in seq_chars]}."
-        f" Invalid characters for DNA: {[c.decode() for c in set(seq_chars) - set(DNA_CHARS)]}."
-        f" Invalid characters for AA: {[c.decode() for c in set(seq_chars) - set(AA_CHARS)]}."
+        f"Data type for character set could not be inferred: {[chr(c) for c in np.flatnonzero(present)]}."
+        f" Invalid characters for DNA: {[chr(c) for c in np.flatnonzero(present & ~_DNA_CHAR_TABLE)]}."
+        f" Invalid characters for AA: {[chr(c) for c in np.flatnonzero(present & ~_AA_CHAR_TABLE)]}."
+    )
+
+
+def _get_raxmlng_model(
+    data_type: DataType, char_counts: Optional[npt.NDArray[np.int64]] = None
+) -> str:
+    # see MSA.get_raxmlng_model, the histogram of the state codes is only required for morphological data
+    if data_type == DataType.DNA:
+        return "GTR+G"
+    elif data_type == DataType.AA:
+        return "LG+G"
+    elif data_type == DataType.MORPH:
+        # the number of unique states is irrelevant for RAxML-NG, it only cares about the max state value...
+        num_states = int(chr(np.flatnonzero(char_counts)[-1])) + 1
+        return f"MULTI{num_states}_GTR"
+    else:
+        raise PyPythiaException("Unsupported data type: ", data_type)
+
+
+def _get_state_masks(data_type: DataType) -> npt.NDArray:
+    if data_type == DataType.DNA:
+        return DNA_STATE_MASKS
+    if data_type == DataType.AA:
+        return AA_STATE_MASKS
+    # there is no ambiguity map for morphological data, so no character can be resolved to any state
+    return np.zeros(256, dtype=np.uint8)
+
+
+def _get_distance_state_masks(
+    data_type: DataType, alphabet: npt.NDArray[np.uint8]
+) -> npt.NDArray:
+    # State masks for the distance computation, a gap can be resolved to any state.
+    if data_type == DataType.DNA:
+        # U is the same state as T
+        state_masks = DNA_STATE_MASKS & np.uint8(0b1111)
+        state_masks[ord("U")] = state_masks[ord("T")]
+        return state_masks
+    if data_type == DataType.AA:
+        return AA_STATE_MASKS
+
+    # there is no ambiguity map for morphological data, so each character of the alphabet is a separate state
+    states = alphabet[alphabet != GAP_ORD]
+    if states.shape[0] > 64:
+        raise PyPythiaException(
+            f"Distances are only supported for up to 64 states, got {states.shape[0]}."
+        )
+    state_masks = np.zeros(256, dtype=np.uint64)
+    state_masks[states] = np.left_shift(
+        np.uint64(1), np.arange(states.shape[0], dtype=np.uint64)
+    )
+    state_masks[GAP_ORD] = np.bitwise_or.reduce(state_masks)
+    return state_masks
+
+
+def _map_char_counts(
+    char_counts: npt.NDArray[np.int64], lut: npt.NDArray[np.uint8]
+) -> npt.NDArray[np.int64]:
+    # histogram of lut[sequences] given the histogram of sequences, without touching the data
+    mapped = np.zeros(256, dtype=np.int64)
+    np.add.at(mapped, lut, char_counts)
+    return mapped
+
+
+def _fingerprint_sequences(
+    sequences: Iterable[npt.NDArray[np.uint8]],
+) -> npt.NDArray[np.uint64]:
+    """Computes a 128-bit fingerprint (BLAKE2b hash) for each sequence (row) of sequences.
+
+    Each sequence is hashed in a single streaming pass, so memory-mapped data matrices are not loaded into memory.
+    The sequences can also be given as iterable of rows, e.g. the unpacked rows of a packed data matrix.
+
+    Returns:
+        Array of shape `(n_taxa, 2)`.
+    """
+    fingerprints = [
+        np.frombuffer(
+            hashlib.blake2b(np.ascontiguousarray(seq), digest_size=16).digest(),
+            dtype=np.uint64,
+        )
+        for seq in sequences
+    ]
+    return np.array(fingerprints, dtype=np.uint64).reshape(-1, 2)
+
+
+def _build_sequence_index(
+    get_sequence: Callable[[int], npt.NDArray[np.uint8]], n_taxa: int, n_sites: int
+) -> "SequenceIndex":
+    # Groups identical sequences and detects full-gap sequences based on the sequence fingerprints.
+    # Equal fingerprints are verified by comparing the sequences, so hash collisions cannot produce wrong results.
+    # The sequences are accessed one at a time by get_sequence, so the data matrix is never loaded at once.
+    fingerprints = _fingerprint_sequences(map(get_sequence, range(n_taxa)))
+    _, first_index, inverse, _ = _unique_fingerprints(fingerprints)
+    representatives = first_index[inverse]
+
+    for i in np.flatnonzero(representatives != np.arange(n_taxa)):
+        seq = get_sequence(i)
+        if np.array_equal(seq, get_sequence(representatives[i])):
+            continue
+        # hash collision: find the first identical sequence among the sequences with the same fingerprint
+        candidates = np.flatnonzero(inverse == inverse[i])
+        representatives[i] = next(
+            j
+            for j in candidates
+            if j == i
+            or (representatives[j] == j and np.array_equal(seq, get_sequence(j)))
+        )
+
+    gap_fingerprint = _fingerprint_sequences([np.full(n_sites, GAP_ORD, np.uint8)])
+    full_gap = np.all(fingerprints == gap_fingerprint, axis=1)
+    for i in np.flatnonzero(full_gap):
+        full_gap[i] = np.all(get_sequence(i) == GAP_ORD)
+
+    return SequenceIndex(representatives=representatives, full_gap=full_gap)
+
+
+def _summarize_block(
+    sequences: Union[npt.NDArray[np.uint8], PackedDNA],
+    start: int,
+    stop: int,
+    state_masks: npt.NDArray,
+    timings: Optional[dict[str, float]] = None,
+) -> _SiteSummary:
+    # Summarizes the sites [start, stop) of a data matrix.
+    # For packed DNA data, the invariant sites are determined on the packed state masks and only the characters
+    # required for the patterns and entropies are unpacked.
+    if isinstance(sequences, PackedDNA):
+        with _timed(timings, "invariant"):
+            invariant = sequences.site_masks(start, stop) != 0
+        return _summarize_sites(
+            sequences.unpack(start, stop), state_masks, timings, invariant
+        )
+    return _summarize_sites(sequences[:, start:stop], state_masks, timings)
+
+
+# state of a feature worker process, set by _init_feature_worker
+_worker_shared_memory: Optional[SharedMemory] = None
+_worker_sequences: Optional[Union[npt.NDArray[np.uint8], PackedDNA]] = None
+_worker_state_masks: Optional[npt.NDArray] = None
+
+
+def _init_feature_worker(
+    shared_memory_name: Optional[str],
+    shape: tuple[int, int],
+    state_masks: npt.NDArray,
+    packed: Optional[PackedDNA] = None,
+    location: Optional[tuple[str, int, tuple[int, int], tuple[int, int]]] = None,
+) -> None:
+    # Attaches the worker process to the data matrix without copying it.
+    # The data matrix is either in shared memory or, for memory-mapped data matrices, mapped from the same file
+    # (see _memmap_location). For packed DNA data, the shared memory contains the packed data matrix of `packed`.
+    global _worker_shared_memory, _worker_sequences, _worker_state_masks
+    if location is not None:
+        filename, offset, shape, strides = location
+        extent = sum((size - 1) * stride for size, stride in zip(shape, strides)) + 1
+        buffer = np.memmap(
+            filename, dtype=np.uint8, mode="r", offset=offset, shape=(extent,)
+        )
+        _worker_sequences = np.ndarray(
+            shape, dtype=np.uint8, buffer=buffer, strides=strides
+        )
+    else:
+        _worker_shared_memory = SharedMemory(name=shared_memory_name)
+        _worker_sequences = np.ndarray(
+            shape, dtype=np.uint8, buffer=_worker_shared_memory.buf
+        )
+    if packed is not None:
+        _worker_sequences = replace(packed, data=_worker_sequences)
+    _worker_state_masks = state_masks
+
+
+def _summarize_shared_sites(
+    block: tuple[int, int], timings: bool = False
+) -> tuple[_SiteSummary, Optional[dict[str, float]]]:
+    # summarizes the sites [start, stop) of the shared data matrix in a worker process
+    start, stop = block
+    _timings = {} if timings else None
+    summary = _summarize_block(
+        _worker_sequences, start, stop, _worker_state_masks, _timings
     )
+    return summary, _timings
+
+
+def _summarize_sites_parallel(
+    sequences: Union[npt.NDArray[np.uint8], PackedDNA],
+    state_masks: npt.NDArray,
+    block_size: int,
+    n_workers: int,
+    timings: Optional[dict[str, float]] = None,
+) -> list[_SiteSummary]:
+    # Summarizes the blocks of sites using a pool of worker processes.
+    # The workers only receive the site range of each block. Memory-mapped data matrices (out-of-core or loaded from
+    # the MSA cache) are mapped from their file by each worker, all other data matrices are placed in shared memory
+    # once. The summaries are returned in block order, so merging them yields the same result as the sequential
+    # computation.
+    n_taxa, n_sites = sequences.shape
+    blocks = [
+        (start, min(start + block_size, n_sites))
+        for start in range(0, n_sites, block_size)
+    ]
+    # for packed DNA data, the packed data matrix is shared and the workers unpack their blocks
+    packed = sequences if isinstance(sequences, PackedDNA) else None
+    matrix = packed.data if packed is not None else sequences
+    location = _memmap_location(matrix)
+
+    shared_memory = None
+    try:
+        if location is None:
+            shared_memory = SharedMemory(create=True, size=max(1, matrix.nbytes))
+            shared_sequences = np.ndarray(
+                matrix.shape, dtype=np.uint8, buffer=shared_memory.buf
+            )
+            for start in range(0, matrix.shape[1], block_size):
+                shared_sequences[:, start : start + block_size] = matrix[
+                    :, start : start + block_size
+                ]
+            del shared_sequences
+
+        with multiprocessing.Pool(
+            n_workers,
+            initializer=_init_feature_worker,
+            initargs=(
+                shared_memory.name if shared_memory is not None else None,
+                matrix.shape,
+                state_masks,
+                replace(packed, data=None) if packed is not None else None,
+                location,
+            ),
+        ) as pool:
+            results = pool.starmap(
+                _summarize_shared_sites,
+                [(block, timings is not None) for block in blocks],
+            )
+    finally:
+        if shared_memory is not None:
+            shared_memory.close()
+            shared_memory.unlink()
+
+    summaries = []
+    for summary, block_timings in results:
+        summaries.append(summary)
+        for key, value in (block_timings or {}).items():
+            # timings of the workers are accumulated, i.e. they report the CPU time rather than the wall time
+            timings[key] = timings.get(key, 0.0) + value
+    return summaries
+
+
+class SequenceIndex(NamedTuple):
+    """Index of identical and full-gap sequences of an MSA based on 128-bit sequence fingerprints.
+
+    Attributes:
+        representatives (npt.NDArray): Index of the first sequence identical to each sequence.
+            Sequence `i` is a duplicate if `representatives[i] != i`.
+        full_gap (npt.NDArray): Whether each sequence is a full-gap sequence.
+    """
+
+    representatives: npt.NDArray[np.intp]
+    full_gap: npt.NDArray[np.bool_]
+
+
+class SitePatterns(NamedTuple):
+    """Pattern compression of an MSA.
+
+    Attributes:
+        patterns (npt.NDArray): Compressed data matrix of shape `(n_taxa, n_unique_patterns)` using the S1 numpy
+            data type. Column `j` contains the characters of the pattern `j`.
+        weights (npt.NDArray): Number of sites with the respective pattern.
+        site_pattern_index (npt.NDArray): Index of the pattern of each site of the MSA.
+    """
+
+    patterns: npt.NDArray
+    weights: npt.NDArray[np.int64]
+    site_pattern_index: npt.NDArray[np.intp]
+
+
+@dataclass
+class MSAFeatures:
+    """Features of an MSA as computed by `MSA.compute_features`.
+
+    Attributes:
+        n_taxa (int): Number of taxa
+        n_sites (int): Number of sites
+        n_patterns (int): Number of unique patterns, see `MSA.n_patterns`
+        proportion_gaps (float): Proportion of gap characters, see `MSA.proportion_gaps`
+        proportion_invariant (float): Proportion of invariant sites, see `MSA.proportion_invariant`
+        entropy (float): Mean site entropy, see `MSA.entropy`
+        pattern_entropy (float): Entropy-like metric based on the pattern counts, see `MSA.pattern_entropy`
+        bollback (float): Bollback multinomial metric, see `MSA.bollback_multinomial`
+        timings (dict[str, float]): Time in seconds spent on each feature. Only set if timings were requested.
+    """
+
+    n_taxa: int
+    n_sites: int
+    n_patterns: int
+    proportion_gaps: float
+    proportion_invariant: float
+    entropy: float
+    pattern_entropy: float
+    bollback: float
+    timings: Optional[dict[str, float]] = None
+
+
+@dataclass
+class PartitionedMSAFeatures:
+    """Features of a partitioned MSA as computed by `MSA.compute_partition_features`.
+
+    Attributes:
+        partitions (dict[str, MSAFeatures]): Features of each partition in the order of the partition file
+        total (MSAFeatures): Features of all sites of all partitions. Per-site intermediates (e.g. invariant sites)
+            are determined using the data type of the respective partition.
+    """
+
+    partitions: dict[str, MSAFeatures]
+    total: MSAFeatures
+
+
+class ColumnEntropySummary(NamedTuple):
+    """Summary statistics of the column entropies of an MSA, see `summarize_column_entropies`.
+
+    Attributes:
+        quantiles (npt.NDArray): Column entropies at the quantiles `COLUMN_ENTROPY_QUANTILES`
+        histogram (npt.NDArray): Number of columns in each bin of `COLUMN_ENTROPY_BINS`
+    """
+
+    quantiles: npt.NDArray[np.float64]
+    histogram: npt.NDArray[np.int64]
 
 
 class MSA:
@@ -153,22 +858,40 @@ class MSA:
         taxa (npt.NDArray): Array of taxa names
         sequences (npt.NDArray): The data matrix containing the sequence data.
             The order of the rows corresponds to the order of the taxa in the taxa array.
-            The data is stored as a 2D numpy array of bytes using the S1 numpy data type.
+            The data is a 2D numpy array of bytes using either the S1 or the uint8 numpy data type.
         data_type (DataType): Data type of the sequences
         name (str): Name of the MSA
+        memory_budget (int): Approximate number of bytes available for the data matrix and temporary arrays.
+            Defaults to None (no limit). If set, data matrices exceeding the budget are memory-mapped to disk when
+            parsing an MSA file, and all features are computed in blocks of sites within the budget.
+        cache_dir (pathlib.Path): Directory of the binary MSA cache used when parsing an MSA file,
+            see `parse_msa` for details. Defaults to None (no cache). Use `predict.config.DEFAULT_MSA_CACHE_DIR`
+            for the default cache location.
+        partitions (pathlib.Path | list[Partition]): RAxML-NG or IQ-TREE partition file or list of partitions.
+            Defaults to None (unpartitioned MSA). Partitions without a data type inherit the data type of the MSA.
+        packed (bool): Whether to store the data matrix bit-packed, see `MSA.pack`. Defaults to False.
+            Only DNA MSAs can be packed.
 
     Attributes:
         taxa (npt.NDArray): Array of taxa names
-        sequences (npt.NDArray): The data matrix containing the sequence data.
+        codes (npt.NDArray[np.uint8]): The data matrix containing the state code of each character, i.e. the byte
+            value of the normalized character (uppercase, with all gap characters replaced by `GAP`).
             The order of the rows corresponds to the order of the taxa in the taxa array.
-            The data is stored as a 2D numpy array of bytes using the S1 numpy data type.
+            All features are computed on this representation. For packed MSAs, the data matrix is unpacked on
+            each access.
+        sequences (npt.NDArray): The data matrix as a 2D numpy array of bytes using the S1 numpy data type.
+            This is a view of `codes`, i.e. the characters are recovered without copying the data.
+        packed (PackedDNA): The bit-packed data matrix or None if the MSA is not packed
         data_type (DataType): Data type of the sequences
         name (str): Name of the MSA
+        memory_budget (int): Approximate number of bytes available for the data matrix and temporary arrays
+        partitions (list[Partition]): Partitions of the MSA or None if the MSA is not partitioned
         n_taxa (int): Number of taxa
         n_sites (int): Number of sites
 
     Raises:
-        PyPythiaException: If the number of taxa in `taxa` and the number of sequences in `sequences` do not match.
+        PyPythiaException: If the number of taxa in `taxa` and the number of sequences in `sequences` do not match,
+            or if the partitions are out of bounds or overlap.
 
     """
 
@@ -193,14 +916,47 @@ class MSA:
         sequences: Optional[npt.NDArray] = None,
         data_type: Optional[DataType] = None,
         name: Optional[str] = None,
+        memory_budget: Optional[int] = None,
+        cache_dir: Optional[Union[str, pathlib.Path]] = None,
+        partitions: Optional[Union[str, pathlib.Path, list[Partition]]] = None,
+        packed: bool = False,
     ):
+        # bit-packed data matrix, replaces the byte data matrix if set, see pack
+        self.packed = None
+        # cache file of the parsed MSA and features stored in or loaded from it, see parse_msa
+        self._cache_file = None
+        self._cached_features = None
+        # sequence index stored in the cache file, see _store_sequence_index
+        self._stored_sequence_index = None
+        self._cache_dir = cache_dir
+        # feature accumulators and over-allocated data matrix for appending sequences and sites
+        self._accumulators = None
+        self._codes_buffer = None
+        self._codes_view = None
+
         if isinstance(taxa_or_path, (str, pathlib.Path)):
             # Nếu là đường dẫn file, tự động gọi parse_msa để lấy MSA
-            parsed = parse_msa(pathlib.Path(taxa_or_path), data_type=data_type)
+            parsed = parse_msa(
+                pathlib.Path(taxa_or_path),
+                data_type=data_type,
+                memory_budget=memory_budget,
+                cache_dir=cache_dir,
+            )
             self.taxa = parsed.taxa
-            self.sequences = parsed.sequences
+            self.codes = parsed.codes
             self.data_type = parsed.data_type
             self.name = parsed.name
+            self._cache_file = parsed._cache_file
+            self._cached_features = parsed._cached_features
+            self._stored_sequence_index = parsed._stored_sequence_index
+            self._cache_dir = parsed._cache_dir
+            self.__dict__.update(
+                {
+                    key: parsed.__dict__[key]
+                    for key in ("char_counts", "sequence_index")
+                    if key in parsed.__dict__
+                }
+            )
         else:
             # Khởi tạo bình thường từ mảng
             if taxa_or_path.shape[0] != sequences.shape[0]:
@@ -213,7 +969,128 @@ class MSA:
             self.data_type = data_type
             self.name = name
 
-        self.n_taxa, self.n_sites = self.sequences.shape
+        self.memory_budget = memory_budget
+        self.n_taxa, self.n_sites = self.codes.shape
+
+        if isinstance(partitions, (str, pathlib.Path)):
+            partitions = parse_partition_file(pathlib.Path(partitions))
+        self.partitions = (
+            self._check_partitions(partitions) if partitions is not None else None
+        )
+
+        if packed:
+            self.pack()
+
+    def _check_partitions(self, partitions: list[Partition]) -> list[Partition]:
+        # validates the partitions and sets the data type of partitions without data type to the one of the MSA
+        n_partition_sites = 0
+        covered_sites = []
+        for partition in partitions:
+            if any(site_range.stop > self.n_sites for site_range in partition.ranges):
+                raise PyPythiaException(
+                    f"Partition {partition.name} exceeds the number of sites of the MSA ({self.n_sites})."
+                )
+            n_partition_sites += partition.n_sites
+            covered_sites.append(partition.sites)
+
+        if np.unique(np.concatenate(covered_sites)).shape[0] != n_partition_sites:
+            raise PyPythiaException("The partitions of the MSA overlap.")
+
+        return [
+            replace(partition, data_type=partition.data_type or self.data_type)
+            for partition in partitions
+        ]
+
+    @property
+    def codes(self) -> npt.NDArray[np.uint8]:
+        """The data matrix of state codes.
+
+        For packed MSAs, this unpacks the full data matrix into a read-only copy, so writes raise an error instead of
+        being lost. Assign a new data matrix to replace the packed one.
+        """
+        if self.packed is not None:
+            codes = self.packed.unpack()
+            codes.flags.writeable = False
+            return codes
+        return self._codes
+
+    @codes.setter
+    def codes(self, codes: npt.NDArray[np.uint8]) -> None:
+        self._codes = codes
+        self.packed = None
+
+    @property
+    def sequences(self) -> npt.NDArray:
+        """The data matrix using the S1 numpy data type.
+
+        This is a view of `codes`, no data is copied. Like `codes`, it is a read-only copy for packed MSAs.
+        """
+        return self.codes.view("S1")
+
+    @sequences.setter
+    def sequences(self, sequences: npt.NDArray) -> None:
+        self.codes = sequences.view(np.uint8)
+
+    def pack(self, bits: Optional[int] = None) -> None:
+        """Replaces the data matrix of a DNA MSA by its bit-packed representation.
+
+        Each character is stored as 4-bit state mask, or, if gaps and ambiguous characters are rare, unambiguous
+        nucleotides are stored as 2-bit codes and all other characters as exceptions, see `PackedDNA`. This reduces
+        the memory of the data matrix by a factor of 2 to 4.
+
+        All features are computed on the packed data matrix: blocks of sites are unpacked on demand, and the invariant
+        sites and pairwise distances are computed on the packed state masks directly. Appending sequences or sites
+        unpacks the data matrix. While the MSA is packed, `codes` and `sequences` return read-only unpacked copies.
+
+        Args:
+            bits (int): Number of bits per character, either 2 or 4. Defaults to None. In this case, the layout is
+                chosen based on the proportion of gaps and ambiguous characters.
+
+        Raises:
+            PyPythiaException: If the MSA is not a DNA MSA or contains characters that cannot be packed
+                (e.g. unnormalized characters of an MSA that was not parsed from a file).
+        """
+        if self.data_type != DataType.DNA:
+            raise PyPythiaException(
+                f"Only DNA MSAs can be packed, the MSA has data type {self.data_type.name}."
+            )
+        if self.packed is not None and bits in (None, self.packed.bits):
+            return
+        char_counts = self.char_counts if self.packed is None else None
+        self.packed = PackedDNA.from_codes(self.codes, bits, char_counts)
+        self._codes = None
+
+    def _get_codes(self, start: int, stop: int) -> npt.NDArray[np.uint8]:
+        # data matrix of the sites [start, stop), unpacked if the MSA is packed
+        if self.packed is not None:
+            return self.packed.unpack(start, stop)
+        return self._codes[:, start:stop]
+
+    def _take_sites(self, sites: npt.NDArray[np.intp]) -> npt.NDArray[np.uint8]:
+        # data matrix of the given sorted sites, unpacked if the MSA is packed
+        if self.packed is not None:
+            return self.packed.take(sites)
+        return self._codes[:, sites]
+
+    def _get_sequence(self, index: int) -> npt.NDArray[np.uint8]:
+        # sequence of the taxon at index, unpacked if the MSA is packed
+        if self.packed is not None:
+            return self.packed.unpack_sequence(index)
+        return self._codes[index]
+
+    def _iter_sequences(self) -> Iterator[npt.NDArray[np.uint8]]:
+        # all sequences one at a time, unpacked if the MSA is packed
+        return map(self._get_sequence, range(self.n_taxa))
+
+    def _take_sequences(self, indices: npt.NDArray[np.intp]) -> npt.NDArray[np.uint8]:
+        # data matrix of the given taxa, unpacked if the MSA is packed
+        if self.packed is None:
+            return self._codes[indices]
+        codes = np.empty((indices.shape[0], self.n_sites), dtype=np.uint8)
+        for row, index in enumerate(indices):
+            codes[row] = self.packed.unpack_sequence(index)
+        return codes
+
     def __str__(self):
         return f"MSA(name={self.name}, n_taxa={self.n_taxa}, n_sites={self.n_sites}, data_type={self.data_type.name})"
 
@@ -228,7 +1105,59 @@ class MSA:
         Returns:
             True if full-gap sequences are present, False otherwise.
         """
-        return np.any(np.all(self.sequences == GAP, axis=1))
+        return bool(np.any(self.sequence_index.full_gap))
+
+    @cached_property
+    def sequence_index(self) -> SequenceIndex:
+        """Returns the index of identical and full-gap sequences of the MSA.
+
+        The index is built in linear time from a 128-bit fingerprint of each sequence. Sequences with equal
+        fingerprints are compared to rule out hash collisions. The index is built once. It is stored in the MSA cache
+        by `remove_full_gap_sequences` and `deduplicate_sequences`, and along with the features if it was built.
+
+        Returns:
+            SequenceIndex object containing the representative of each sequence and the full-gap sequences.
+        """
+        return _build_sequence_index(self._get_sequence, self.n_taxa, self.n_sites)
+
+    @cached_property
+    def char_counts(self) -> npt.NDArray[np.int64]:
+        """Returns the number of occurrences of each state code in the MSA.
+
+        For parsed MSAs, the histogram is computed while parsing (and stored in the MSA cache), so it is available
+        without another pass over the data.
+
+        Returns:
+            Array of length 256. Entry `i` is the number of occurrences of the character with ASCII ordinal `i`.
+        """
+        return _get_char_counts(self._iter_sequences())
+
+    @cached_property
+    def alphabet(self) -> npt.NDArray:
+        """Returns all characters occurring in the MSA.
+
+        Returns:
+            Sorted array of the distinct characters in the MSA using the S1 numpy data type.
+        """
+        return np.flatnonzero(self.char_counts).astype(np.uint8).view("S1")
+
+    @cached_property
+    def site_counts(self) -> npt.NDArray[np.int32]:
+        """Returns the number of occurrences of each character at each site of the MSA.
+
+        The counts are computed for blocks of sites, one character of the alphabet at a time.
+
+        Returns:
+            Matrix of shape `(n_sites, len(alphabet))`. Entry `[i, j]` is the number of occurrences of the character
+            `alphabet[j]` at site `i`.
+        """
+        alphabet = self.alphabet.view(np.uint8)
+        counts = np.empty((self.n_sites, alphabet.shape[0]), dtype=np.int32)
+        block_size = _get_block_size(self.n_taxa, self.memory_budget)
+        for start in range(0, self.n_sites, block_size):
+            block = self._get_codes(start, start + block_size)
+            counts[start : start + block.shape[1]] = _count_chars(block, alphabet)
+        return counts
 
     def contains_duplicate_sequences(self) -> bool:
         """Check if the MSA contains duplicate sequences.
@@ -236,8 +1165,66 @@ class MSA:
         Returns:
             True if duplicate sequences are present, False otherwise.
         """
-        unique_sequences = np.unique(self.sequences, axis=0)
-        return unique_sequences.shape[0] < self.sequences.shape[0]
+        representatives = self.sequence_index.representatives
+        return bool(np.any(representatives != np.arange(self.n_taxa)))
+
+    def get_duplicate_groups(self) -> dict[str, list[str]]:
+        """Returns the groups of identical sequences in the MSA.
+
+        The first sequence of each group is the one kept by `deduplicate_sequences`, so the groups can be used to
+        map results for a deduplicated MSA back to all taxa.
+
+        Returns:
+            Dictionary mapping the taxon name of the first sequence of each group of identical sequences
+            to the taxon names of all subsequent identical sequences (in MSA order).
+            Sequences without duplicates are not included.
+        """
+        representatives = self.sequence_index.representatives
+        groups = {}
+        for i in np.flatnonzero(representatives != np.arange(self.n_taxa)):
+            groups.setdefault(str(self.taxa[representatives[i]]), []).append(
+                str(self.taxa[i])
+            )
+        return groups
+
+    @cached_property
+    def site_patterns(self) -> SitePatterns:
+        """Returns the pattern compression of the MSA.
+
+        A pattern is a unique combination of characters at a site in the MSA. The patterns are determined
+        at once for all sites by computing a 128-bit fingerprint for each site in a vectorized pass over all sequences.
+        Sites with the same fingerprint are assigned to the same pattern without comparing their columns. The
+        fingerprint is not a cryptographic hash, so a collision (about `p^2 / 2^129` expected colliding pairs for `p`
+        random patterns) would merge two distinct patterns.
+        All pattern-based features are computed on the compressed alignment weighted by the pattern counts,
+        so their cost depends on the number of patterns rather than the number of sites.
+
+        Returns:
+            SitePatterns object containing the unique patterns, their weights, and the site to pattern mapping.
+        """
+        fingerprints = np.empty((self.n_sites, 2), dtype=np.uint64)
+        block_size = _get_block_size(self.n_taxa, self.memory_budget)
+        for start in range(0, self.n_sites, block_size):
+            block = self._get_codes(start, start + block_size)
+            fingerprints[start : start + block.shape[1]] = _fingerprint_sites(block)
+        _, pattern_sites, site_pattern_index, weights = _unique_fingerprints(
+            fingerprints
+        )
+
+        # the sites are taken in sorted order and the patterns are reordered to the order of the fingerprints
+        order = np.argsort(pattern_sites)
+        patterns = np.empty((self.n_taxa, pattern_sites.shape[0]), dtype=np.uint8)
+        patterns[:, order] = self._take_sites(pattern_sites[order])
+        return SitePatterns(
+            patterns=patterns.view("S1"),
+            weights=weights,
+            site_pattern_index=site_pattern_index,
+        )
+
+    @cached_property
+    def _features(self) -> MSAFeatures:
+        # all individual features are computed at once
+        return self.compute_features()
 
     @cached_property
     def n_patterns(self) -> int:
@@ -249,8 +1236,7 @@ class MSA:
         Returns:
             Number of unique patterns
         """
-        un = set([c.tobytes() for c in self.sequences.T])
-        return len(un) - ((GAP * self.n_taxa) in un)
+        return self._features.n_patterns
 
     @cached_property
     def proportion_gaps(self) -> float:
@@ -260,10 +1246,7 @@ class MSA:
         Returns:
             Proportion of gap characters in the MSA
         """
-        full_gap_sites_removed = self.sequences[
-            :, ~np.all(self.sequences.T == GAP, axis=1)
-        ]
-        return np.sum(full_gap_sites_removed == GAP) / full_gap_sites_removed.size
+        return self._features.proportion_gaps
 
     @cached_property
     def proportion_invariant(self) -> float:
@@ -278,31 +1261,7 @@ class MSA:
             Proportion of invariant sites in the MSA
 
         """
-        if self.data_type == DataType.DNA:
-            charmap = DNA_AMBIGUITY_MAP
-        elif self.data_type == DataType.AA:
-            charmap = AA_AMBIGUITY_MAP
-        else:
-            charmap = {}
-
-        non_gap_site_count = 0
-        invariant_count = 0
-
-        gap_ord_set = {GAP_ORD}
-
-        for site in self.sequences.T:
-            site = set(site.tobytes())
-            if site == gap_ord_set:
-                # full-gap sites are not counted as invariant
-                continue
-
-            non_gap_site_count += 1
-
-            for allowed in charmap.values():
-                if site.issubset(allowed):
-                    invariant_count += 1
-                    break
-        return invariant_count / non_gap_site_count
+        return self._features.proportion_invariant
 
     def entropy(self) -> float:
         """Returns the entropy of the MSA.
@@ -313,14 +1272,113 @@ class MSA:
         Returns:
             Entropy of the MSA.
         """
-        def _site_entropy(site):
-            site_counter = Counter(site.tobytes())
-            site_counter.pop(GAP_ORD, None)
+        return self._features.entropy
+
+    def _get_state_planes(
+        self,
+    ) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint64]]:
+        # bitplanes of the state masks for the distance computation, for packed MSAs taken from the packed state masks
+        if self.packed is not None:
+            return self.packed.state_planes()
+        state_masks = _get_distance_state_masks(
+            self.data_type, self.alphabet.view(np.uint8)
+        )
+        return pack_state_masks(self.codes, state_masks)
+
+    def pairwise_distances(
+        self, corrected: bool = False, n_threads: Optional[int] = None
+    ) -> npt.NDArray[np.float64]:
+        """Computes the distances between all pairs of taxa of the MSA.
+
+        The distance between two taxa is the proportion of mismatching sites among the sites without gaps in both
+        taxa (p-distance). Ambiguous characters match all characters they share a state with. The characters are
+        compared as bit-packed state masks, see `predict.distance.pairwise_distances` for details.
+
+        Args:
+            corrected (bool): Whether to apply the Jukes-Cantor correction for the number of states of the data type
+                (4 for DNA, 20 for AA, and the number of distinct characters for morphological data).
+                Defaults to False.
+            n_threads (int): Number of threads. Defaults to None. In this case, the number of CPUs is used.
+
+        Returns:
+            The symmetric distance matrix of shape `(n_taxa, n_taxa)`. The distance of two taxa is nan if they do not
+            share a site without gaps and infinite if the corrected distance is saturated.
+
+        Raises:
+            PyPythiaException: If the morphological data has more than 64 states.
+        """
+        planes, determined = self._get_state_planes()
+        return pairwise_distances_from_planes(
+            planes, determined, corrected=corrected, n_threads=n_threads
+        )
+
+    def treelikeness_score(
+        self,
+        n_quartets: int = 10000,
+        corrected: bool = False,
+        n_threads: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> float:
+        """Computes the treelikeness of the MSA as mean delta value of randomly sampled quartets of taxa.
+
+        The delta value of a quartet measures how well the pairwise distances of the four taxa fit a tree
+        (Holland et al., 2002): zero corresponds to perfectly tree-like data, larger values (up to one) indicate
+        conflicting signal. Only the distances of the taxon pairs within the sampled quartets are computed, so the
+        cost does not depend quadratically on the number of taxa.
+
+        Args:
+            n_quartets (int): Number of quartets to sample. Defaults to 10000. If the MSA has at most this many
+                quartets, all quartets are used.
+            corrected (bool): Whether to use the Jukes-Cantor corrected distances. Defaults to False.
+            n_threads (int): Number of threads. Defaults to None. In this case, the number of CPUs is used.
+            seed (int): Seed of the random number generator. Defaults to None.
+
+        Returns:
+            The mean delta value of the sampled quartets.
+
+        Raises:
+            PyPythiaException: If the MSA has less than four taxa.
+        """
+        quartets = sample_quartets(self.n_taxa, n_quartets, seed)
+        # the distinct taxon pairs of all quartets, the inverse maps the six pairs of each quartet to them
+        pairs, pair_index = np.unique(
+            quartets[:, QUARTET_PAIRS].reshape(-1, 2), axis=0, return_inverse=True
+        )
+
+        planes, determined = self._get_state_planes()
+        pair_distances = pairwise_distances_from_planes(
+            planes,
+            determined,
+            pairs=pairs,
+            corrected=corrected,
+            n_threads=n_threads,
+        )
+        return delta_plot_treelikeness_from_pairs(
+            pair_distances[pair_index.reshape(-1, len(QUARTET_PAIRS))]
+        )
+
+    def column_entropy(self) -> npt.NDArray[np.float32]:
+        """Returns the entropy of each site (column) of the MSA.
+
+        The site entropy is the Shannon entropy (in bits) of the characters at the site, gap characters are not taken
+        into account. The entropies are computed from the character counts of blocks of sites, character by
+        character, so no per-site Python loop is required. The mean of the column entropies is `MSA.entropy`.
 
-            counts = np.array(list(site_counter.values()))
-            probabilities = counts / np.sum(counts)
-            return -np.sum(probabilities * np.log2(probabilities))
-        return np.mean([_site_entropy(site) for site in self.sequences.T])
+        Returns:
+            Array of length `n_sites` using the float32 numpy data type.
+        """
+        if self._accumulators is not None:
+            return self._accumulators.entropies.astype(np.float32)
+
+        alphabet = self.alphabet.view(np.uint8)
+        entropies = np.empty(self.n_sites, dtype=np.float32)
+        block_size = _get_block_size(self.n_taxa, self.memory_budget)
+        for start in range(0, self.n_sites, block_size):
+            block = self._get_codes(start, start + block_size)
+            entropies[start : start + block_size] = _site_entropies(
+                _count_chars(block, alphabet), alphabet
+            )
+        return entropies
 
     def pattern_entropy(self) -> float:
         r"""Returns an entropy-like metric based on the number of occurrences of all patterns of the MSA.
@@ -334,10 +1392,7 @@ class MSA:
         Returns:
             Entropy-like metric based on the number of occurrences of all patterns of the MSA.
         """
-        patterns = [c.tobytes() for c in self.sequences.T]
-        pattern_counter = Counter(patterns)
-        pattern_counts = np.array(list(pattern_counter.values()))
-        return np.sum(pattern_counts * np.log(pattern_counts))
+        return self._features.pattern_entropy
 
     def bollback_multinomial(self) -> float:
         r"""
@@ -353,8 +1408,536 @@ class MSA:
         Returns:
             Bollback multinomial metric for the MSA.
         """
-        pattern_entropy = self.pattern_entropy()
-        return pattern_entropy - self.n_sites * math.log(self.n_sites)
+        return self._features.bollback
+
+    def _get_partition(self, name: str) -> Partition:
+        if self.partitions is None:
+            raise PyPythiaException("The MSA is not partitioned.")
+        for partition in self.partitions:
+            if partition.name == name:
+                return partition
+        raise PyPythiaException(f"Partition {name} not found.")
+
+    def _get_partition_lut(
+        self, partition: Partition
+    ) -> Optional[npt.NDArray[np.uint8]]:
+        # Lookup table normalizing the state codes of the MSA to the data type of the partition.
+        # None if the state codes are already normalized, i.e. if the lookup table does not change any code of the MSA.
+        if partition.data_type == self.data_type:
+            return None
+        lut = _get_normalization_lut(partition.data_type)
+        codes = np.flatnonzero(self.char_counts)
+        return None if np.array_equal(lut[codes], codes) else lut
+
+    def get_partition(self, name: str) -> "MSA":
+        """Returns the partition with the given name as MSA.
+
+        If the partition consists of a single site range (optionally with a step, e.g. codon positions), the data
+        matrix of the returned MSA is a zero-copy view of the data matrix of this MSA. Otherwise, the sites of the
+        partition are copied. The data is also copied if the state codes need to be normalized to the data type of the
+        partition (e.g. `N` as gap character in a DNA partition of a protein MSA).
+
+        Args:
+            name (str): Name of the partition
+
+        Returns:
+            MSA object containing the sites of the partition.
+
+        Raises:
+            PyPythiaException: If the MSA is not partitioned or does not contain a partition with the given name.
+        """
+        partition = self._get_partition(name)
+        if len(partition.ranges) == 1 and self.packed is None:
+            codes = self._codes[:, partition.ranges[0]]
+        else:
+            codes = self._take_sites(partition.sites)
+
+        lut = self._get_partition_lut(partition)
+        if lut is not None:
+            codes = np.take(lut, codes)
+
+        return MSA(
+            self.taxa,
+            codes,
+            partition.data_type,
+            f"{self.name}:{partition.name}",
+            self.memory_budget,
+        )
+
+    def compute_partition_features(
+        self, timings: bool = False, memory_budget: Optional[int] = None
+    ) -> PartitionedMSAFeatures:
+        """Computes all MSA features for each partition of the MSA at once.
+
+        All partitions are processed in a single pass over the data matrix: for each block of sites, the sites of each
+        partition within the block are summarized like in `compute_features`, using the data type of the partition.
+        The per-partition summaries are merged into per-partition features and into the aggregated features of all
+        partitions.
+
+        Args:
+            timings (bool): Whether to measure the time spent on each feature. Defaults to False.
+                The timings are reported for all partitions together in the aggregated features.
+            memory_budget (int): Approximate number of bytes to use for temporary arrays per block of sites.
+                Defaults to None. In this case, the memory budget of the MSA is used.
+
+        Returns:
+            PartitionedMSAFeatures object containing the features of each partition and the aggregated features.
+
+        Raises:
+            PyPythiaException: If the MSA is not partitioned.
+        """
+        if self.partitions is None:
+            raise PyPythiaException("The MSA is not partitioned.")
+
+        _timings = {} if timings else None
+        partition_sites = [partition.sites for partition in self.partitions]
+        luts = [self._get_partition_lut(partition) for partition in self.partitions]
+        state_masks = [
+            _get_state_masks(partition.data_type) for partition in self.partitions
+        ]
+        summaries = [[] for _ in self.partitions]
+
+        block_size = _get_block_size(self.n_taxa, memory_budget or self.memory_budget)
+        for start in range(0, self.n_sites, block_size):
+            stop = min(start + block_size, self.n_sites)
+            block = self._get_codes(start, stop)
+
+            for i, sites in enumerate(partition_sites):
+                lo, hi = np.searchsorted(sites, [start, stop])
+                if lo == hi:
+                    continue
+                local_sites = sites[lo:hi] - start
+                if local_sites[-1] - local_sites[0] + 1 == local_sites.shape[0]:
+                    # contiguous sites, no copy required
+                    sub_block = block[:, local_sites[0] : local_sites[-1] + 1]
+                else:
+                    sub_block = block[:, local_sites]
+                if luts[i] is not None:
+                    sub_block = np.take(luts[i], sub_block)
+                summaries[i].append(
+                    _summarize_sites(sub_block, state_masks[i], _timings)
+                )
+
+        with _timed(_timings, "patterns"):
+            partition_summaries = [
+                _merge_site_summaries(partition_summaries)
+                for partition_summaries in summaries
+            ]
+            total_summary = _scatter_site_summaries(
+                partition_summaries, partition_sites
+            )
+
+        partition_features = {
+            partition.name: self._features_from_summary(summary)
+            for partition, summary in zip(self.partitions, partition_summaries)
+        }
+        return PartitionedMSAFeatures(
+            partitions=partition_features,
+            total=self._features_from_summary(total_summary, _timings),
+        )
+
+    def compute_features(
+        self,
+        timings: bool = False,
+        memory_budget: Optional[int] = None,
+        n_workers: Optional[int] = None,
+    ) -> MSAFeatures:
+        """Computes all MSA features at once.
+
+        In contrast to calling the individual feature methods one after another, the data matrix is only traversed once.
+        The sites are processed in cache-friendly blocks: each block is compressed to its unique patterns and all
+        intermediates (gap counts, invariant sites, site entropies, and pattern counts) are computed from these
+        patterns and shared between the features.
+
+        Pattern counts are merged across blocks, so the results do not depend on the block size and are identical
+        for in-memory and memory-mapped MSAs.
+
+        If the MSA was loaded from the MSA cache, the features are stored in the cache and subsequent calls
+        (also for later loads of the same MSA file) return the stored features unless timings are requested.
+
+        Args:
+            timings (bool): Whether to measure the time spent on each feature. Defaults to False.
+            memory_budget (int): Approximate number of bytes to use for temporary arrays per block of sites.
+                Defaults to None. In this case, the memory budget of the MSA is used.
+            n_workers (int): Number of worker processes to distribute the blocks of sites across. The workers map
+                the file of memory-mapped data matrices, other data matrices are placed in shared memory once, so the
+                workers do not copy the data matrix. The results are identical for any number of workers.
+                Defaults to None. In this case, all sites are processed in the calling process.
+                Use -1 to use all available CPU cores.
+
+        Returns:
+            MSAFeatures object containing all features.
+        """
+        if not timings and self._cached_features is not None:
+            return replace(self._cached_features)
+
+        _timings = {} if timings else None
+        state_masks = _get_state_masks(self.data_type)
+        sequences = self.packed if self.packed is not None else self.codes
+
+        block_size = _get_block_size(self.n_taxa, memory_budget or self.memory_budget)
+        if n_workers == -1:
+            n_workers = multiprocessing.cpu_count()
+
+        if n_workers is not None and n_workers > 1 and self.n_sites > 1:
+            # use enough blocks to keep all workers busy
+            block_size = min(block_size, math.ceil(self.n_sites / (4 * n_workers)))
+            summaries = _summarize_sites_parallel(
+                sequences, state_masks, block_size, n_workers, _timings
+            )
+        else:
+            summaries = [
+                _summarize_block(
+                    sequences, start, start + block_size, state_masks, _timings
+                )
+                for start in range(0, self.n_sites, block_size)
+            ]
+
+        with _timed(_timings, "patterns"):
+            summary = _merge_site_summaries(summaries)
+
+        features = self._features_from_summary(summary, _timings)
+        self._store_features(features)
+        return features
+
+    def _store_features(self, features: MSAFeatures) -> None:
+        # keeps the features (without timings) for later calls and stores them in the cache file of the MSA
+        self._cached_features = replace(features, timings=None)
+        self._update_cache()
+
+    def _store_sequence_index(self) -> SequenceIndex:
+        # builds the sequence index if needed and stores it in the cache file of the MSA unless it is already stored
+        index = self.sequence_index
+        if self._stored_sequence_index is not index:
+            self._update_cache()
+        return index
+
+    def _update_cache(self) -> None:
+        # stores the computed metadata (features, sequence index) in the sidecar file of the cache file of the MSA
+        if self._cache_file is not None:
+            _update_cache_metadata(self._cache_file, _cache_metadata(self))
+            self._stored_sequence_index = self.__dict__.get("sequence_index")
+
+    def _get_accumulators(self) -> _FeatureAccumulators:
+        # Feature accumulators of the MSA, loaded from the MSA cache or built in a single pass over the data matrix.
+        # Built accumulators are stored in the cache, so later runs can append to the MSA without a full pass.
+        if self._accumulators is not None:
+            return self._accumulators
+
+        if self._cache_file is not None:
+            accumulator_file = _get_accumulator_file(self._cache_file)
+            self._accumulators = _read_accumulators(
+                accumulator_file, self.n_taxa, self.n_sites, self._cache_file
+            )
+        if self._accumulators is None:
+            self._accumulators = _build_feature_accumulators(
+                self._get_codes,
+                self.n_sites,
+                self.alphabet.view(np.uint8),
+                _get_state_masks(self.data_type),
+                _get_block_size(self.n_taxa, self.memory_budget),
+            )
+            if self._cache_file is not None:
+                _write_accumulators(
+                    accumulator_file, self._accumulators, self.n_taxa, self._cache_file
+                )
+        return self._accumulators
+
+    def _resize_codes(self, n_taxa: int, n_sites: int) -> None:
+        # Resizes the data matrix to append sequences or sites, the existing data is kept in the top-left corner.
+        # The data matrix is a view of a larger buffer that grows geometrically in the resized dimension, so the
+        # amortized cost of appending is proportional to the size of the appended data.
+        if self.packed is not None:
+            # appending works on the byte data matrix
+            self.codes = self.packed.unpack()
+
+        buffer = self._codes_buffer
+        if self.codes is not self._codes_view:
+            # no buffer yet, or the data matrix was replaced (e.g. loaded from the read-only MSA cache)
+            buffer = None
+        capacity = (self.n_taxa, self.n_sites) if buffer is None else buffer.shape
+        capacity = tuple(
+            size if size <= available else max(size, int(available * 1.5))
+            for size, available in zip((n_taxa, n_sites), capacity)
+        )
+
+        if buffer is None or capacity != buffer.shape:
+            buffer = _allocate_sequences(*capacity, self.memory_budget)
+            block_size = _get_block_size(self.n_taxa, self.memory_budget)
+            for start in range(0, self.n_sites, block_size):
+                stop = min(start + block_size, self.n_sites)
+                buffer[: self.n_taxa, start:stop] = self.codes[:, start:stop]
+            self._codes_buffer = buffer
+
+        self.codes = self._codes_view = buffer[:n_taxa, :n_sites]
+        self.n_taxa, self.n_sites = n_taxa, n_sites
+
+    def _normalize_appended(
+        self, sequences: npt.NDArray, shape: tuple[int, int]
+    ) -> npt.NDArray[np.uint8]:
+        sequences = np.asarray(sequences)
+        if sequences.shape != shape:
+            raise PyPythiaException(
+                f"The appended data needs to have shape {shape}, got {sequences.shape}."
+            )
+        return np.take(_get_normalization_lut(self.data_type), sequences.view(np.uint8))
+
+    def _update_features(self, codes: npt.NDArray[np.uint8]) -> None:
+        # Updates all derived data after data was appended: the features are computed from the accumulators and
+        # all other cached properties are recomputed on demand.
+        if "char_counts" in self.__dict__:
+            self.char_counts = self.char_counts + _get_char_counts(codes)
+        for key in (
+            "sequence_index",
+            "alphabet",
+            "site_counts",
+            "site_patterns",
+            "_features",
+            "n_patterns",
+            "proportion_gaps",
+            "proportion_invariant",
+        ):
+            self.__dict__.pop(key, None)
+
+        # the MSA no longer matches the file it was loaded from
+        self._cache_file = None
+        self._cached_features = self._features_from_summary(
+            self._accumulators.summary()
+        )
+
+    def append_sequences(self, taxa: npt.NDArray, sequences: npt.NDArray) -> None:
+        """Appends sequences to the MSA and updates all features incrementally.
+
+        The features are updated using per-site accumulators (character counts, state masks, fingerprints, and the
+        pattern table) instead of recomputing them from the full data matrix. Apart from updating the per-site
+        intermediates, the cost is proportional to the number of characters appended. The accumulators are built
+        in a single pass on the first append (or loaded from the MSA cache) and stored in the MSA cache.
+
+        Args:
+            taxa (npt.NDArray): Names of the new taxa
+            sequences (npt.NDArray): The new sequences as 2D numpy array of shape `(len(taxa), n_sites)` using
+                either the S1 or the uint8 numpy data type. The characters are normalized like when parsing an MSA.
+
+        Raises:
+            PyPythiaException: If the shape of the sequences does not match the taxa and the number of sites.
+        """
+        taxa = np.asarray(taxa)
+        codes = self._normalize_appended(sequences, (taxa.shape[0], self.n_sites))
+        accumulators = self._get_accumulators()
+        accumulators.append_sequences(codes, _get_state_masks(self.data_type))
+
+        n_taxa = self.n_taxa
+        self._resize_codes(n_taxa + taxa.shape[0], self.n_sites)
+        self.codes[n_taxa:] = codes
+        self.taxa = np.concatenate([self.taxa, taxa])
+        self._update_features(codes)
+
+    def append_sites(self, sequences: npt.NDArray) -> None:
+        """Appends sites to the MSA and updates all features incrementally.
+
+        The per-site intermediates of the new sites are computed and their patterns are merged into the pattern table,
+        see `append_sequences` for details.
+
+        Args:
+            sequences (npt.NDArray): The new sites as 2D numpy array of shape `(n_taxa, n_new_sites)` using either
+                the S1 or the uint8 numpy data type. The characters are normalized like when parsing an MSA.
+
+        Raises:
+            PyPythiaException: If the number of sequences does not match the number of taxa.
+        """
+        sequences = np.asarray(sequences)
+        n_new_sites = sequences.shape[1] if sequences.ndim == 2 else -1
+        codes = self._normalize_appended(sequences, (self.n_taxa, n_new_sites))
+        accumulators = self._get_accumulators()
+        accumulators.append_sites(codes, _get_state_masks(self.data_type))
+
+        n_sites = self.n_sites
+        self._resize_codes(self.n_taxa, n_sites + codes.shape[1])
+        self.codes[:, n_sites:] = codes
+        self._update_features(codes)
+
+    def estimate_features(
+        self,
+        precision: float = 0.01,
+        confidence: float = 0.95,
+        n_strata: int = 1,
+        batch_size: int = 1024,
+        max_sites: Optional[int] = None,
+        estimate_patterns: bool = False,
+        seed: Optional[int] = None,
+    ) -> EstimatedMSAFeatures:
+        """Estimates the MSA features from a random sample of sites.
+
+        Sites are sampled without replacement in batches until the confidence intervals of the proportion of gaps,
+        the proportion of invariant sites, and the entropy are all narrower than `precision` (half-width), until
+        `max_sites` sites are sampled, or until all sites are sampled (in which case the estimates are exact).
+        The sites can be stratified into `n_strata` contiguous, equally sized ranges of sites that are sampled
+        equally, which yields tighter intervals if the features vary along the MSA (e.g. for concatenated genes).
+
+        The number of patterns cannot be estimated from a sample of sites. If `estimate_patterns` is set, it is
+        estimated using a HyperLogLog sketch of the site fingerprints, which requires hashing all sites in a full pass
+        over the MSA but no sorting (relative standard error of about 0.8%).
+
+        Args:
+            precision (float): Target half-width of the confidence intervals. Defaults to 0.01.
+            confidence (float): Confidence level of the confidence intervals. Defaults to 0.95.
+            n_strata (int): Number of strata of sites. Defaults to 1 (uniform sampling).
+            batch_size (int): Number of sites to sample between two checks of the precision. Defaults to 1024.
+            max_sites (int): Maximum number of sites to sample. Defaults to None (no limit).
+            estimate_patterns (bool): Whether to estimate the number of patterns, which requires a full pass over the
+                MSA. Defaults to False.
+            seed (int): Seed of the random number generator. Defaults to None.
+
+        Returns:
+            EstimatedMSAFeatures object containing the estimates and their confidence intervals.
+
+        Raises:
+            PyPythiaException: If the MSA does not contain any sites.
+        """
+        if self.n_sites == 0:
+            raise PyPythiaException("Cannot estimate the features of an empty MSA.")
+
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        max_sites = min(max_sites or self.n_sites, self.n_sites)
+        n_strata = max(1, min(n_strata, max_sites // 2))
+        rng = np.random.default_rng(seed)
+        # contiguous strata of (almost) equal size, the first n_sites % n_strata strata contain one more site
+        stratum_sizes = np.full(n_strata, self.n_sites // n_strata, dtype=np.int64)
+        stratum_sizes[: self.n_sites % n_strata] += 1
+        stratum_starts = np.concatenate([[0], np.cumsum(stratum_sizes)[:-1]])
+        # sorted sampled sites of each stratum (relative to the start of the stratum)
+        sampled = [np.empty(0, dtype=np.int64) for _ in range(n_strata)]
+        sample_sizes = np.zeros(n_strata, dtype=np.int64)
+        # sums of y, x, y^2, x^2, x*y per stratum for the proportion of gaps, of invariant sites, and the entropy
+        sums = np.zeros((3, 5, n_strata))
+        state_masks = _get_state_masks(self.data_type)
+        per_stratum = max(2, batch_size // n_strata)
+
+        while True:
+            remaining_per_stratum = -(-(max_sites - np.sum(sample_sizes)) // n_strata)
+            take = min(per_stratum, remaining_per_stratum)
+            # the sample indices are drawn per batch, so the cost does not depend on the number of sites
+            batch = np.sort(
+                np.concatenate(
+                    [
+                        start
+                        + _sample_new_sites(
+                            rng, size, sites, min(take, size - sites.shape[0])
+                        )
+                        for start, size, sites in zip(
+                            stratum_starts, stratum_sizes, sampled
+                        )
+                    ]
+                )
+            )[: max_sites - np.sum(sample_sizes)]
+            summary = _summarize_sites(self._take_sites(batch), state_masks)
+            stratum = np.searchsorted(stratum_starts, batch, side="right") - 1
+            sample_sizes += np.bincount(stratum, minlength=n_strata)
+            for s in np.unique(stratum):
+                sampled[s] = np.union1d(
+                    sampled[s], batch[stratum == s] - stratum_starts[s]
+                )
+
+            non_full_gap = (summary.gap_counts != self.n_taxa).astype(np.float64)
+            features = [
+                (summary.gap_counts / self.n_taxa * non_full_gap, non_full_gap),
+                (summary.invariant * non_full_gap, non_full_gap),
+                (summary.entropies, np.ones_like(non_full_gap)),
+            ]
+            for feature_sums, (y, x) in zip(sums, features):
+                for i, values in enumerate((y, x, y * y, x * x, x * y)):
+                    feature_sums[i] += np.bincount(
+                        stratum, weights=values, minlength=n_strata
+                    )
+
+            estimates, standard_errors = _ratio_estimates(
+                sums, stratum_sizes, sample_sizes
+            )
+            half_widths = z * standard_errors
+            n_sampled_sites = int(np.sum(sample_sizes))
+            if np.all(half_widths <= precision) or n_sampled_sites >= max_sites:
+                break
+
+        n_patterns = None
+        if estimate_patterns:
+            registers = np.zeros(2**_HLL_PRECISION, dtype=np.uint8)
+            full_gap_fingerprint = _fingerprint_sites(
+                np.full((self.n_taxa, 1), GAP_ORD, dtype=np.uint8)
+            )[0, 0]
+            block_size = _get_block_size(self.n_taxa, self.memory_budget)
+            for start in range(0, self.n_sites, block_size):
+                hashes = _fingerprint_sites(self._get_codes(start, start + block_size))
+                hashes = hashes[:, 0]
+                _hll_add(registers, hashes[hashes != full_gap_fingerprint])
+            value = _hll_estimate(registers)
+            half_width = z * 1.04 / math.sqrt(registers.shape[0]) * value
+            n_patterns = FeatureEstimate(
+                value=value,
+                lower=max(value - half_width, 0.0),
+                upper=min(value + half_width, float(self.n_sites)),
+            )
+
+        proportion_gaps, proportion_invariant, entropy = [
+            FeatureEstimate(
+                value=float(estimate),
+                lower=float(estimate - half_width),
+                upper=float(estimate + half_width),
+            )
+            for estimate, half_width in zip(estimates, half_widths)
+        ]
+        return EstimatedMSAFeatures(
+            n_taxa=self.n_taxa,
+            n_sites=self.n_sites,
+            n_sampled_sites=n_sampled_sites,
+            confidence=confidence,
+            n_patterns=n_patterns,
+            proportion_gaps=proportion_gaps,
+            proportion_invariant=proportion_invariant,
+            entropy=entropy,
+        )
+
+    def _features_from_summary(
+        self, summary: _SiteSummary, timings: Optional[dict[str, float]] = None
+    ) -> MSAFeatures:
+        # the summary may cover a subset of the sites (e.g. a partition)
+        n_sites = summary.gap_counts.shape[0]
+
+        with _timed(timings, "patterns"):
+            full_gap_sites = summary.gap_counts == self.n_taxa
+            n_patterns = summary.pattern_weights.shape[0] - int(np.any(full_gap_sites))
+
+        with _timed(timings, "gaps"):
+            non_full_gap_sites = ~full_gap_sites
+            n_gaps = np.sum(summary.gap_counts[non_full_gap_sites])
+            proportion_gaps = n_gaps / (np.sum(non_full_gap_sites) * self.n_taxa)
+
+        with _timed(timings, "invariant"):
+            invariant_count = np.count_nonzero(summary.invariant & non_full_gap_sites)
+            non_gap_site_count = np.count_nonzero(non_full_gap_sites)
+            # like the proportion of gaps, this is undefined (nan) if the MSA only contains full-gap sites
+            proportion_invariant = (
+                invariant_count / non_gap_site_count if non_gap_site_count else np.nan
+            )
+
+        with _timed(timings, "entropy"):
+            entropy = np.mean(summary.entropies)
+
+        with _timed(timings, "bollback"):
+            pattern_counts = summary.pattern_weights
+            pattern_entropy = np.sum(pattern_counts * np.log(pattern_counts))
+            bollback = pattern_entropy - n_sites * math.log(n_sites)
+
+        return MSAFeatures(
+            n_taxa=self.n_taxa,
+            n_sites=n_sites,
+            n_patterns=n_patterns,
+            proportion_gaps=float(proportion_gaps),
+            proportion_invariant=proportion_invariant,
+            entropy=float(entropy),
+            pattern_entropy=float(pattern_entropy),
+            bollback=float(bollback),
+            timings=timings,
+        )
 
     def get_raxmlng_model(self) -> str:
         """Returns a RAxML-NG model string based on the data type.
@@ -367,41 +1950,197 @@ class MSA:
         Returns:
              RAxML-NG model string
         """
-        if self.data_type == DataType.DNA:
-            return "GTR+G"
-        elif self.data_type == DataType.AA:
-            return "LG+G"
-        elif self.data_type == DataType.MORPH:
-            unique = np.unique(self.sequences)
-            # the number of unique states is irrelevant for RAxML-NG, it only cares about the max state value...
-            num_states = int(max(unique)) + 1
-            return f"MULTI{num_states}_GTR"
-        else:
-            raise PyPythiaException("Unsupported data type: ", self.data_type)
+        return _get_raxmlng_model(
+            self.data_type,
+            self.char_counts if self.data_type == DataType.MORPH else None,
+        )
 
     def write(
-        self, output_file: pathlib.Path, file_format: FileFormat = FileFormat.PHYLIP
+        self,
+        output_file: pathlib.Path,
+        file_format: FileFormat = FileFormat.PHYLIP,
+        taxon_mask: Optional[npt.NDArray[np.bool_]] = None,
+        site_mask: Optional[npt.NDArray[np.bool_]] = None,
+        compress: Optional[bool] = None,
     ):
         """Write the MSA to a file.
 
+        The sequences are streamed row by row from the data matrix into a large write buffer, so no copy of the MSA
+        is created. PHYLIP files are written in sequential relaxed PHYLIP format (one sequence per line), FASTA files
+        contain one sequence per line.
+
+        A subset of the MSA can be written using boolean masks for the taxa and sites. Only one row of the
+        sub-alignment is materialized at a time.
+
+        If sequences or sites were appended to the MSA, the written file (without masks and compression) is added to
+        the MSA cache including the feature accumulators, so the MSA can be loaded and appended to in later runs
+        without parsing the file or recomputing the features.
+
         Args:
             output_file (pathlib.Path): Path to the output file
             file_format (FileFormat): File format to use for writing the MSA. Defaults to FileFormat.PHYLIP
+            taxon_mask (npt.NDArray): Boolean mask of the taxa to write. Defaults to None (all taxa).
+            site_mask (npt.NDArray): Boolean mask of the sites to write. Defaults to None (all sites).
+            compress (bool): Whether to gzip-compress the output. Defaults to None. In this case, the output is
+                compressed if the file name ends with `.gz`.
+
+        Raises:
+            PyPythiaException: If the shape of a mask does not match the MSA.
         """
-        _biopython_sequences = [
-            SeqRecord(Seq(seq.tobytes()), id=taxon)
-            for seq, taxon in zip(self.sequences, self.taxa)
-        ]
-        SeqIO.write(_biopython_sequences, output_file, file_format.value)
+        output_file = pathlib.Path(output_file)
+        rows = _check_mask(taxon_mask, self.n_taxa, "taxon")
+        sites = _check_mask(site_mask, self.n_sites, "site")
+        n_taxa = self.n_taxa if rows is None else int(np.count_nonzero(rows))
+        n_sites = self.n_sites if sites is None else int(np.count_nonzero(sites))
+
+        if compress is None:
+            compress = output_file.suffix == ".gz"
+
+        with _open_output(output_file, compress) as f:
+            if file_format == FileFormat.PHYLIP:
+                f.write(f"{n_taxa} {n_sites}\n".encode())
+
+            for i in range(self.n_taxa) if rows is None else np.flatnonzero(rows):
+                if file_format == FileFormat.PHYLIP:
+                    f.write(f"{self.taxa[i]} ".encode())
+                else:
+                    f.write(f">{self.taxa[i]}\n".encode())
+
+                seq = self._get_sequence(i)
+                f.write(np.ascontiguousarray(seq if sites is None else seq[sites]))
+                f.write(b"\n")
+
+        if (
+            self._accumulators is not None
+            and rows is None
+            and sites is None
+            and not compress
+        ):
+            self._add_to_cache(output_file)
+
+    def _add_to_cache(self, msa_file: pathlib.Path) -> None:
+        # Stores the MSA with its features and accumulators in the MSA cache as the parsed content of msa_file.
+        # The entry is keyed like parse_msa without data type if the data type would be inferred from the file.
+        if self._cache_dir is None:
+            return
+        try:
+            inferred_data_type = _guess_dtype_from_char_counts(self.char_counts)
+        except PyPythiaException:
+            inferred_data_type = None
+        data_type = None if inferred_data_type == self.data_type else self.data_type
+
+        try:
+            cache_file = _get_cache_file(
+                msa_file, pathlib.Path(self._cache_dir), data_type
+            )
+        except OSError:
+            return
+        if _write_cache_file(
+            cache_file,
+            _cache_chunks(
+                self._iter_sequences(),
+                (self.n_taxa, self.n_sites),
+                _cache_metadata(self),
+            ),
+        ):
+            _write_accumulators(
+                _get_accumulator_file(cache_file),
+                self._accumulators,
+                self.n_taxa,
+                cache_file,
+            )
+            self._cache_file = cache_file
+
+
+def _check_mask(
+    mask: Optional[npt.NDArray[np.bool_]], size: int, name: str
+) -> Optional[npt.NDArray[np.bool_]]:
+    if mask is None:
+        return None
+    mask = np.asarray(mask, dtype=np.bool_)
+    if mask.shape != (size,):
+        raise PyPythiaException(
+            f"The {name} mask needs to have shape ({size},), got {mask.shape}."
+        )
+    return mask
+
+
+# size of the write buffer of output files
+_WRITE_BUFFER_SIZE = 2**22
+
+
+def _open_output(output_file: pathlib.Path, compress: bool) -> BinaryIO:
+    # opens output_file for writing with a large write buffer, optionally gzip-compressed
+    if compress:
+        return io.BufferedWriter(
+            gzip.open(output_file, "wb", compresslevel=6),
+            buffer_size=_WRITE_BUFFER_SIZE,
+        )
+    return output_file.open("wb", buffering=_WRITE_BUFFER_SIZE)
+
+
+def _msa_from_cache(
+    cached: Optional[tuple[npt.NDArray[np.uint8], dict]],
+    msa_file: pathlib.Path,
+    memory_budget: Optional[int],
+    cache_dir: Optional[pathlib.Path],
+) -> Optional["MSA"]:
+    # Restores an MSA from the matrix and the metadata of a cache file.
+    # Returns None if there is no cache file or if its metadata cannot be decoded, i.e. a cache miss.
+    if cached is None:
+        return None
+    sequences, metadata = cached
+    try:
+        taxa = np.array(metadata["taxa"])
+        data_type = DataType(metadata["data_type"])
+        char_counts = metadata.get("char_counts")
+        if char_counts is not None:
+            char_counts = np.array(char_counts, dtype=np.int64)
+        sequence_index = metadata.get("sequence_index")
+        if sequence_index is not None:
+            sequence_index = SequenceIndex(
+                representatives=np.array(
+                    sequence_index["representatives"], dtype=np.intp
+                ),
+                full_gap=np.array(sequence_index["full_gap"], dtype=np.bool_),
+            )
+        features = metadata["features"]
+        if features is not None:
+            features = MSAFeatures(**features)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    msa = MSA(taxa, sequences, data_type, msa_file.name, memory_budget, cache_dir)
+    if char_counts is not None:
+        msa.char_counts = char_counts
+    if sequence_index is not None:
+        msa.sequence_index = sequence_index
+        msa._stored_sequence_index = sequence_index
+    msa._cached_features = features
+    return msa
 
 
 def parse_msa(
     msa_file: pathlib.Path,
     file_format: Optional[FileFormat] = None,
     data_type: Optional[DataType] = None,
+    memory_budget: Optional[int] = None,
+    cache_dir: Optional[Union[str, pathlib.Path]] = None,
 ) -> MSA:
     """Parse a multiple sequence alignment file. Note that the file needs to be in FASTA or PHYLIP format.
 
+    The file is read with a native memory-mapped reader that supports relaxed (sequential or interleaved) PHYLIP
+    and FASTA files. For all other dialects, the file is parsed using Biopython.
+    If the data matrix exceeds the given memory budget, it is memory-mapped to a temporary file on disk so that MSAs
+    larger than the available memory can be processed.
+
+    Parsed MSAs are stored in a binary cache in `cache_dir`, keyed by the hash of the file content. The cache file
+    contains the encoded data matrix, the taxon names, and the data type. Results computed later (features, sequence
+    index) are stored in a small sidecar file, so the cache file is never rewritten.
+    Parsing the same file again memory-maps the data matrix from the cache file (read-only) instead of parsing the
+    file. The content hash of each file is memoized by path, size, and modification time, so modified files are
+    detected without hashing unchanged files again.
+
     Per default, the file format and data type are inferred from the file content.
     If the file format cannot be determined, a PyPythiaException is raised. In this case, make sure the file is in
     proper FASTA or PHYLIP format. If you are absolutely sure it is, you can provide the file format manually.
@@ -416,32 +2155,110 @@ def parse_msa(
         msa_file (pathlib.Path): Path to the MSA file
         file_format (FileFormat): File format of the MSA file. Defaults to None. In this case, the file format is determined automatically.
         data_type (DataType): Data type of the sequences. Defaults to None. In this case, the data type is inferred from the sequences.
+        memory_budget (int): Approximate number of bytes available for the data matrix and temporary arrays.
+            Defaults to None (no limit).
+        cache_dir (pathlib.Path): Directory of the binary MSA cache. Defaults to None (no cache). Use
+            `predict.config.DEFAULT_MSA_CACHE_DIR` for the default cache location.
 
     Returns:
         The parsed MSA object.
     """
+    cache_file = None
+    if cache_dir is not None:
+        try:
+            cache_file = _get_cache_file(msa_file, pathlib.Path(cache_dir), data_type)
+        except OSError:
+            # the file cannot be read, parsing it will raise a more informative error
+            cache_file = None
+
+    cached = _read_cache_file(cache_file) if cache_file is not None else None
+    msa = _msa_from_cache(cached, msa_file, memory_budget, cache_dir)
+    if msa is not None:
+        msa._cache_file = cache_file
+        return msa
+
     file_format = file_format or _get_file_format(msa_file)
-    msa_content = StringIO(msa_file.read_text().upper())
-    _msa = AlignIO.read(msa_content, format=file_format.value)
-    sequences = (
-        np.frombuffer(b"".join([rec.seq._data for rec in _msa]), dtype="S1")
-        .reshape(len(_msa), -1)
-        .copy()
-    )
-    taxon_names = np.array([rec.id for rec in _msa])
+    parsed = _read_msa_native(msa_file, file_format, memory_budget)
+    if parsed is None:
+        parsed = _read_msa_biopython(msa_file, file_format, memory_budget)
+
+    taxon_names, codes = parsed
 
+    # the histogram of the raw data is used to infer the data type and mapped to the histogram of the state codes
+    char_counts = _get_char_counts(codes)
     if not data_type:
-        data_type = _guess_dtype(sequences)
+        data_type = _guess_dtype_from_char_counts(char_counts)
+
+    # the raw characters are normalized to state codes in a single lookup table pass
+    lut = _get_normalization_lut(data_type)
+    block_size = _get_block_size(codes.shape[0], memory_budget)
+    for start in range(0, codes.shape[1], block_size):
+        block = codes[:, start : start + block_size]
+        np.take(lut, block, out=block)
+
+    msa = MSA(taxon_names, codes, data_type, msa_file.name, memory_budget, cache_dir)
+    msa.char_counts = _map_char_counts(char_counts, lut)
+    if cache_file is not None and _write_cache_file(
+        cache_file, _cache_chunks(codes, codes.shape, _cache_metadata(msa))
+    ):
+        msa._cache_file = cache_file
+    return msa
 
-    char_mapping = {c: GAP for c in GAP_CHARS}
-    if data_type == DataType.DNA:
-        # replace all U characters with a T for convenience
-        char_mapping.update({b"U": b"T"})
-        char_mapping.update({c: GAP for c in DNA_GAP_CHARS})
 
-    for old_char, new_char in char_mapping.items():
-        sequences[sequences == old_char] = new_char
-    return MSA(taxon_names, sequences, data_type, msa_file.name)
+# Quantiles and histogram bin edges (in bits) of the column entropy summary.
+# The bins are fixed so that the histograms of different MSAs are comparable,
+# column entropies above the last edge are counted in the last bin.
+COLUMN_ENTROPY_QUANTILES = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+COLUMN_ENTROPY_BINS = np.linspace(0.0, 5.0, 21)
+
+
+def summarize_column_entropies(
+    column_entropies: npt.NDArray[np.float32],
+) -> ColumnEntropySummary:
+    """Computes the quantiles and the histogram of the column entropies of an MSA.
+
+    Args:
+        column_entropies (npt.NDArray): Column entropies as returned by `MSA.column_entropy`
+
+    Returns:
+        ColumnEntropySummary object containing the quantiles and the histogram.
+        The quantiles are nan if there are no column entropies.
+    """
+    column_entropies = np.asarray(column_entropies, dtype=np.float64)
+    if column_entropies.shape[0] == 0:
+        quantiles = np.full(len(COLUMN_ENTROPY_QUANTILES), np.nan)
+    else:
+        quantiles = np.quantile(column_entropies, COLUMN_ENTROPY_QUANTILES)
+    histogram, _ = np.histogram(
+        np.minimum(column_entropies, COLUMN_ENTROPY_BINS[-1]), bins=COLUMN_ENTROPY_BINS
+    )
+    return ColumnEntropySummary(quantiles=quantiles, histogram=histogram)
+
+
+def encode_column_entropies(column_entropies: npt.NDArray[np.float32]) -> bytes:
+    """Encodes the column entropies of an MSA as compact binary blob (little-endian float16, 2 bytes per column).
+
+    The relative error of the encoded entropies is below 0.05% (float16 rounding).
+
+    Args:
+        column_entropies (npt.NDArray): Column entropies as returned by `MSA.column_entropy`
+
+    Returns:
+        The encoded column entropies.
+    """
+    return np.asarray(column_entropies, dtype="<f2").tobytes()
+
+
+def decode_column_entropies(blob: bytes) -> npt.NDArray[np.float32]:
+    """Decodes column entropies encoded with `encode_column_entropies`.
+
+    Args:
+        blob (bytes): Encoded column entropies
+
+    Returns:
+        Array of column entropies using the float32 numpy data type.
+    """
+    return np.frombuffer(blob, dtype="<f2").astype(np.float32)
 
 
 def remove_full_gap_sequences(msa: MSA, msa_name: Optional[str] = None) -> MSA:
@@ -459,11 +2276,11 @@ def remove_full_gap_sequences(msa: MSA, msa_name: Optional[str] = None) -> MSA:
     Raises:
         PyPythiaException: If the MSA does not contain any full-gap sequences.
     """
-    if not msa.contains_full_gap_sequences():
+    is_full_gap_sequence = msa._store_sequence_index().full_gap
+    if not np.any(is_full_gap_sequence):
         raise PyPythiaException("No full-gap sequences found in MSA.")
 
-    is_full_gap_sequence = np.all(msa.sequences == GAP, axis=1)
-    non_full_gap_sequences = msa.sequences[~is_full_gap_sequence]
+    non_full_gap_sequences = msa._take_sequences(np.flatnonzero(~is_full_gap_sequence))
     non_full_gap_taxa = msa.taxa[~is_full_gap_sequence]
 
     return MSA(
@@ -475,7 +2292,8 @@ def deduplicate_sequences(msa: MSA, msa_name: Optional[str] = None) -> MSA:
     """Remove duplicate sequences from the MSA.
 
     Note that in case of duplicate sequences, the first occurrence (including the first taxon name) is kept
-    and all subsequent occurrences are removed.
+    and all subsequent occurrences are removed. The order of the remaining sequences is preserved.
+    Use `MSA.get_duplicate_groups` to map the removed taxa to the kept ones.
 
     Args:
         msa (MSA): MSA object to remove duplicate sequences from
@@ -487,12 +2305,13 @@ def deduplicate_sequences(msa: MSA, msa_name: Optional[str] = None) -> MSA:
     Raises:
         PyPythiaException: If the MSA does not contain any duplicate sequences.
     """
-    if not msa.contains_duplicate_sequences():
+    is_first_occurrence = msa._store_sequence_index().representatives == np.arange(
+        msa.n_taxa
+    )
+    if np.all(is_first_occurrence):
         raise PyPythiaException("No duplicate sequences found in MSA.")
 
-    unique_sequences, unique_indices = np.unique(
-        msa.sequences, axis=0, return_index=True
-    )
-    unique_taxa = msa.taxa[unique_indices]
+    unique_sequences = msa._take_sequences(np.flatnonzero(is_first_occurrence))
+    unique_taxa = msa.taxa[is_first_occurrence]
 
-    return MSA(unique_taxa, unique_sequences, msa.data_type, msa_name or msa.name)
\ No newline at end of file
+    return MSA(unique_taxa, unique_sequences, msa.data_type, msa_name or msa.name)
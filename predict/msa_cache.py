@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import pathlib
+import struct
+import tempfile
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_types import DataType
+
+if TYPE_CHECKING:
+    from predict.msa import MSA
+
+# Layout of a cache file: fixed-size header, data matrix (row-major, one byte per character), JSON metadata, footer.
+# Cache files are written once and never modified, results computed later are stored in a sidecar file.
+_CACHE_MAGIC = b"PYPMSA01"
+# Version of the cached content. Increment it whenever the layout of the cache files or the computation of any cached
+# result (features, sequence index, feature accumulators) changes. Cache files of other versions are cache misses.
+_CACHE_VERSION = 2
+_CACHE_HEADER = struct.Struct("<8sQQ")
+_CACHE_FOOTER = struct.Struct("<Q8s")
+_CACHE_MATRIX_OFFSET = 64
+# metadata entries that are computed after the cache file was written and stored in its sidecar file
+_UPDATABLE_METADATA = ("features", "sequence_index")
+
+
+def _file_digest(msa_file: pathlib.Path) -> str:
+    # content hash of the given file, read in chunks of 16 MB
+    digest = hashlib.blake2b(digest_size=16)
+    with msa_file.open("rb") as f:
+        while chunk := f.read(2**24):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_cache_file(
+    msa_file: pathlib.Path, cache_dir: pathlib.Path, data_type: Optional[DataType]
+) -> pathlib.Path:
+    # Returns the cache file for the content of msa_file.
+    # Hashing the content of large files takes several seconds, so the content hash of each file is memoized in
+    # the cache directory using its path, size, and modification time as key.
+    stat = msa_file.stat()
+    file_key = f"{msa_file.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+    index_file = (
+        cache_dir
+        / "index"
+        / hashlib.blake2b(file_key.encode(), digest_size=16).hexdigest()
+    )
+
+    try:
+        digest = index_file.read_text()
+    except OSError:
+        digest = _file_digest(msa_file)
+        _write_cache_file(index_file, [digest.encode()])
+
+    data_type_key = data_type.value if data_type else "auto"
+    return cache_dir / f"{digest}-{data_type_key}.msa"
+
+
+def _write_cache_file(cache_file: pathlib.Path, chunks) -> bool:
+    # Atomically writes the given chunks of bytes to the cache file, i.e. concurrent readers never see partial files.
+    # The cache is optional, so errors (e.g. a read-only file system) are ignored and False is returned.
+    tmp_file = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_file.parent, prefix=".tmp-", delete=False
+        ) as f:
+            tmp_file = pathlib.Path(f.name)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_file, cache_file)
+        return True
+    except OSError:
+        if tmp_file is not None:
+            tmp_file.unlink(missing_ok=True)
+        return False
+
+
+def _get_metadata_file(cache_file: pathlib.Path) -> pathlib.Path:
+    # results computed after the cache file was written are stored next to it, see _update_cache_metadata
+    return cache_file.with_suffix(".json")
+
+
+def _update_cache_metadata(cache_file: pathlib.Path, metadata: dict) -> None:
+    # Stores the computed results (features, sequence index) of the metadata in a small sidecar file of the cache file.
+    # The cache file itself is never rewritten, so updates do not copy the data matrix. The sidecar file is replaced
+    # atomically (see _write_cache_file). Results that are not computed (None) are kept from the current sidecar file.
+    updates = _read_metadata_updates(cache_file)
+    updates.update(
+        {
+            key: metadata[key]
+            for key in _UPDATABLE_METADATA
+            if metadata.get(key) is not None
+        }
+    )
+    _write_cache_file(
+        _get_metadata_file(cache_file),
+        [
+            json.dumps(
+                {"version": _CACHE_VERSION, "cache_key": cache_file.stem, **updates}
+            ).encode()
+        ],
+    )
+
+
+def _read_metadata_updates(cache_file: pathlib.Path) -> dict:
+    # Returns the computed results stored in the sidecar file of the cache file, or an empty dictionary if there is
+    # no valid sidecar file of this cache version for this cache file.
+    try:
+        updates = json.loads(_get_metadata_file(cache_file).read_text())
+    except (OSError, ValueError):
+        return {}
+    if (
+        not isinstance(updates, dict)
+        or updates.get("version") != _CACHE_VERSION
+        or updates.get("cache_key") != cache_file.stem
+    ):
+        return {}
+    return {key: updates[key] for key in _UPDATABLE_METADATA if key in updates}
+
+
+def _cache_chunks(
+    sequences: Iterable[npt.NDArray[np.uint8]], shape: tuple[int, int], metadata: dict
+):
+    n_taxa, n_sites = shape
+    header = _CACHE_HEADER.pack(_CACHE_MAGIC, n_taxa, n_sites)
+    yield header.ljust(_CACHE_MATRIX_OFFSET, b"\0")
+    for row in sequences:
+        # rows of memory-mapped or packed matrices are written one by one to not load the matrix into memory at once
+        yield np.ascontiguousarray(row).tobytes()
+    yield from _metadata_chunks(metadata)
+
+
+def _metadata_chunks(metadata: dict):
+    encoded = json.dumps(metadata).encode()
+    yield encoded
+    yield _CACHE_FOOTER.pack(len(encoded), _CACHE_MAGIC)
+
+
+def _cache_metadata(msa: "MSA") -> dict:
+    features = msa._cached_features
+    # the sequence index is only stored once it was computed
+    sequence_index = msa.__dict__.get("sequence_index")
+    return {
+        "version": _CACHE_VERSION,
+        "taxa": msa.taxa.tolist(),
+        "data_type": msa.data_type.value,
+        "char_counts": msa.char_counts.tolist(),
+        "features": asdict(features) if features is not None else None,
+        "sequence_index": (
+            {name: value.tolist() for name, value in sequence_index._asdict().items()}
+            if sequence_index is not None
+            else None
+        ),
+    }
+
+
+def _read_cache_file(
+    cache_file: pathlib.Path,
+) -> Optional[tuple[npt.NDArray[np.uint8], dict]]:
+    # Returns the memory-mapped data matrix and the metadata of the cache file including the results stored in its
+    # sidecar file, or None if the file does not exist, is not a valid cache file, or was written by another cache
+    # version.
+    try:
+        with cache_file.open("rb") as f:
+            magic, n_taxa, n_sites = _CACHE_HEADER.unpack(f.read(_CACHE_HEADER.size))
+            metadata_offset = _CACHE_MATRIX_OFFSET + n_taxa * n_sites
+            f.seek(-_CACHE_FOOTER.size, os.SEEK_END)
+            metadata_size, footer_magic = _CACHE_FOOTER.unpack(
+                f.read(_CACHE_FOOTER.size)
+            )
+            if (
+                magic != _CACHE_MAGIC
+                or footer_magic != _CACHE_MAGIC
+                or f.tell() != metadata_offset + metadata_size + _CACHE_FOOTER.size
+            ):
+                return None
+            f.seek(metadata_offset)
+            metadata = json.loads(f.read(metadata_size))
+    except (OSError, struct.error, ValueError):
+        return None
+
+    if not isinstance(metadata, dict) or metadata.get("version") != _CACHE_VERSION:
+        # written by another version, e.g. the features may have been computed differently
+        return None
+    metadata.update(_read_metadata_updates(cache_file))
+
+    if n_taxa * n_sites == 0:
+        return np.empty((n_taxa, n_sites), dtype=np.uint8), metadata
+    sequences = np.memmap(
+        cache_file,
+        dtype=np.uint8,
+        mode="r",
+        offset=_CACHE_MATRIX_OFFSET,
+        shape=(n_taxa, n_sites),
+    )
+    return sequences, metadata
@@ -0,0 +1,183 @@
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from predict.custom_errors import PyPythiaException
+
+_OPEN, _CLOSE, _COMMA, _SEMICOLON, _COLON = b"(),;:"
+_QUOTE, _COMMENT_START, _COMMENT_END = b"'[]"
+_COMMENT = re.compile(rb"\[[^\]]*\]")
+
+_STRUCTURAL = np.zeros(256, dtype=np.bool_)
+_STRUCTURAL[[_OPEN, _CLOSE, _COMMA, _SEMICOLON]] = True
+
+
+class NewickTree(NamedTuple):
+    """Topology, branch lengths, and labels of a tree parsed by `parse_newick`.
+
+    The nodes are numbered in postorder, i.e. in the order their labels appear in the Newick string,
+    so the root is the last node and each node comes after all of its descendants.
+
+    Attributes:
+        parents (np.ndarray): Index of the parent of each node, -1 for the root
+        branch_lengths (np.ndarray): Length of the branch above each node, NaN if the node has no branch length
+        labels (np.ndarray): Label of each node (taxon name for leaves), empty string if the node has no label
+        leaves (np.ndarray): Boolean mask of the leaves
+    """
+
+    parents: np.ndarray
+    branch_lengths: np.ndarray
+    labels: np.ndarray
+    leaves: np.ndarray
+
+    @property
+    def taxa(self) -> np.ndarray:
+        return self.labels[self.leaves]
+
+
+def _unquote(label: bytes) -> str:
+    label = label.strip()
+    if len(label) > 1 and label[0] == _QUOTE and label[-1] == _QUOTE:
+        label = label[1:-1].replace(b"''", b"'")
+    return label.decode()
+
+
+def parse_newick(newick_str: str) -> NewickTree:
+    """Parses a Newick string in a single vectorized pass.
+
+    The structural characters (parentheses, commas, colons) outside of quoted labels and comments are located
+    using NumPy, and the parent of each node is determined by searching for the closing parenthesis of its
+    enclosing clade, so no Python object is created per node except for its label.
+    Comments (e.g. `[&R]`) are ignored.
+
+    Args:
+        newick_str (str): Newick string of a single tree
+
+    Returns:
+        NewickTree containing the topology, branch lengths, and labels of the tree.
+
+    Raises:
+        PyPythiaException: If the parentheses of the Newick string are not balanced.
+    """
+    data = newick_str.strip().encode()
+    chars = np.frombuffer(data, dtype=np.uint8)
+
+    # characters within quoted labels or comments are not structural
+    in_quotes = np.cumsum(chars == _QUOTE) % 2 == 1
+    brackets = (chars == _COMMENT_START).astype(np.int64) - (chars == _COMMENT_END)
+    brackets[in_quotes] = 0
+    in_comments = np.cumsum(brackets) > 0
+    active = ~(in_quotes | in_comments)
+
+    positions = np.flatnonzero(active & _STRUCTURAL[chars])
+    kinds = chars[positions]
+    # depth of each structural character (after the character)
+    depths = np.cumsum((kinds == _OPEN).astype(np.int64) - (kinds == _CLOSE))
+    if depths.shape[0] > 0 and (depths[-1] != 0 or depths.min() < 0):
+        raise PyPythiaException("Invalid Newick string: unbalanced parentheses.")
+
+    # the text of each node (label and branch length) starts after a structural character and ends at the next one
+    next_kinds = np.append(kinds[1:], _SEMICOLON)
+    next_positions = np.append(positions[1:], len(data))
+    is_leaf = ((kinds == _OPEN) | (kinds == _COMMA)) & (next_kinds != _OPEN)
+    tokens = np.flatnonzero(is_leaf | (kinds == _CLOSE))
+    starts = positions[tokens] + 1
+    ends = next_positions[tokens]
+    node_depths = depths[tokens]
+    leaves = is_leaf[tokens]
+    if tokens.shape[0] == 0:
+        # a tree consisting of a single leaf
+        end = positions[0] if positions.shape[0] > 0 else len(data)
+        tokens, starts, ends = np.array([0]), np.array([0]), np.array([end])
+        node_depths, leaves = np.array([0]), np.array([True])
+
+    # The parent of a node at depth d is the first closing parenthesis after the node that closes a clade at depth d.
+    # Both are searched at once by sorting the closing parentheses by (depth, position).
+    stride = positions.shape[0] + 1
+    node_index = np.full(stride, -1, dtype=np.int64)
+    node_index[tokens] = np.arange(tokens.shape[0])
+    closes = np.flatnonzero(kinds == _CLOSE)
+    close_keys = (depths[closes] + 1) * stride + closes
+    order = np.argsort(close_keys)
+    close_keys, closes = close_keys[order], closes[order]
+    parents = np.full(starts.shape[0], -1, dtype=np.int64)
+    has_parent = node_depths > 0
+    parent_closes = np.searchsorted(
+        close_keys, node_depths[has_parent] * stride + tokens[has_parent]
+    )
+    parents[has_parent] = node_index[closes[parent_closes]]
+
+    # the branch length follows the last colon of the text of a node
+    colons = np.flatnonzero(active & (chars == _COLON))
+    last_colons = np.searchsorted(colons, ends) - 1
+    has_length = last_colons >= 0
+    has_length[has_length] = colons[last_colons[has_length]] >= starts[has_length]
+    label_ends = ends.copy()
+    label_ends[has_length] = colons[last_colons[has_length]]
+
+    strip_comments = bool(np.any(in_comments))
+    texts = [
+        data[start:end]
+        for start, end in zip(
+            (label_ends[has_length] + 1).tolist(), ends[has_length].tolist()
+        )
+    ]
+    if strip_comments:
+        texts = [_COMMENT.sub(b"", text) for text in texts]
+    branch_lengths = np.full(starts.shape[0], np.nan)
+    branch_lengths[has_length] = [float(text) for text in texts]
+
+    labels = [
+        data[start:end] for start, end in zip(starts.tolist(), label_ends.tolist())
+    ]
+    if strip_comments:
+        labels = [_COMMENT.sub(b"", label) for label in labels]
+    if np.any(in_quotes):
+        labels = [_unquote(label) for label in labels]
+    else:
+        labels = [label.strip().decode() for label in labels]
+    labels = np.array(labels, dtype=object)
+
+    return NewickTree(
+        parents=parents, branch_lengths=branch_lengths, labels=labels, leaves=leaves
+    )
+
+
+class TreeStats(NamedTuple):
+    """Branch length statistics of a tree, see `get_tree_stats`."""
+
+    n_taxa: int
+    total_branch_length: float
+    minimum_branch_length: float
+    maximum_branch_length: float
+    average_branch_length: float
+    std_branch_length: float
+
+
+def get_tree_stats(newick_str: str) -> TreeStats:
+    """Computes all branch length statistics of a tree with a single parse of the Newick string.
+
+    Like `Bio.Phylo` `find_clades(branch_length=True)`, only branches with a non-zero length are taken into account.
+
+    Args:
+        newick_str (str): Newick string of the tree
+
+    Returns:
+        TreeStats object. The statistics are NaN (the total is 0) if the tree has no branch lengths.
+    """
+    tree = parse_newick(newick_str)
+    branch_lengths = tree.branch_lengths[
+        ~np.isnan(tree.branch_lengths) & (tree.branch_lengths != 0)
+    ]
+    n_taxa = int(np.count_nonzero(tree.leaves))
+    if branch_lengths.shape[0] == 0:
+        return TreeStats(n_taxa, 0.0, np.nan, np.nan, np.nan, np.nan)
+    return TreeStats(
+        n_taxa=n_taxa,
+        total_branch_length=float(np.sum(branch_lengths)),
+        minimum_branch_length=float(np.min(branch_lengths)),
+        maximum_branch_length=float(np.max(branch_lengths)),
+        average_branch_length=float(np.mean(branch_lengths)),
+        std_branch_length=float(np.std(branch_lengths)),
+    )
@@ -0,0 +1,356 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+
+# Character of each 4-bit state mask with the bits A=1, C=2, G=4, and T=8, e.g. R (A or G) is 0b0101.
+# The mask 0 does not represent a character, the full mask 0b1111 represents a gap.
+# Together with the 10 ambiguity codes, all normalized DNA characters are covered by the masks 1 to 15.
+_MASK_CHARS = np.frombuffer(b"\0ACMGRSVTWYHKDB-", dtype=np.uint8)
+_CHAR_MASKS = np.zeros(256, dtype=np.uint8)
+_CHAR_MASKS[_MASK_CHARS[1:]] = np.arange(1, 16, dtype=np.uint8)
+
+# 2-bit codes of the unambiguous nucleotides, all other characters are stored as exceptions
+_CODE_CHARS = np.frombuffer(b"ACGT", dtype=np.uint8)
+_MASK_CODES = np.zeros(16, dtype=np.uint8)
+_MASK_CODES[[1, 2, 4, 8]] = np.arange(4, dtype=np.uint8)
+_IS_NUCLEOTIDE_MASK = np.zeros(16, dtype=np.bool_)
+_IS_NUCLEOTIDE_MASK[[1, 2, 4, 8]] = True
+
+_BYTES = np.arange(256, dtype=np.uint8)
+# Characters of the two sites of a byte of the 4-bit layout and of the four sites of a byte of the 2-bit layout.
+# The lookup tables are viewed as a single 16-bit or 32-bit value per byte, so unpacking is a single gather.
+_BYTE_CHARS_4BIT = _MASK_CHARS[np.stack([_BYTES & 15, _BYTES >> 4], axis=1)]
+_BYTE_CHARS_4BIT = _BYTE_CHARS_4BIT.copy().view(np.uint16).reshape(256)
+_BYTE_CHARS_2BIT = _CODE_CHARS[np.stack([(_BYTES >> s) & 3 for s in range(0, 8, 2)], 1)]
+_BYTE_CHARS_2BIT = _BYTE_CHARS_2BIT.copy().view(np.uint32).reshape(256)
+# the four sites of a byte of the 2-bit layout as two bytes of the 4-bit layout
+_BYTE_NIBBLES_2BIT = (
+    np.left_shift(1, _BYTES[:, np.newaxis] >> np.array([0, 4]) & 3)
+    | np.left_shift(1, _BYTES[:, np.newaxis] >> np.array([2, 6]) & 3) << 4
+).astype(np.uint8)
+_BYTE_NIBBLES_2BIT = _BYTE_NIBBLES_2BIT.copy().view(np.uint16).reshape(256)
+
+
+def _build_plane_lut() -> npt.NDArray[np.uint64]:
+    # Lookup table from two bytes of the 4-bit layout (4 sites, little-endian) to the bits of these sites in the
+    # bitplanes: byte k of the result contains the bits of state k (k = 4: non-gap flag) of the 4 sites.
+    values = np.arange(2**16, dtype=np.uint64)
+    lut = np.zeros(2**16, dtype=np.uint64)
+    for site in range(4):
+        masks = (values >> np.uint64(4 * site)) & np.uint64(15)
+        for state in range(4):
+            bits = (masks >> np.uint64(state)) & np.uint64(1)
+            lut |= bits << np.uint64(8 * state + site)
+        lut |= (masks != 15).astype(np.uint64) << np.uint64(32 + site)
+    return lut
+
+
+# The 2-bit layout is used if at most this proportion of the characters are gaps or ambiguous characters.
+# An exception requires 9 bytes, so the 2-bit layout is smaller than the 4-bit layout up to a proportion of 1/36.
+MAX_EXCEPTION_PROPORTION = 1 / 64
+
+# approximate number of bytes of the temporary arrays per chunk of sites when computing the bitplanes
+_PLANE_CHUNK_BYTES = 2**24
+
+
+@dataclass
+class PackedDNA:
+    """Bit-packed data matrix of a DNA MSA.
+
+    Each character is stored as 4-bit state mask (A=1, C=2, G=4, T=8, gaps are the full mask), two sites per byte.
+    Alternatively, if gaps and ambiguous characters are rare, unambiguous nucleotides are stored as 2-bit codes
+    (four sites per byte) and all other characters as exceptions with their position and 4-bit state mask.
+    Compared to one byte per character, this reduces the memory of the data matrix by a factor of 2 or up to 4.
+
+    Kernels that require characters unpack blocks of sites on demand, see `unpack`. Kernels based on state masks
+    (invariant sites, pairwise distances) operate on the 4-bit masks directly, see `site_masks` and
+    `state_planes`.
+
+    Only normalized DNA data can be packed, i.e. uppercase characters where all gap characters (including `N`)
+    are replaced by `-` and `U` is replaced by `T`.
+
+    Attributes:
+        n_sites (int): Number of sites
+        bits (int): Number of bits per character of the data matrix, either 2 or 4
+        data (npt.NDArray[np.uint8]): Packed data matrix of shape `(n_taxa, n_bytes)`. Site `i` of a taxon is stored
+            in byte `i * bits // 8` starting at the least significant bit.
+        exception_index (npt.NDArray[np.int64]): Sorted positions `taxon * n_sites + site` of the characters that
+            are not stored in the 2-bit data matrix. Empty for the 4-bit layout.
+        exception_masks (npt.NDArray[np.uint8]): 4-bit state masks of the exceptions
+    """
+
+    n_sites: int
+    bits: int
+    data: npt.NDArray[np.uint8]
+    exception_index: npt.NDArray[np.int64]
+    exception_masks: npt.NDArray[np.uint8]
+
+    @classmethod
+    def from_codes(
+        cls,
+        codes: npt.NDArray[np.uint8],
+        bits: Optional[int] = None,
+        char_counts: Optional[npt.NDArray[np.int64]] = None,
+    ) -> "PackedDNA":
+        """Packs a data matrix of normalized DNA characters.
+
+        The data matrix is packed one sequence at a time, so memory-mapped data matrices are not loaded into memory.
+
+        Args:
+            codes (npt.NDArray): Data matrix of state codes (ASCII ordinals) of shape `(n_taxa, n_sites)`
+            bits (int): Number of bits per character, either 2 or 4. Defaults to None. In this case, the 2-bit layout
+                is used if at most `MAX_EXCEPTION_PROPORTION` of the characters are gaps or ambiguous characters.
+            char_counts (npt.NDArray): Number of occurrences of each state code in `codes`, see `MSA.char_counts`.
+                Defaults to None. In this case, the characters are counted.
+
+        Returns:
+            PackedDNA object of the data matrix.
+
+        Raises:
+            PyPythiaException: If the data matrix contains characters that are not normalized DNA characters,
+                or if bits is neither 2 nor 4.
+        """
+        n_taxa, n_sites = codes.shape
+        if char_counts is None:
+            char_counts = np.zeros(256, dtype=np.int64)
+            for seq in codes:
+                char_counts += np.bincount(seq, minlength=256)
+
+        invalid = np.flatnonzero((char_counts > 0) & (_CHAR_MASKS == 0))
+        if invalid.shape[0] > 0:
+            chars = ", ".join(repr(chr(c)) for c in invalid)
+            raise PyPythiaException(
+                f"Only normalized DNA data can be packed, found the characters {chars}."
+            )
+
+        if bits is None:
+            n_exceptions = char_counts.sum() - char_counts[_CODE_CHARS].sum()
+            bits = 2 if n_exceptions <= MAX_EXCEPTION_PROPORTION * codes.size else 4
+        if bits not in (2, 4):
+            raise PyPythiaException(f"Packing requires 2 or 4 bits, got {bits}.")
+
+        sites_per_byte = 8 // bits
+        n_padded = math.ceil(n_sites / sites_per_byte) * sites_per_byte
+        data = np.zeros((n_taxa, n_padded // sites_per_byte), dtype=np.uint8)
+        exception_index = []
+        exception_masks = []
+        values = np.zeros(n_padded, dtype=np.uint8)
+
+        for i, seq in enumerate(codes):
+            masks = _CHAR_MASKS[seq]
+            if bits == 2:
+                exceptions = np.flatnonzero(~_IS_NUCLEOTIDE_MASK[masks])
+                exception_index.append(exceptions + i * n_sites)
+                exception_masks.append(masks[exceptions])
+                masks = _MASK_CODES[masks]
+            values[:n_sites] = masks
+            for j in range(sites_per_byte):
+                data[i] |= values[j::sites_per_byte] << (j * bits)
+
+        return cls(
+            n_sites=n_sites,
+            bits=bits,
+            data=data,
+            exception_index=np.concatenate(exception_index or [np.empty(0, np.int64)]),
+            exception_masks=np.concatenate(exception_masks or [np.empty(0, np.uint8)]),
+        )
+
+    @property
+    def n_taxa(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Shape of the unpacked data matrix."""
+        return self.n_taxa, self.n_sites
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes of the packed data matrix including the exceptions."""
+        return (
+            self.data.nbytes + self.exception_index.nbytes + self.exception_masks.nbytes
+        )
+
+    def _exceptions(
+        self, start: int, stop: int
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.intp], npt.NDArray[np.uint8]]:
+        # taxa, sites, and state masks of the exceptions at the sites [start, stop) of all taxa
+        offsets = np.arange(self.n_taxa, dtype=np.int64) * self.n_sites
+        lo = np.searchsorted(self.exception_index, offsets + start)
+        hi = np.searchsorted(self.exception_index, offsets + stop)
+        counts = hi - lo
+        positions = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(
+            counts.sum()
+        )
+        taxa, sites = np.divmod(self.exception_index[positions], self.n_sites)
+        return taxa, sites, self.exception_masks[positions]
+
+    def unpack(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> npt.NDArray[np.uint8]:
+        """Unpacks the characters of a range of sites of all taxa.
+
+        Args:
+            start (int): First site. Defaults to 0.
+            stop (int): End of the range of sites (exclusive). Defaults to None. In this case, all sites from start
+                on are unpacked.
+
+        Returns:
+            Data matrix of state codes of shape `(n_taxa, stop - start)`.
+        """
+        stop = self.n_sites if stop is None else min(stop, self.n_sites)
+        sites_per_byte = 8 // self.bits
+        byte_chars = _BYTE_CHARS_2BIT if self.bits == 2 else _BYTE_CHARS_4BIT
+        first = start // sites_per_byte
+        last = -(-stop // sites_per_byte)
+        chars = byte_chars[self.data[:, first:last]].view(np.uint8)
+        offset = start - first * sites_per_byte
+        chars = chars[:, offset : offset + stop - start]
+
+        if self.bits == 2:
+            taxa, sites, masks = self._exceptions(start, stop)
+            chars[taxa, sites - start] = _MASK_CHARS[masks]
+        return chars
+
+    def unpack_sequence(self, index: int) -> npt.NDArray[np.uint8]:
+        """Unpacks the characters of all sites of a single taxon.
+
+        Args:
+            index (int): Index of the taxon
+
+        Returns:
+            Sequence of state codes of length `n_sites`.
+        """
+        byte_chars = _BYTE_CHARS_2BIT if self.bits == 2 else _BYTE_CHARS_4BIT
+        seq = byte_chars[self.data[index]].view(np.uint8)[: self.n_sites]
+
+        if self.bits == 2:
+            lo, hi = np.searchsorted(
+                self.exception_index, [index * self.n_sites, (index + 1) * self.n_sites]
+            )
+            sites = self.exception_index[lo:hi] - index * self.n_sites
+            seq[sites] = _MASK_CHARS[self.exception_masks[lo:hi]]
+        return seq
+
+    def take(self, sites: npt.NDArray[np.intp]) -> npt.NDArray[np.uint8]:
+        """Unpacks the characters of the given sites of all taxa.
+
+        Args:
+            sites (npt.NDArray): Sorted indices of the sites
+
+        Returns:
+            Data matrix of state codes of shape `(n_taxa, len(sites))`.
+        """
+        sites = np.asarray(sites, dtype=np.intp)
+        sites_per_byte = 8 // self.bits
+        shifts = (sites % sites_per_byte * self.bits).astype(np.uint8)
+        values = (self.data[:, sites // sites_per_byte] >> shifts) & (
+            (1 << self.bits) - 1
+        )
+        if self.bits == 4:
+            return _MASK_CHARS[values]
+
+        chars = _CODE_CHARS[values]
+        if sites.shape[0] > 0:
+            taxa, exception_sites = np.divmod(self.exception_index, self.n_sites)
+            columns = np.minimum(
+                np.searchsorted(sites, exception_sites), sites.shape[0] - 1
+            )
+            selected = sites[columns] == exception_sites
+            chars[taxa[selected], columns[selected]] = _MASK_CHARS[
+                self.exception_masks[selected]
+            ]
+        return chars
+
+    def _nibbles(self, start: int, stop: int) -> npt.NDArray[np.uint8]:
+        # 4-bit state masks of the sites [start, stop) of all taxa packed two sites per byte, start must be even.
+        # For the 4-bit layout, this is a view of the data matrix.
+        if self.bits == 4:
+            return self.data[:, start // 2 : (stop + 1) // 2]
+
+        nibbles = _BYTE_NIBBLES_2BIT[self.data[:, start // 4 : (stop + 3) // 4]]
+        nibbles = nibbles.view(np.uint8)
+        offset = start % 4 // 2
+        nibbles = nibbles[:, offset : offset + (stop - start + 1) // 2]
+
+        taxa, sites, masks = self._exceptions(start, stop)
+        sites -= start
+        # the low and the high nibbles are set separately, so no byte is assigned twice
+        for shift in (0, 4):
+            selected = sites % 2 == shift // 4
+            rows, columns = taxa[selected], sites[selected] // 2
+            nibbles[rows, columns] = (nibbles[rows, columns] & (0xF0 >> shift)) | (
+                masks[selected] << shift
+            )
+        return nibbles
+
+    def site_masks(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> npt.NDArray[np.uint8]:
+        """Returns the bitwise AND of the 4-bit state masks of all taxa at each site.
+
+        The masks are combined on the packed bytes, i.e. two sites per operation. A site is invariant if its mask is
+        not zero, i.e. if all characters can be resolved to a common nucleotide.
+
+        Args:
+            start (int): First site. Defaults to 0.
+            stop (int): End of the range of sites (exclusive). Defaults to None. In this case, all sites from start
+                on are combined.
+
+        Returns:
+            Array of length `stop - start` containing the combined state mask of each site.
+        """
+        stop = self.n_sites if stop is None else min(stop, self.n_sites)
+        aligned_start = start - start % 2
+        combined = np.bitwise_and.reduce(self._nibbles(aligned_start, stop), axis=0)
+        masks = np.stack([combined & 15, combined >> 4], axis=1).reshape(-1)
+        return masks[start - aligned_start : stop - aligned_start]
+
+    def state_planes(self) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint64]]:
+        """Returns the bitplanes of the four nucleotides and the bitplane of non-gap sites of each taxon.
+
+        The bitplanes are derived from the packed 4-bit state masks without unpacking the characters and have the
+        layout of `predict.distance.pack_state_masks`, so they can be passed to
+        `predict.distance.pairwise_distances_from_planes`.
+
+        Returns:
+            The bitplanes of shape `(n_taxa, 4, n_words)` and the bitplane of non-gap sites of shape
+            `(n_taxa, n_words)`, using 64 sites per word. Bits of padding sites are not set.
+        """
+        n_words = math.ceil(self.n_sites / 64)
+        planes = np.zeros((self.n_taxa, 4, n_words), dtype=np.uint64)
+        determined = np.zeros((self.n_taxa, n_words), dtype=np.uint64)
+        plane_bytes = planes.view(np.uint8).reshape(self.n_taxa, 4, -1)
+        determined_bytes = determined.view(np.uint8)
+        low_lut = _build_plane_lut()
+        high_lut = low_lut << np.uint64(4)
+
+        chunk_size = max(64, _PLANE_CHUNK_BYTES // max(1, self.n_taxa) // 32 * 64)
+        for start in range(0, self.n_sites, chunk_size):
+            stop = min(start + chunk_size, self.n_sites)
+            nibbles = self._nibbles(start, stop)
+            # pad to a multiple of 8 sites, i.e. 4 bytes of nibbles per byte of a bitplane
+            n_bytes = -(-nibbles.shape[1] // 4)
+            padded = np.zeros((self.n_taxa, 4 * n_bytes), dtype=np.uint8)
+            padded[:, : nibbles.shape[1]] = nibbles
+            columns = slice(start // 8, start // 8 + n_bytes)
+
+            # byte k of each 64-bit word contains the bits of state k of 8 sites, looked up 4 sites at a time
+            pairs = padded.view(np.uint16)
+            words = low_lut[pairs[:, 0::2]]
+            words |= high_lut[pairs[:, 1::2]]
+            words = words.view(np.uint8).reshape(self.n_taxa, -1, 8)
+            plane_bytes[:, :, columns] = words[:, :, :4].transpose(0, 2, 1)
+            determined_bytes[:, columns] = words[:, :, 4]
+
+        # clear the bits of the padding sites
+        if self.n_sites % 64:
+            padding_mask = np.uint64((1 << (self.n_sites % 64)) - 1)
+            planes[:, :, -1] &= padding_mask
+            determined[:, -1] &= padding_mask
+        return planes, determined
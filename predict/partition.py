@@ -0,0 +1,167 @@
+import pathlib
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+from predict.custom_types import DataType
+
+# substitution models used to infer the data type of a partition from its model string
+# fmt: off
+DNA_MODELS = {
+    "DNA", "JC", "K80", "F81", "HKY", "TN93EF", "TN93", "TN", "TNEF", "K81", "K81UF", "K3P", "K3PU",
+    "TPM1", "TPM1UF", "TPM2", "TPM2UF", "TPM3", "TPM3UF", "TIM1", "TIM1UF", "TIM", "TIMEF", "TIM2", "TIM2UF",
+    "TIM2EF", "TIM3", "TIM3UF", "TIM3EF", "TVMEF", "TVM", "SYM", "GTR",
+}
+AA_MODELS = {
+    "PROT", "AA", "BLOSUM62", "CPREV", "DAYHOFF", "DCMUT", "DEN", "FLU", "HIVB", "HIVW", "JTT", "JTT-DCMUT",
+    "JTTDCMUT", "LG", "LG4M", "LG4X", "MTART", "MTMAM", "MTREV", "MTZOA", "MTMET", "MTVER", "MTINV", "PMB",
+    "RTREV", "STMTREV", "VT", "WAG", "Q.PFAM", "Q.BIRD", "Q.INSECT", "Q.MAMMAL", "Q.PLANT", "Q.YEAST", "POISSON",
+}
+MORPH_MODELS = {"MK", "MORPH", "MULTI"}
+# fmt: on
+
+
+@dataclass
+class Partition:
+    """Partition of an MSA as defined in a RAxML-NG or IQ-TREE partition file.
+
+    Attributes:
+        name (str): Name of the partition
+        model (str): Substitution model of the partition as given in the partition file
+        data_type (DataType): Data type of the partition as inferred from the model.
+            None if the data type cannot be inferred from the model.
+        ranges (list[slice]): Site ranges of the partition as 0-based column slices (with step for codon partitions).
+            Each range can be used to obtain a zero-copy view of the respective sites of the data matrix.
+    """
+
+    name: str
+    model: str
+    data_type: Optional[DataType]
+    ranges: list[slice]
+
+    @property
+    def sites(self) -> npt.NDArray[np.intp]:
+        """Returns the sorted 0-based indices of all sites of the partition."""
+        sites = [np.arange(r.start, r.stop, r.step) for r in self.ranges]
+        return np.unique(np.concatenate(sites)) if sites else np.empty(0, np.intp)
+
+    @property
+    def n_sites(self) -> int:
+        return self.sites.shape[0]
+
+
+def _data_type_from_model(model: str) -> Optional[DataType]:
+    # the base model is the part before any rate heterogeneity, frequency, or parameter specification
+    base_model = re.split(r"[+{]", model.strip(), maxsplit=1)[0].upper()
+    if base_model in DNA_MODELS:
+        return DataType.DNA
+    if base_model in AA_MODELS:
+        return DataType.AA
+    if base_model in MORPH_MODELS or base_model.startswith("MULTI"):
+        return DataType.MORPH
+    return None
+
+
+def _parse_ranges(ranges: str, separator: str) -> list[slice]:
+    # parses site ranges like "1-100, 201-300, 101-200\3" (1-based, inclusive) into 0-based slices
+    slices = []
+    for site_range in ranges.split(separator):
+        site_range = site_range.strip()
+        if not site_range:
+            continue
+        match = re.fullmatch(r"(\d+)(?:\s*-\s*(\d+))?(?:\s*[\\/]\s*(\d+))?", site_range)
+        if match is None:
+            raise PyPythiaException(
+                f"Invalid site range in partition file: {site_range}."
+            )
+        start, end, step = match.groups()
+        start = int(start)
+        end = int(end) if end else start
+        if start < 1 or end < start:
+            raise PyPythiaException(
+                f"Invalid site range in partition file: {site_range}."
+            )
+        slices.append(slice(start - 1, end, int(step) if step else 1))
+    return slices
+
+
+def _parse_raxmlng_partitions(content: str) -> list[Partition]:
+    # RAxML-NG format: one partition per line, e.g. "GTR+G, p1 = 1-100, 201-300"
+    partitions = []
+    for line in content.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        match = re.fullmatch(r"([^,=]+),\s*([^=]+?)\s*=\s*(.+)", line)
+        if match is None:
+            raise PyPythiaException(f"Invalid line in partition file: {line}.")
+        model, name, ranges = match.groups()
+        partitions.append(
+            Partition(
+                name=name,
+                model=model.strip(),
+                data_type=_data_type_from_model(model),
+                ranges=_parse_ranges(ranges, ","),
+            )
+        )
+    return partitions
+
+
+def _parse_nexus_partitions(content: str) -> list[Partition]:
+    # IQ-TREE NEXUS format: "charset p1 = 1-100 201-300;" and optionally "charpartition name = GTR+G:p1, LG:p2;"
+    content = re.sub(r"\[[^\]]*\]", "", content)
+    charsets = {}
+    for name, ranges in re.findall(
+        r"charset\s+(\S+)\s*=\s*([^;]+);", content, flags=re.IGNORECASE
+    ):
+        # the ranges may be prefixed by an alignment file name, e.g. "charset p1 = aln.phy: 1-100;"
+        ranges = ranges.rsplit(":", 1)[-1]
+        charsets[name] = _parse_ranges(ranges.replace(",", " "), " ")
+
+    models = {}
+    for assignments in re.findall(
+        r"charpartition\s+\S+\s*=\s*([^;]+);", content, flags=re.IGNORECASE
+    ):
+        for assignment in assignments.split(","):
+            model, _, name = assignment.strip().rpartition(":")
+            models[name.strip()] = model.strip()
+
+    return [
+        Partition(
+            name=name,
+            model=models.get(name, ""),
+            data_type=_data_type_from_model(models.get(name, "")),
+            ranges=ranges,
+        )
+        for name, ranges in charsets.items()
+    ]
+
+
+def parse_partition_file(partition_file: pathlib.Path) -> list[Partition]:
+    """Parses a RAxML-NG or IQ-TREE (NEXUS) partition file.
+
+    Supported formats are the RAxML-NG format (one partition per line, e.g. `GTR+G, p1 = 1-100, 201-300\\3`)
+    that is also supported by IQ-TREE, and the NEXUS format with `charset` and `charpartition` commands.
+
+    Args:
+        partition_file (pathlib.Path): Path to the partition file
+
+    Returns:
+        List of partitions in the order of the partition file.
+
+    Raises:
+        PyPythiaException: If the partition file is invalid or does not contain any partitions.
+    """
+    content = pathlib.Path(partition_file).read_text()
+    if content.lstrip().upper().startswith("#NEXUS"):
+        partitions = _parse_nexus_partitions(content)
+    else:
+        partitions = _parse_raxmlng_partitions(content)
+
+    if not partitions:
+        raise PyPythiaException(f"No partitions found in {partition_file}.")
+    return partitions
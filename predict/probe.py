@@ -0,0 +1,257 @@
+import json
+import mmap
+import pathlib
+from dataclasses import asdict, dataclass
+from typing import Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_types import DataType, FileFormat
+from predict.msa import (
+    _DIGIT_TABLE,
+    _DNA_CHAR_TABLE,
+    _UPPERCASE_LUT,
+    _WHITESPACE_TABLE,
+    _count_fasta_sites,
+    _find_phylip_name_end,
+    _get_file_format,
+    _get_normalization_lut,
+    _get_raxmlng_model,
+    _guess_dtype_from_char_counts,
+    _iter_lines,
+    _locate_fasta_records,
+    _map_char_counts,
+    _read_phylip_header,
+    parse_msa,
+)
+from predict.msa_cache import _write_cache_file
+from predict.sites import _get_char_counts
+
+
+@dataclass
+class MSAMetadata:
+    """Metadata of an MSA file as determined by `probe_msa`.
+
+    Attributes:
+        file_format (FileFormat): File format of the MSA file
+        n_taxa (int): Number of taxa
+        n_sites (int): Number of sites
+        data_type (DataType): Data type of the sequences
+        raxmlng_model (str): RAxML-NG model string, see `MSA.get_raxmlng_model`
+    """
+
+    file_format: FileFormat
+    n_taxa: int
+    n_sites: int
+    data_type: DataType
+    raxmlng_model: str
+
+
+_PROBE_BATCH_SIZE = 2**20
+_MANIFEST_VERSION = 1
+
+
+def _probe_char_counts(
+    buffer: mmap.mmap, sequence_bounds, max_bytes: Optional[int]
+) -> npt.NDArray[np.int64]:
+    """Computes the byte histogram of the sequence data at the given bounds of the buffer with a bounded scan.
+
+    The scan stops early once the data type is decided or max_bytes bytes of sequence data were scanned.
+    Morphological data is scanned completely since its RAxML-NG model depends on the maximum state.
+
+    Returns:
+        Byte histogram of the scanned (raw) sequence data, excluding whitespace.
+    """
+    char_counts = np.zeros(256, dtype=np.int64)
+    batch = []
+    batch_size = 0
+    n_scanned = 0
+
+    for start, line_end in sequence_bounds:
+        end = line_end
+        if max_bytes is not None:
+            end = min(end, start + max_bytes - n_scanned)
+        if end > start:
+            batch.append(buffer[start:end])
+            batch_size += end - start
+            n_scanned += end - start
+
+        bound_reached = max_bytes is not None and n_scanned >= max_bytes
+        if batch_size >= _PROBE_BATCH_SIZE or bound_reached:
+            char_counts += _get_char_counts([np.frombuffer(b"".join(batch), np.uint8)])
+            batch = []
+            batch_size = 0
+
+            present = _map_char_counts(char_counts, _UPPERCASE_LUT) > 0
+            if np.any(present & _DIGIT_TABLE):
+                # morphological data, scan the remainder of the current line as well
+                max_bytes = None
+                batch.append(buffer[max(start, end) : line_end])
+            elif np.any(present & ~_DNA_CHAR_TABLE & ~_WHITESPACE_TABLE):
+                # protein data, assuming that a digit (i.e. morphological data) would have shown up by now
+                break
+            elif bound_reached:
+                break
+
+    char_counts += _get_char_counts([np.frombuffer(b"".join(batch), np.uint8)])
+    char_counts[_WHITESPACE_TABLE] = 0
+    return char_counts
+
+
+def _probe_phylip(
+    buffer: mmap.mmap, max_bytes: Optional[int]
+) -> Optional[tuple[int, int, npt.NDArray]]:
+    # Returns the dimensions and the (bounded) byte histogram of relaxed PHYLIP data or None if the dialect is not supported
+    lines = _iter_lines(buffer)
+    header = _read_phylip_header(buffer, lines)
+    if header is None:
+        return None
+
+    n_taxa, n_sites = header
+    char_counts = _probe_char_counts(
+        buffer, _iter_phylip_sequences(buffer, lines, n_taxa), max_bytes
+    )
+    return n_taxa, n_sites, char_counts
+
+
+def _iter_phylip_sequences(buffer: mmap.mmap, lines, n_taxa: int):
+    # yields the bounds of the sequence data of each line of PHYLIP data, i.e. without the taxon names
+    for i, (start, end) in enumerate(lines):
+        if i < n_taxa:
+            start = _find_phylip_name_end(buffer, start, end)
+            if start == -1:
+                # line without sequence data
+                continue
+        yield start, end
+
+
+def _probe_fasta(
+    buffer: mmap.mmap, max_bytes: Optional[int]
+) -> Optional[tuple[int, int, npt.NDArray]]:
+    # Returns the dimensions and the (bounded) byte histogram of FASTA data or None if the dialect is not supported
+    located = _locate_fasta_records(buffer)
+    if located is None:
+        return None
+
+    _, records = located
+    n_sites = _count_fasta_sites(buffer, *records[0])
+    return len(records), n_sites, _probe_char_counts(buffer, records, max_bytes)
+
+
+def probe_msa(
+    msa_file: pathlib.Path,
+    file_format: Optional[FileFormat] = None,
+    max_bytes: Optional[int] = 2**24,
+) -> MSAMetadata:
+    """Determines the file format, dimensions, data type, and RAxML-NG model of an MSA file without parsing it.
+
+    The dimensions are read from the PHYLIP header or from the FASTA record headers and the length of the first
+    record. The data type is inferred like in `parse_msa`, but from a bounded streaming scan of the sequence data:
+    the scan stops as soon as the data is identified as protein data, or after `max_bytes` bytes of sequence data.
+    Morphological data is always scanned completely as the RAxML-NG model depends on the maximum state value.
+    If the file uses a dialect not supported by the native reader, the file is parsed using `parse_msa`.
+
+    Note that the data type is inferred from a prefix of the sequence data. In the unlikely case that e.g. the first
+    `max_bytes` bytes of a protein MSA only contain nucleotide characters, the MSA is assumed to be DNA data.
+    Set `max_bytes` to None to scan the complete MSA.
+
+    Args:
+        msa_file (pathlib.Path): Path to the MSA file
+        file_format (FileFormat): File format of the MSA file. Defaults to None. In this case, the file format is determined automatically.
+        max_bytes (int): Maximum number of bytes of sequence data to scan. Defaults to 16 MB.
+
+    Returns:
+        MSAMetadata object containing the metadata of the MSA file.
+
+    Raises:
+        PyPythiaException: If the file format or data type cannot be determined.
+    """
+    msa_file = pathlib.Path(msa_file)
+    file_format = file_format or _get_file_format(msa_file)
+    prober = _probe_fasta if file_format == FileFormat.FASTA else _probe_phylip
+
+    with msa_file.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            probed = prober(buffer, max_bytes)
+
+    if probed is None:
+        msa = parse_msa(msa_file, file_format)
+        return MSAMetadata(
+            file_format=file_format,
+            n_taxa=msa.n_taxa,
+            n_sites=msa.n_sites,
+            data_type=msa.data_type,
+            raxmlng_model=msa.get_raxmlng_model(),
+        )
+
+    n_taxa, n_sites, char_counts = probed
+    data_type = _guess_dtype_from_char_counts(char_counts)
+    # the model depends on the state codes of parse_msa (e.g. all gap characters replaced by GAP)
+    char_counts = _map_char_counts(char_counts, _get_normalization_lut(data_type))
+
+    return MSAMetadata(
+        file_format=file_format,
+        n_taxa=n_taxa,
+        n_sites=n_sites,
+        data_type=data_type,
+        raxmlng_model=_get_raxmlng_model(data_type, char_counts),
+    )
+
+
+def probe_msas(
+    msa_files: list[Union[str, pathlib.Path]],
+    manifest_file: Optional[pathlib.Path] = None,
+    max_bytes: Optional[int] = 2**24,
+) -> dict[str, MSAMetadata]:
+    """Probes multiple MSA files using `probe_msa` and persists the results in a manifest file.
+
+    The manifest is a JSON file storing the metadata of each probed file together with its size and modification
+    time. Files that were probed before and did not change since are not probed again, so repeated calls (e.g. when
+    building the Snakemake DAG for thousands of MSAs) only need to read the manifest.
+
+    Args:
+        msa_files (list[pathlib.Path]): Paths to the MSA files
+        manifest_file (pathlib.Path): Path to the manifest file. Defaults to None. In this case, no manifest is used.
+        max_bytes (int): Maximum number of bytes of sequence data to scan per file, see `probe_msa`.
+
+    Returns:
+        Dictionary mapping each path (as given in `msa_files`) to the metadata of the MSA file.
+    """
+    entries = {}
+    if manifest_file is not None:
+        try:
+            manifest = json.loads(pathlib.Path(manifest_file).read_text())
+            if manifest.get("version") == _MANIFEST_VERSION:
+                entries = manifest["entries"]
+        except (OSError, ValueError, KeyError):
+            entries = {}
+
+    metadata = {}
+    modified = False
+    for msa_file in msa_files:
+        path = pathlib.Path(msa_file)
+        stat = path.stat()
+        key = str(path.resolve())
+        file_key = [stat.st_size, stat.st_mtime_ns, max_bytes]
+
+        entry = entries.get(key)
+        if entry is not None and entry["file"] == file_key:
+            probed = MSAMetadata(**entry["metadata"])
+            probed.file_format = FileFormat(probed.file_format)
+            probed.data_type = DataType(probed.data_type)
+        else:
+            probed = probe_msa(path, max_bytes=max_bytes)
+            entry_metadata = asdict(probed)
+            entry_metadata["file_format"] = probed.file_format.value
+            entry_metadata["data_type"] = probed.data_type.value
+            entries[key] = {"file": file_key, "metadata": entry_metadata}
+            modified = True
+
+        metadata[str(msa_file)] = probed
+
+    if manifest_file is not None and modified:
+        manifest = {"version": _MANIFEST_VERSION, "entries": entries}
+        _write_cache_file(pathlib.Path(manifest_file), [json.dumps(manifest).encode()])
+
+    return metadata
@@ -0,0 +1,494 @@
+import pathlib
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+from predict.newick import NewickTree, parse_newick
+
+# approximate number of elements of the tree x bipartition incidence matrix block that is multiplied at once
+_INCIDENCE_BLOCK_SIZE = 2**24
+
+
+@dataclass
+class RFDistances:
+    """Robinson-Foulds (RF) distances between all pairs of a set of unrooted trees.
+
+    Attributes:
+        taxa (npt.NDArray): Sorted taxon names shared by all trees. Bit `i` of a bipartition bitset is the taxon `taxa[i]`.
+        distances (npt.NDArray[np.int64]): Matrix of the absolute RF distances, i.e. for each pair of trees the number
+            of non-trivial bipartitions that are contained in only one of the two trees.
+        topologies (npt.NDArray[np.int64]): Index of the unique topology of each tree. The topologies are numbered
+            in the order of their first occurrence, trees with an RF distance of 0 have the same index.
+    """
+
+    taxa: npt.NDArray
+    distances: npt.NDArray[np.int64]
+    topologies: npt.NDArray[np.int64]
+
+    @property
+    def n_trees(self) -> int:
+        return self.topologies.shape[0]
+
+    @property
+    def n_taxa(self) -> int:
+        return self.taxa.shape[0]
+
+    @property
+    def num_topos(self) -> int:
+        """Returns the number of unique topologies of the given set of trees."""
+        return int(self.topologies.max()) + 1 if self.n_trees > 0 else 0
+
+    @property
+    def max_rfdist(self) -> int:
+        """Returns the maximum RF distance between two trees with `n_taxa` taxa, i.e. 2 * (n_taxa - 3)."""
+        return max(2 * (self.n_taxa - 3), 0)
+
+    @property
+    def relative_distances(self) -> npt.NDArray[np.float64]:
+        """Returns the matrix of the RF distances relative to the maximum RF distance (values between 0.0 and 1.0)."""
+        if self.max_rfdist == 0:
+            return np.zeros(self.distances.shape)
+        return self.distances / self.max_rfdist
+
+    @property
+    def avg_rfdist(self) -> float:
+        """Returns the absolute RF distance averaged over all pairs of trees."""
+        if self.n_trees < 2:
+            return 0.0
+        return float(self.distances[np.triu_indices(self.n_trees, k=1)].mean())
+
+    @property
+    def avg_rel_rfdist(self) -> float:
+        """Returns the relative RF distance averaged over all pairs of trees."""
+        if self.max_rfdist == 0:
+            return 0.0
+        return self.avg_rfdist / self.max_rfdist
+
+    @property
+    def clusters(self) -> list[npt.NDArray[np.int64]]:
+        """Returns the indices of the trees of each unique topology in the order of the topology indices."""
+        order = np.argsort(self.topologies, kind="stable")
+        bounds = np.searchsorted(self.topologies[order], np.arange(1, self.num_topos))
+        return np.split(order, bounds)
+
+
+def _parse_trees(trees: Iterable[Union[str, NewickTree]]) -> list[NewickTree]:
+    return [parse_newick(tree) if isinstance(tree, str) else tree for tree in trees]
+
+
+def _split_leaf_ranges(
+    tree: NewickTree, n_taxa: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # Returns the first and last leaf (in the order of the leaves of the tree) of the subtrees that induce the
+    # distinct non-trivial bipartitions of the tree. The nodes are in postorder, so the leaves of each subtree are
+    # consecutive. The last leaf of a subtree is the last leaf before its root, the first leaf is found by following
+    # the first children (pointer jumping, the number of iterations is logarithmic in the height of the tree).
+    n_nodes = tree.leaves.shape[0]
+    nodes = np.arange(n_nodes)
+    leaf_counts = np.cumsum(tree.leaves)
+    last_leaves = leaf_counts - 1
+    has_parent = tree.parents >= 0
+    first_children = np.full(n_nodes, n_nodes)
+    np.minimum.at(first_children, tree.parents[has_parent], nodes[has_parent])
+    first_leaves = np.where(tree.leaves, nodes, first_children)
+    while True:
+        jumped = first_leaves[first_leaves]
+        if np.array_equal(jumped, first_leaves):
+            break
+        first_leaves = jumped
+    first_leaves = leaf_counts[first_leaves] - 1
+
+    sizes = last_leaves - first_leaves + 1
+    is_split = ~tree.leaves & has_parent & (sizes >= 2) & (sizes <= n_taxa - 2)
+    # the two children of a bifurcating root induce the same bipartition
+    root_children = np.flatnonzero(tree.parents == n_nodes - 1)
+    if root_children.shape[0] == 2:
+        is_split[root_children[1]] = False
+    splits = np.flatnonzero(is_split)
+    return first_leaves[splits], last_leaves[splits]
+
+
+def _taxon_indices(
+    tree: NewickTree, taxon_index: dict[str, int]
+) -> npt.NDArray[np.int64]:
+    try:
+        return np.array([taxon_index[taxon] for taxon in tree.taxa], dtype=np.int64)
+    except KeyError as e:
+        raise PyPythiaException(f"Unknown taxon {e} in tree.") from e
+
+
+def _shared_taxon_index(trees: list[NewickTree]) -> dict[str, int]:
+    # index of each taxon in the sorted taxon names, all trees need to contain the same taxa
+    taxa = np.sort(trees[0].taxa)
+    taxon_index = {taxon: i for i, taxon in enumerate(taxa)}
+    for tree in trees:
+        if len(taxon_index) != tree.taxa.shape[0] or not np.array_equal(
+            np.sort(tree.taxa), taxa
+        ):
+            raise PyPythiaException(
+                "All trees need to contain the same taxa, each taxon exactly once."
+            )
+    return taxon_index
+
+
+def tree_bipartitions(
+    tree: NewickTree, taxon_index: dict[str, int]
+) -> npt.NDArray[np.uint64]:
+    """Encodes the non-trivial bipartitions of an unrooted tree as bitsets over a shared taxon index.
+
+    Each bipartition is induced by the branch above an inner node and is represented by the side that does not
+    contain the taxon with index 0. The root of the Newick string is ignored, i.e. the branches of a rooted binary
+    tree above the two children of the root induce the same bipartition.
+
+    Args:
+        tree (NewickTree): Parsed tree as returned by `parse_newick` (or a `CompactTree` of a `TreeSet`)
+        taxon_index (dict[str, int]): Index of each taxon of the tree, the indices need to be 0, ..., n_taxa - 1
+
+    Returns:
+        Array of shape (n_bipartitions, ceil(n_taxa / 64)) containing the distinct bipartitions of the tree.
+        Bit `j` of word `i` is set if the taxon with index `64 * i + j` is in the bipartition.
+    """
+    n_taxa = len(taxon_index)
+    n_words = max(1, (n_taxa + 63) // 64)
+    first_leaves, last_leaves = _split_leaf_ranges(tree, n_taxa)
+
+    # the bitset of the leaves first..last of a subtree is the XOR of the prefix bitsets of last + 1 and first
+    taxa = _taxon_indices(tree, taxon_index)
+    prefixes = np.zeros((taxa.shape[0] + 1, n_words), dtype=np.uint64)
+    prefixes[np.arange(1, taxa.shape[0] + 1), taxa // 64] = np.left_shift(
+        np.uint64(1), (taxa % 64).astype(np.uint64)
+    )
+    prefixes = np.bitwise_xor.accumulate(prefixes, axis=0)
+    bipartitions = prefixes[last_leaves + 1] ^ prefixes[first_leaves]
+
+    # canonical representation: the side not containing the taxon with index 0
+    all_taxa = np.full(n_words, np.iinfo(np.uint64).max, dtype=np.uint64)
+    if n_taxa % 64:
+        all_taxa[-1] = np.uint64((1 << (n_taxa % 64)) - 1)
+    complement = (bipartitions[:, 0] & np.uint64(1)).astype(np.bool_)
+    bipartitions[complement] ^= all_taxa
+    return bipartitions
+
+
+def compute_rfdistances(trees: Iterable[Union[str, NewickTree]]) -> RFDistances:
+    """Computes the RF distances between all pairs of the given trees.
+
+    The bipartitions of all trees are encoded as bitsets over the sorted taxon names that are hashed to assign a
+    unique index to each distinct bipartition. Trees with the same set of bipartitions share a topology, and the
+    number of shared bipartitions is computed once per pair of unique topologies as a product of the (blocked)
+    incidence matrix of topologies and bipartitions with its transpose. As IQ-TREE (-rf_all) and RAxML-NG
+    (--rfdist), the trees are treated as unrooted and multifurcations are supported.
+
+    Args:
+        trees (Iterable[Union[str, NewickTree]]): Newick strings or parsed trees (e.g. the trees of a `TreeSet`)
+
+    Returns:
+        RFDistances object containing the pairwise RF distances and the unique topologies.
+
+    Raises:
+        PyPythiaException: If the trees do not contain the same taxa or if a tree contains a taxon more than once.
+    """
+    trees = _parse_trees(trees)
+    if not trees:
+        return RFDistances(
+            taxa=np.empty(0, dtype=object),
+            distances=np.zeros((0, 0), dtype=np.int64),
+            topologies=np.empty(0, dtype=np.int64),
+        )
+
+    taxon_index = _shared_taxon_index(trees)
+    bipartitions = [tree_bipartitions(tree, taxon_index) for tree in trees]
+    n_bipartitions = np.array([b.shape[0] for b in bipartitions])
+    # the bitsets are hashed as byte strings to obtain an index for each distinct bipartition
+    bipartition_index = {}
+    row_size = bipartitions[0].shape[1] * 8
+    bitsets = np.concatenate(bipartitions).tobytes()
+    bipartition_ids = np.array(
+        [
+            bipartition_index.setdefault(
+                bitsets[i : i + row_size], len(bipartition_index)
+            )
+            for i in range(0, len(bitsets), row_size)
+        ],
+        dtype=np.int64,
+    )
+    bipartition_ids = np.split(bipartition_ids, np.cumsum(n_bipartitions)[:-1])
+
+    topology_index = {}
+    topologies = np.empty(len(trees), dtype=np.int64)
+    unique_ids = []
+    for i, ids in enumerate(bipartition_ids):
+        ids = np.unique(ids)
+        key = ids.tobytes()
+        if key not in topology_index:
+            topology_index[key] = len(unique_ids)
+            unique_ids.append(ids)
+        topologies[i] = topology_index[key]
+
+    # number of shared bipartitions of each pair of unique topologies
+    n_topologies = len(unique_ids)
+    sizes = np.array([ids.shape[0] for ids in unique_ids], dtype=np.int64)
+    rows = np.repeat(np.arange(n_topologies), sizes)
+    columns = np.concatenate(unique_ids)
+    # bipartitions contained in a single topology are not shared by any pair and are skipped
+    in_multiple = np.bincount(columns)[columns] > 1
+    rows, columns = rows[in_multiple], columns[in_multiple]
+    _, columns = np.unique(columns, return_inverse=True)
+    columns = columns.ravel()
+    order = np.argsort(columns, kind="stable")
+    rows, columns = rows[order], columns[order]
+    n_columns = int(columns[-1]) + 1 if columns.shape[0] > 0 else 0
+    block_size = max(1, _INCIDENCE_BLOCK_SIZE // n_topologies)
+    shared = np.zeros((n_topologies, n_topologies), dtype=np.int64)
+    for start in range(0, n_columns, block_size):
+        lo, hi = np.searchsorted(columns, [start, start + block_size])
+        incidence = np.zeros(
+            (n_topologies, min(block_size, n_columns - start)), dtype=np.float32
+        )
+        incidence[rows[lo:hi], columns[lo:hi] - start] = 1
+        shared += np.rint(incidence @ incidence.T).astype(np.int64)
+    np.fill_diagonal(shared, sizes)
+
+    distances = sizes[:, np.newaxis] + sizes[np.newaxis, :] - 2 * shared
+    return RFDistances(
+        taxa=np.array(list(taxon_index), dtype=object),
+        distances=distances[np.ix_(topologies, topologies)],
+        topologies=topologies,
+    )
+
+
+@dataclass
+class TopologyClusters:
+    """Clusters of trees with the same unrooted topology.
+
+    Attributes:
+        clusters (npt.NDArray[np.int64]): Cluster ID of each tree. The clusters are numbered in the order of their
+            first occurrence.
+        representatives (npt.NDArray[np.int64]): Index of the representative tree of each cluster, i.e. the first
+            tree of the cluster.
+    """
+
+    clusters: npt.NDArray[np.int64]
+    representatives: npt.NDArray[np.int64]
+
+    @property
+    def n_trees(self) -> int:
+        return self.clusters.shape[0]
+
+    @property
+    def num_topos(self) -> int:
+        return self.representatives.shape[0]
+
+    def save(self, cluster_file: pathlib.Path) -> None:
+        """Writes the cluster index as tab-separated table (tree index, cluster ID, index of the representative tree).
+
+        Args:
+            cluster_file (pathlib.Path): Path of the cluster index file
+        """
+        table = np.column_stack(
+            [
+                np.arange(self.n_trees),
+                self.clusters,
+                self.representatives[self.clusters],
+            ]
+        )
+        np.savetxt(
+            cluster_file,
+            table,
+            fmt="%d",
+            delimiter="\t",
+            header="tree\tcluster\trepresentative",
+            comments="",
+        )
+
+    @classmethod
+    def load(cls, cluster_file: pathlib.Path) -> "TopologyClusters":
+        """Reads a cluster index file written by `TopologyClusters.save`.
+
+        Args:
+            cluster_file (pathlib.Path): Path of the cluster index file
+
+        Returns:
+            TopologyClusters object.
+        """
+        table = np.loadtxt(
+            cluster_file, dtype=np.int64, delimiter="\t", skiprows=1, ndmin=2
+        )
+        clusters = table[:, 1]
+        representatives = np.zeros(
+            int(clusters.max()) + 1 if clusters.shape[0] > 0 else 0, dtype=np.int64
+        )
+        representatives[clusters] = table[:, 2]
+        return cls(clusters=clusters, representatives=representatives)
+
+
+def _taxon_hashes(n_taxa: int) -> npt.NDArray[np.uint64]:
+    # fixed random 128-bit hash of each taxon index
+    rng = np.random.default_rng(0)
+    return rng.integers(
+        0, np.iinfo(np.uint64).max, (n_taxa, 2), dtype=np.uint64, endpoint=True
+    )
+
+
+def topology_key(
+    tree: NewickTree,
+    taxon_index: dict[str, int],
+    taxon_hashes: Optional[npt.NDArray[np.uint64]] = None,
+) -> bytes:
+    """Computes a canonical key of the unrooted topology of a tree in time linear in the number of taxa.
+
+    Each non-trivial bipartition is hashed as the XOR of random 128-bit hashes of the taxa on the side that does not
+    contain the taxon with index 0, and the key is the sorted list of these hashes. Trees have the same key if and
+    only if they have the same unrooted topology (up to hash collisions, which are practically impossible),
+    regardless of the rooting, the order of the children, and the branch lengths.
+
+    Args:
+        tree (NewickTree): Parsed tree as returned by `parse_newick` (or a `CompactTree` of a `TreeSet`)
+        taxon_index (dict[str, int]): Index of each taxon of the tree, the indices need to be 0, ..., n_taxa - 1
+        taxon_hashes (npt.NDArray[np.uint64], optional): Hashes of the taxa. Defaults to the fixed hashes used by
+            `cluster_topologies`, so keys of trees over the same taxa are comparable across calls.
+
+    Returns:
+        Topology key as bytes.
+    """
+    n_taxa = len(taxon_index)
+    if taxon_hashes is None:
+        taxon_hashes = _taxon_hashes(n_taxa)
+    first_leaves, last_leaves = _split_leaf_ranges(tree, n_taxa)
+
+    # the hash of the leaves first..last of a subtree is the XOR of the prefix hashes of last + 1 and first
+    taxa = _taxon_indices(tree, taxon_index)
+    prefixes = np.zeros((taxa.shape[0] + 1, 2), dtype=np.uint64)
+    prefixes[1:] = np.bitwise_xor.accumulate(taxon_hashes[taxa], axis=0)
+    hashes = prefixes[last_leaves + 1] ^ prefixes[first_leaves]
+
+    # canonical representation: the side not containing the taxon with index 0
+    first_taxon = np.flatnonzero(taxa == 0)[0]
+    complement = (first_leaves <= first_taxon) & (first_taxon <= last_leaves)
+    hashes[complement] ^= prefixes[-1]
+
+    hashes = hashes[np.lexsort((hashes[:, 1], hashes[:, 0]))]
+    return hashes.tobytes()
+
+
+def cluster_topologies(trees: Iterable[Union[str, NewickTree]]) -> TopologyClusters:
+    """Clusters trees with the same unrooted topology.
+
+    The trees are grouped by their topology key (see `topology_key`), so the run time is linear in the number of
+    trees times the number of taxa (up to the sorting of the bipartition hashes of each tree).
+
+    Args:
+        trees (Iterable[Union[str, NewickTree]]): Newick strings or parsed trees (e.g. the trees of a `TreeSet`)
+
+    Returns:
+        TopologyClusters object containing the cluster ID of each tree and the representative of each cluster.
+
+    Raises:
+        PyPythiaException: If the trees do not contain the same taxa or if a tree contains a taxon more than once.
+    """
+    trees = _parse_trees(trees)
+    if not trees:
+        return TopologyClusters(
+            clusters=np.empty(0, dtype=np.int64),
+            representatives=np.empty(0, dtype=np.int64),
+        )
+
+    taxon_index = _shared_taxon_index(trees)
+    taxon_hashes = _taxon_hashes(len(taxon_index))
+    cluster_index = {}
+    clusters = np.empty(len(trees), dtype=np.int64)
+    representatives = []
+    for i, tree in enumerate(trees):
+        key = topology_key(tree, taxon_index, taxon_hashes)
+        if key not in cluster_index:
+            cluster_index[key] = len(representatives)
+            representatives.append(i)
+        clusters[i] = cluster_index[key]
+
+    return TopologyClusters(
+        clusters=clusters, representatives=np.array(representatives, dtype=np.int64)
+    )
+
+
+class TopologyIndex:
+    """Index from the unrooted topology of a tree to the ID of its cluster (see `TopologyClusters`).
+
+    The index is built once from the representatives of the clusters. Looking up a tree by its index in the clustered
+    trees or by one of the clustered Newick strings takes constant time. Other Newick strings are looked up by their
+    topology key in time linear in the number of taxa, independent of the number of clusters.
+
+    Args:
+        newick_strs (list[str]): Newick strings of the clustered trees in the order used for the clustering
+        clusters (TopologyClusters): Clusters of the trees
+
+    Raises:
+        PyPythiaException: If the number of trees does not match the clusters or the trees do not contain the same
+            taxa.
+    """
+
+    def __init__(self, newick_strs: list[str], clusters: TopologyClusters):
+        if len(newick_strs) != clusters.n_trees:
+            raise PyPythiaException(
+                f"The number of trees ({len(newick_strs)}) does not match the number of clustered trees "
+                f"({clusters.n_trees})."
+            )
+        self.clusters = clusters
+        self._newick_cluster_ids = {
+            newick_str.strip(): int(cluster_id)
+            for newick_str, cluster_id in zip(newick_strs, clusters.clusters)
+        }
+
+        # all trees of a cluster share the topology key, so only the representatives are parsed
+        representatives = [
+            parse_newick(newick_strs[i]) for i in clusters.representatives
+        ]
+        self._taxon_index = (
+            _shared_taxon_index(representatives) if representatives else {}
+        )
+        self._taxon_hashes = _taxon_hashes(len(self._taxon_index))
+        self._cluster_ids = {
+            topology_key(tree, self._taxon_index, self._taxon_hashes): cluster_id
+            for cluster_id, tree in enumerate(representatives)
+        }
+
+    def cluster_of_tree(self, tree_index: int) -> int:
+        """Returns the cluster ID of the clustered tree with the given index."""
+        return int(self.clusters.clusters[tree_index])
+
+    def cluster_of(self, newick_str: str) -> int:
+        """Returns the cluster ID of the topology of the given tree.
+
+        Args:
+            newick_str (str): Newick string of the tree, the rooting, order, and branch lengths are irrelevant
+
+        Returns:
+            Cluster ID of the topology.
+
+        Raises:
+            PyPythiaException: If the taxa of the tree differ from the clustered trees or the topology of the tree
+                does not belong to any cluster.
+        """
+        cluster_id = self._newick_cluster_ids.get(newick_str.strip())
+        if cluster_id is not None:
+            return cluster_id
+
+        tree = parse_newick(newick_str)
+        if tree.taxa.shape[0] != len(self._taxon_index):
+            raise PyPythiaException(
+                "The tree does not contain the same taxa as the clustered trees."
+            )
+        key = topology_key(tree, self._taxon_index, self._taxon_hashes)
+        if key not in self._cluster_ids:
+            raise PyPythiaException(
+                "The topology of the tree does not belong to any cluster."
+            )
+        return self._cluster_ids[key]
+
+
+def read_trees(trees_file: pathlib.Path) -> list[str]:
+    """Reads a file with one Newick string per line, empty lines are skipped."""
+    with pathlib.Path(trees_file).open() as f:
+        return [line.strip() for line in f if line.strip()]
@@ -0,0 +1,260 @@
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+# state code of the gap character, all gap characters are normalized to it when parsing an MSA (see predict.msa.GAP)
+GAP_ORD = ord("-")
+
+
+def _get_char_counts(sequences: npt.NDArray[np.uint8]) -> npt.NDArray[np.int64]:
+    # 256-bin histogram of the bytes in sequences
+    # the histogram is computed one sequence at a time since bincount converts its input to intp
+    char_counts = np.zeros(256, dtype=np.int64)
+    for seq in sequences:
+        char_counts += np.bincount(seq, minlength=256)
+    return char_counts
+
+
+def _get_alphabet(sequences: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    # sorted ASCII ordinals of all characters occurring in sequences
+    return np.flatnonzero(_get_char_counts(sequences)).astype(np.uint8)
+
+
+def _count_chars(
+    sequences: npt.NDArray[np.uint8], alphabet: npt.NDArray[np.uint8]
+) -> npt.NDArray[np.int64]:
+    # number of occurrences of each character of alphabet at each site of sequences
+    # computed character by character for blocks of sequences to bound the size of temporary arrays
+    n_seqs, n_sites = sequences.shape
+    counts = np.zeros((alphabet.shape[0], n_sites), dtype=np.int64)
+    # blocks of roughly 64 MB
+    block_size = max(1, 2**26 // max(1, n_sites))
+
+    for start in range(0, n_seqs, block_size):
+        block = sequences[start : start + block_size]
+        for char_counts, char in zip(counts, alphabet):
+            char_counts += np.count_nonzero(block == char, axis=0)
+
+    return counts.T
+
+
+# Random tables and multiplier for the two hash functions used to compute 128-bit site fingerprints.
+# The seed is fixed so that fingerprints (and thus the order of patterns) are reproducible.
+_FINGERPRINT_KEYS = np.random.default_rng(0x5EED).integers(
+    0, np.iinfo(np.uint64).max, size=(2, 256), dtype=np.uint64, endpoint=True
+)
+_FINGERPRINT_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _fingerprint_sites(
+    sequences: npt.NDArray[np.uint8],
+    fingerprints: Optional[npt.NDArray[np.uint64]] = None,
+) -> npt.NDArray[np.uint64]:
+    """Computes a 128-bit fingerprint for each site (column) of sequences.
+
+    The fingerprint consists of two 64-bit hashes with independent random tables that are updated one sequence at a
+    time. Each update step is non-linear (xor, multiply, xorshift), which avoids the systematic collisions of plain
+    polynomial hashing modulo 2^64.
+
+    Site patterns are identified by their fingerprint alone, the columns are not compared. The hash is not
+    cryptographic, so there is no guaranteed bound on collisions. A collision would merge two distinct patterns,
+    i.e. the number of patterns would be one too low and their weights would be combined. Assuming the fingerprints
+    behave like random values, the expected number of colliding pairs among `p` patterns is about `p^2 / 2^129`.
+
+    Args:
+        sequences (npt.NDArray): Data matrix
+        fingerprints (npt.NDArray): Fingerprints of shape `(n_sites, 2)` of preceding sequences to continue from.
+            Defaults to None. In this case, the fingerprints of sequences alone are computed.
+
+    Returns:
+        Array of shape `(n_sites, 2)`.
+    """
+    if fingerprints is None:
+        fingerprints = np.zeros((2, sequences.shape[1]), dtype=np.uint64)
+    else:
+        fingerprints = fingerprints.T.copy()
+    for seq in sequences:
+        for fingerprint, keys in zip(fingerprints, _FINGERPRINT_KEYS):
+            fingerprint ^= keys[seq]
+            fingerprint *= _FINGERPRINT_MULTIPLIER
+            fingerprint ^= fingerprint >> np.uint64(31)
+    return fingerprints.T
+
+
+def _unique_fingerprints(
+    fingerprints: npt.NDArray[np.uint64], weights: Optional[npt.NDArray] = None
+) -> tuple[npt.NDArray[np.uint64], npt.NDArray, npt.NDArray, npt.NDArray[np.int64]]:
+    """Finds the unique fingerprints, similar to np.unique with axis=0.
+
+    Args:
+        fingerprints (npt.NDArray): Fingerprints of shape `(n, 2)`
+        weights (npt.NDArray): Weight of each fingerprint. Defaults to None, in this case each fingerprint has weight 1.
+
+    Returns:
+        The sorted unique fingerprints, the index of the first occurrence of each unique fingerprint, the index of the
+        unique fingerprint for each input fingerprint, and the summed weights of each unique fingerprint.
+    """
+    if weights is None:
+        weights = np.ones(fingerprints.shape[0], dtype=np.int64)
+
+    # lexsort is stable, so the first element of each group is the first occurrence
+    order = np.lexsort((fingerprints[:, 1], fingerprints[:, 0]))
+    sorted_fingerprints = fingerprints[order]
+
+    is_first = np.ones(order.shape[0], dtype=bool)
+    is_first[1:] = np.any(sorted_fingerprints[1:] != sorted_fingerprints[:-1], axis=1)
+    group_starts = np.flatnonzero(is_first)
+
+    inverse = np.empty(order.shape[0], dtype=np.intp)
+    inverse[order] = np.cumsum(is_first) - 1
+    group_weights = (
+        np.add.reduceat(weights[order], group_starts) if order.shape[0] else weights[:0]
+    )
+
+    return (
+        sorted_fingerprints[is_first],
+        order[is_first],
+        inverse,
+        group_weights.astype(np.int64),
+    )
+
+
+def _count_gaps(sequences: npt.NDArray[np.uint8]) -> npt.NDArray[np.int64]:
+    # number of gaps at each site of sequences
+    gap_counts = np.zeros(sequences.shape[1], dtype=np.int64)
+    for seq in sequences:
+        gap_counts += seq == GAP_ORD
+    return gap_counts
+
+
+def _reduce_state_masks(
+    sequences: npt.NDArray[np.uint8], state_masks: npt.NDArray
+) -> npt.NDArray:
+    # bitwise AND of the state masks of all characters at each site of sequences, one sequence at a time
+    site_masks = state_masks[sequences[0]]
+    for seq in sequences[1:]:
+        site_masks &= state_masks[seq]
+    return site_masks
+
+
+def _site_entropies(
+    counts: npt.NDArray, alphabet: npt.NDArray[np.uint8]
+) -> npt.NDArray[np.float64]:
+    # Shannon entropy of each site given the character counts of each site, gap characters are not taken into account
+    counts = counts[:, alphabet != GAP_ORD]
+    totals = counts.sum(axis=1)
+    entropies = np.zeros(counts.shape[0])
+
+    # accumulate the entropies character by character, this way the result for a site does not depend on
+    # which other characters occur in the MSA
+    for char_counts in counts.T:
+        probabilities = np.divide(
+            char_counts, totals, out=np.zeros(entropies.shape), where=char_counts > 0
+        )
+        entropies -= probabilities * np.log2(
+            probabilities, out=np.zeros(entropies.shape), where=probabilities > 0
+        )
+    return entropies
+
+
+@contextmanager
+def _timed(timings: Optional[dict[str, float]], key: str):
+    # adds the elapsed time to timings[key] if timings are requested
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+
+
+class _SiteSummary(NamedTuple):
+    # Intermediate results of the feature computation for a range of sites.
+    # Summaries of consecutive site ranges are merged using _merge_site_summaries.
+    pattern_fingerprints: npt.NDArray[np.uint64]
+    pattern_weights: npt.NDArray[np.int64]
+    gap_counts: npt.NDArray[np.int64]
+    invariant: npt.NDArray[np.bool_]
+    entropies: npt.NDArray[np.float64]
+
+
+def _summarize_sites(
+    sequences: npt.NDArray[np.uint8],
+    state_masks: npt.NDArray,
+    timings: Optional[dict[str, float]] = None,
+    invariant: Optional[npt.NDArray[np.bool_]] = None,
+) -> _SiteSummary:
+    # Computes all per-site intermediates for the given block of sites in a single pass.
+    # The block is first compressed to its unique patterns and all other intermediates are computed on the patterns.
+    # The invariant sites can be passed if they are already known (e.g. computed on packed data).
+    with _timed(timings, "patterns"):
+        fingerprints, pattern_sites, site_pattern_index, weights = _unique_fingerprints(
+            _fingerprint_sites(sequences)
+        )
+        patterns = sequences[:, pattern_sites]
+
+    with _timed(timings, "gaps"):
+        gap_counts = _count_gaps(patterns)
+
+    if invariant is None:
+        with _timed(timings, "invariant"):
+            invariant = _reduce_state_masks(patterns, state_masks) != 0
+            invariant = invariant[site_pattern_index]
+
+    with _timed(timings, "entropy"):
+        alphabet = _get_alphabet(patterns)
+        entropies = _site_entropies(_count_chars(patterns, alphabet), alphabet)
+
+    return _SiteSummary(
+        pattern_fingerprints=fingerprints,
+        pattern_weights=weights,
+        gap_counts=gap_counts[site_pattern_index],
+        invariant=invariant,
+        entropies=entropies[site_pattern_index],
+    )
+
+
+def _merge_site_summaries(summaries: list[_SiteSummary]) -> _SiteSummary:
+    # merges the summaries of consecutive site ranges (in the given order) into a single summary
+    if len(summaries) == 1:
+        return summaries[0]
+
+    pattern_fingerprints, _, _, pattern_weights = _unique_fingerprints(
+        np.concatenate([s.pattern_fingerprints for s in summaries]),
+        np.concatenate([s.pattern_weights for s in summaries]),
+    )
+
+    return _SiteSummary(
+        pattern_fingerprints=pattern_fingerprints,
+        pattern_weights=pattern_weights,
+        gap_counts=np.concatenate([s.gap_counts for s in summaries]),
+        invariant=np.concatenate([s.invariant for s in summaries]),
+        entropies=np.concatenate([s.entropies for s in summaries]),
+    )
+
+
+def _scatter_site_summaries(
+    summaries: list[_SiteSummary], sites: list[npt.NDArray[np.intp]]
+) -> _SiteSummary:
+    # Merges the summaries of disjoint sets of sites (e.g. partitions) into a single summary.
+    # The per-site intermediates are ordered by site index, i.e. as if all sites were summarized in a single pass.
+    all_sites = np.concatenate(sites)
+    order = np.argsort(all_sites, kind="stable")
+    pattern_fingerprints, _, _, pattern_weights = _unique_fingerprints(
+        np.concatenate([s.pattern_fingerprints for s in summaries]),
+        np.concatenate([s.pattern_weights for s in summaries]),
+    )
+
+    return _SiteSummary(
+        pattern_fingerprints=pattern_fingerprints,
+        pattern_weights=pattern_weights,
+        gap_counts=np.concatenate([s.gap_counts for s in summaries])[order],
+        invariant=np.concatenate([s.invariant for s in summaries])[order],
+        entropies=np.concatenate([s.entropies for s in summaries])[order],
+    )
@@ -0,0 +1,353 @@
+import json
+import pathlib
+import re
+import struct
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from predict.custom_errors import PyPythiaException
+from predict.newick import NewickTree, parse_newick
+from predict.rfdistance import (
+    RFDistances,
+    TopologyClusters,
+    cluster_topologies,
+    compute_rfdistances,
+    read_trees,
+)
+
+# Layout of a tree set file: fixed-size header, JSON list of the taxon names, and the arrays of all trees
+# (tree offsets, parents, taxon IDs, branch lengths), each aligned to 8 bytes so that they can be memory-mapped.
+_TREESET_MAGIC = b"PYPTREE1"
+_TREESET_HEADER = struct.Struct("<8sQQQ")
+_TREESET_HEADER_SIZE = 64
+
+# taxon names containing these characters are quoted when writing Newick strings
+_NEEDS_QUOTES = re.compile(r"[\s(),:;\[\]']")
+
+
+def _align(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def _taxon_ids(tree: NewickTree, taxon_index: dict[str, int]) -> npt.NDArray[np.int32]:
+    # taxa that are not in the namespace yet are appended to it
+    taxon_ids = np.full(tree.parents.shape[0], -1, dtype=np.int32)
+    taxon_ids[tree.leaves] = [
+        taxon_index.setdefault(taxon, len(taxon_index)) for taxon in tree.taxa
+    ]
+    return taxon_ids
+
+
+def _quote(label: str) -> str:
+    if _NEEDS_QUOTES.search(label):
+        return "'" + label.replace("'", "''") + "'"
+    return label
+
+
+@dataclass
+class CompactTree:
+    """Array-backed tree over a shared taxon namespace.
+
+    The nodes are numbered in postorder (as returned by `parse_newick`), so the root is the last node. A tree requires
+    12 bytes per node. Trees of a `TreeSet` are views of the arrays of the tree set.
+
+    Attributes:
+        parents (npt.NDArray[np.int32]): Index of the parent of each node, -1 for the root
+        branch_lengths (npt.NDArray[np.float32]): Length of the branch above each node, NaN if the node has no
+            branch length
+        taxon_ids (npt.NDArray[np.int32]): Index of the taxon of each leaf in the namespace, -1 for inner nodes
+        namespace (npt.NDArray): Taxon names of the namespace, i.e. `namespace[taxon_id]` is the name of a taxon
+    """
+
+    parents: npt.NDArray[np.int32]
+    branch_lengths: npt.NDArray[np.float32]
+    taxon_ids: npt.NDArray[np.int32]
+    namespace: npt.NDArray
+
+    @property
+    def n_nodes(self) -> int:
+        return self.parents.shape[0]
+
+    @property
+    def leaves(self) -> npt.NDArray[np.bool_]:
+        return self.taxon_ids >= 0
+
+    @property
+    def n_taxa(self) -> int:
+        return int(np.count_nonzero(self.leaves))
+
+    @property
+    def taxa(self) -> npt.NDArray:
+        """Returns the taxon names of the leaves in the order of the leaves."""
+        return self.namespace[self.taxon_ids[self.leaves]]
+
+    @cached_property
+    def children(self) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """Returns the children of all nodes in compressed sparse row (CSR) format.
+
+        Returns:
+            Tuple (offsets, children) of arrays with the children of node `i` being `children[offsets[i]:offsets[i + 1]]`
+            in the order of the Newick string.
+        """
+        # all nodes except the root (the last node) have a parent
+        parents = self.parents[:-1]
+        children = np.argsort(parents, kind="stable")
+        offsets = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents, minlength=self.n_nodes), out=offsets[1:])
+        return offsets, children
+
+    @classmethod
+    def from_newick(
+        cls, newick_str: str, taxon_index: Optional[dict[str, int]] = None
+    ) -> "CompactTree":
+        """Creates a compact tree from a Newick string, the labels of inner nodes are discarded.
+
+        Args:
+            newick_str (str): Newick string of the tree
+            taxon_index (dict[str, int], optional): Index of each taxon in the namespace. Taxa that are not in the
+                index are added to it. Defaults to a new namespace containing the taxa of the tree.
+
+        Returns:
+            CompactTree object.
+        """
+        if taxon_index is None:
+            taxon_index = {}
+        tree = parse_newick(newick_str)
+        return cls(
+            parents=tree.parents.astype(np.int32),
+            branch_lengths=tree.branch_lengths.astype(np.float32),
+            taxon_ids=_taxon_ids(tree, taxon_index),
+            namespace=np.array(list(taxon_index), dtype=object),
+        )
+
+    def to_newick(self) -> str:
+        """Returns the Newick string of the tree. Branch lengths are written with float32 precision."""
+        offsets, children = self.children
+        lengths = [
+            "" if np.isnan(length) else ":" + text
+            for length, text in zip(
+                self.branch_lengths, self.branch_lengths.astype(str)
+            )
+        ]
+        labels = [""] * self.n_nodes
+        for node in np.flatnonzero(self.leaves):
+            labels[node] = _quote(self.namespace[self.taxon_ids[node]])
+
+        # the nodes are in postorder, so the children of each node are serialized before the node itself
+        texts = [""] * self.n_nodes
+        offsets, children = offsets.tolist(), children.tolist()
+        for node in range(self.n_nodes):
+            start, end = offsets[node], offsets[node + 1]
+            if start < end:
+                subtrees = ",".join(texts[child] for child in children[start:end])
+                texts[node] = f"({subtrees})"
+                for child in children[start:end]:
+                    texts[child] = ""
+            texts[node] += labels[node] + lengths[node]
+        return texts[-1] + ";"
+
+
+class TreeSet:
+    """Set of trees stored in shared arrays over one taxon namespace.
+
+    The nodes of all trees are stored consecutively in three arrays (parents, taxon IDs, and branch lengths,
+    12 bytes per node), which can be written to and read from a binary file without parsing (see `save` and `load`).
+    The trees do not need to contain the same taxa.
+
+    Args:
+        taxa (npt.NDArray): Taxon names of the namespace
+        offsets (npt.NDArray[np.int64]): Index of the first node of each tree and the total number of nodes
+        parents (npt.NDArray[np.int32]): Index of the parent of each node relative to the first node of its tree
+        taxon_ids (npt.NDArray[np.int32]): Index of the taxon of each leaf in the namespace, -1 for inner nodes
+        branch_lengths (npt.NDArray[np.float32]): Length of the branch above each node, NaN if missing
+    """
+
+    def __init__(
+        self,
+        taxa: npt.NDArray,
+        offsets: npt.NDArray[np.int64],
+        parents: npt.NDArray[np.int32],
+        taxon_ids: npt.NDArray[np.int32],
+        branch_lengths: npt.NDArray[np.float32],
+    ):
+        self.taxa = np.asarray(taxa, dtype=object)
+        self.offsets = offsets
+        self.parents = parents
+        self.taxon_ids = taxon_ids
+        self.branch_lengths = branch_lengths
+
+    @classmethod
+    def from_newick(cls, newick_strs: Iterable[str]) -> "TreeSet":
+        """Creates a tree set from Newick strings. The taxa are added to the namespace in order of first occurrence.
+
+        Args:
+            newick_strs (Iterable[str]): Newick strings of the trees
+
+        Returns:
+            TreeSet object.
+        """
+        taxon_index = {}
+        trees = [parse_newick(newick_str) for newick_str in newick_strs]
+        taxon_ids = [_taxon_ids(tree, taxon_index) for tree in trees]
+        offsets = np.zeros(len(trees) + 1, dtype=np.int64)
+        np.cumsum([tree.parents.shape[0] for tree in trees], out=offsets[1:])
+
+        def concatenate(arrays, dtype):
+            if not arrays:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate(arrays).astype(dtype, copy=False)
+
+        return cls(
+            taxa=np.array(list(taxon_index), dtype=object),
+            offsets=offsets,
+            parents=concatenate([tree.parents for tree in trees], np.int32),
+            taxon_ids=concatenate(taxon_ids, np.int32),
+            branch_lengths=concatenate(
+                [tree.branch_lengths for tree in trees], np.float32
+            ),
+        )
+
+    @classmethod
+    def from_file(cls, trees_file: pathlib.Path) -> "TreeSet":
+        """Creates a tree set from a file with one Newick string per line."""
+        return cls.from_newick(read_trees(trees_file))
+
+    @property
+    def n_trees(self) -> int:
+        return self.offsets.shape[0] - 1
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.offsets.nbytes
+            + self.parents.nbytes
+            + self.taxon_ids.nbytes
+            + self.branch_lengths.nbytes
+        )
+
+    def __len__(self) -> int:
+        return self.n_trees
+
+    def __getitem__(self, index: int) -> CompactTree:
+        if not -self.n_trees <= index < self.n_trees:
+            raise IndexError(f"Tree index {index} out of range.")
+        index %= self.n_trees
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return CompactTree(
+            parents=self.parents[start:end],
+            branch_lengths=self.branch_lengths[start:end],
+            taxon_ids=self.taxon_ids[start:end],
+            namespace=self.taxa,
+        )
+
+    def __iter__(self) -> Iterator[CompactTree]:
+        for index in range(self.n_trees):
+            yield self[index]
+
+    def to_newick(self) -> list[str]:
+        return [tree.to_newick() for tree in self]
+
+    def rfdistances(self) -> RFDistances:
+        """Computes the RF distances between all pairs of trees, see `compute_rfdistances`."""
+        return compute_rfdistances(self)
+
+    def topology_clusters(self) -> TopologyClusters:
+        """Clusters the trees with the same unrooted topology, see `cluster_topologies`."""
+        return cluster_topologies(self)
+
+    def total_branch_lengths(self) -> npt.NDArray[np.float64]:
+        """Returns the sum of the branch lengths of each tree (missing branch lengths are ignored)."""
+        lengths = np.nan_to_num(self.branch_lengths.astype(np.float64))
+        totals = np.zeros(self.n_trees)
+        non_empty = self.offsets[:-1] < self.offsets[1:]
+        if self.n_nodes > 0:
+            totals[non_empty] = np.add.reduceat(lengths, self.offsets[:-1][non_empty])
+        return totals
+
+    def save(self, treeset_file: pathlib.Path) -> None:
+        """Writes the tree set to a binary file.
+
+        Args:
+            treeset_file (pathlib.Path): Path of the tree set file
+        """
+        taxa = json.dumps(self.taxa.tolist()).encode()
+        header = _TREESET_HEADER.pack(
+            _TREESET_MAGIC, self.n_trees, self.n_nodes, len(taxa)
+        )
+        with pathlib.Path(treeset_file).open("wb") as f:
+            f.write(header.ljust(_TREESET_HEADER_SIZE, b"\0"))
+            f.write(taxa.ljust(_align(len(taxa)), b"\0"))
+            for array, dtype in self._arrays():
+                data = np.ascontiguousarray(array, dtype=dtype).tobytes()
+                f.write(data.ljust(_align(len(data)), b"\0"))
+
+    def _arrays(self):
+        yield self.offsets, np.int64
+        yield self.parents, np.int32
+        yield self.taxon_ids, np.int32
+        yield self.branch_lengths, np.float32
+
+    @classmethod
+    def load(cls, treeset_file: pathlib.Path, mmap: bool = False) -> "TreeSet":
+        """Reads a tree set file written by `TreeSet.save`.
+
+        Args:
+            treeset_file (pathlib.Path): Path of the tree set file
+            mmap (bool): If True, the arrays are memory-mapped instead of read into memory. Defaults to False.
+
+        Returns:
+            TreeSet object.
+
+        Raises:
+            PyPythiaException: If the file is not a valid tree set file.
+        """
+        treeset_file = pathlib.Path(treeset_file)
+        with treeset_file.open("rb") as f:
+            try:
+                magic, n_trees, n_nodes, taxa_size = _TREESET_HEADER.unpack(
+                    f.read(_TREESET_HEADER.size)
+                )
+            except struct.error:
+                magic = None
+            if magic != _TREESET_MAGIC:
+                raise PyPythiaException(f"{treeset_file} is not a valid tree set file.")
+            f.seek(_TREESET_HEADER_SIZE)
+            taxa = json.loads(f.read(taxa_size))
+
+        offset = _TREESET_HEADER_SIZE + _align(taxa_size)
+        arrays = []
+        for size, dtype in [
+            (n_trees + 1, np.int64),
+            (n_nodes, np.int32),
+            (n_nodes, np.int32),
+            (n_nodes, np.float32),
+        ]:
+            if mmap and size > 0:
+                array = np.memmap(
+                    treeset_file, dtype=dtype, mode="r", offset=offset, shape=(size,)
+                )
+            else:
+                array = np.fromfile(
+                    treeset_file, dtype=dtype, count=size, offset=offset
+                )
+            if array.shape[0] != size:
+                raise PyPythiaException(f"{treeset_file} is not a valid tree set file.")
+            arrays.append(array)
+            offset += _align(size * np.dtype(dtype).itemsize)
+
+        offsets, parents, taxon_ids, branch_lengths = arrays
+        return cls(
+            taxa=np.array(taxa, dtype=object),
+            offsets=offsets,
+            parents=parents,
+            taxon_ids=taxon_ids,
+            branch_lengths=branch_lengths,
+        )
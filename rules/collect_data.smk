@@ -73,7 +73,7 @@ rule collect_plausible_trees:
     """
     input:
         iqtree_results = f"{output_files_iqtree_dir}significance.iqtree",
-        clusters = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.pkl",
+        clusters = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.tsv",
         eval_trees = f"{iqtree_tree_eval_dir}AllEvalTrees.trees",
     output:
         all_plausible_trees = f"{iqtree_tree_eval_dir}AllPlausibleTrees.trees",
@@ -4,22 +4,21 @@ rule iqtree_filter_unique_tree_topologies:
     Therefore, before perfoming the tests on the eval trees we filter duplicate topologies.
     This rule produces two output:
     - A .trees file containing the unique topologies
-    - A .pkl file (pickle file) that contains a list of sets with the clusters, so we can later match 
-        IQ-Tree test results to newick tree strings 
+    - A .tsv file that contains the cluster ID and the representative of each eval tree, so we can later match
+        IQ-Tree test results (one per cluster, in the order of the cluster IDs) to the eval trees
     Tránh thiên lệch thống kê do có quá nhiều cây giống nhau (về topology) trong tập candidate trees.
     Chúng ta sẽ lọc ra các cây có topology duy nhất.
-    input tat ca cay tu eval_tree, file log chua rf cac cay 
+    input tat ca cay tu eval_tree
     output 
     .trees: chứa các cây duy nhất (1 đại diện cho mỗi nhóm topology).
-    .pkl: lưu danh sách các cluster (mỗi cluster là tập các cây giống nhau).
+    .tsv: lưu cluster ID và cây đại diện của mỗi cây.
         Dùng để ánh xạ lại kết quả IQ-TREE sau này.
     """
     input:
-        all_eval_trees              = rules.collect_eval_trees.output.all_eval_trees,
-        eval_trees_rfdistances_log  = rules.iqtree_rfdistance_eval_trees.output.rfDist_log,
+        all_eval_trees  = rules.collect_eval_trees.output.all_eval_trees,
     output:
         filtered_trees  = f"{output_files_iqtree_dir}filteredEvalTrees.trees",
-        clusters        = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.pkl",
+        clusters        = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.tsv",
     script:
         "scripts/filter_tree_topologies.py"
 
@@ -46,7 +45,7 @@ rule iqtree_significance_tests_on_eval_trees:
     log:
         f"{output_files_iqtree_dir}significance.iqtree.snakelog",
     run:
-        morph = "-st MORPH " if params.data_type == "MORPH" else ""
+        morph = "-st MORPH " if params.data_type == DataType.MORPH else ""
         shell("{iqtree_command} "
         "-s {params.msa} "
         "{morph} "
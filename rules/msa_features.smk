@@ -1,9 +1,44 @@
-rule compute_msa_features:
-    output:
-        msa_features =  f"{output_files_dir}msa_features.json"
-    params:
-        msa                 = lambda wildcards: msas[wildcards.msa],
-        model               = lambda wildcards: raxmlng_models[wildcards.msa],
-        raxmlng_command     = raxmlng_command
-    script:
-        "scripts/collect_msa_features.py"
+if partitioned:
+    # partitioned MSAs require the partition file of each MSA, so the features are computed per MSA
+    rule compute_msa_features:
+        output:
+            msa_features =  f"{output_files_dir}msa_features.json",
+            column_entropies = f"{output_files_dir}column_entropies.npy"
+        threads:
+            msa_feature_threads
+        params:
+            msa                 = lambda wildcards: msas[wildcards.msa],
+            model               = lambda wildcards: raxmlng_models[wildcards.msa],
+            partitioned         = partitioned,
+            raxmlng_command     = raxmlng_command,
+            memory_budget       = msa_memory_budget,
+            cache_dir           = msa_cache_dir
+        script:
+            "scripts/collect_msa_features.py"
+
+else:
+    # the features of the MSAs are computed in batches of msa_feature_batch_size MSAs, each batch in a single job
+    # using a pool of worker processes instead of starting one Python interpreter per MSA
+    # MSAs whose features cannot be computed do not fail the job (which would delete the outputs of all MSAs of the
+    # batch), their outputs contain empty features and the errors are listed in the errors file of the batch
+    msa_batches = [
+        msa_names[start : start + msa_feature_batch_size]
+        for start in range(0, len(msa_names), msa_feature_batch_size)
+    ]
+
+    for batch_index, msa_batch in enumerate(msa_batches):
+        rule:
+            name:
+                f"compute_msa_features_{batch_index}"
+            output:
+                msa_features = expand(f"{output_files_dir}msa_features.json", msa=msa_batch),
+                column_entropies = expand(f"{output_files_dir}column_entropies.npy", msa=msa_batch),
+                errors = f"{outdir}msa_feature_errors/batch_{batch_index}.json"
+            threads:
+                msa_feature_threads
+            params:
+                msas                = [msas[name] for name in msa_batch],
+                memory_budget       = msa_memory_budget,
+                cache_dir           = msa_cache_dir
+            script:
+                "scripts/collect_msa_features_batch.py"
@@ -22,6 +22,8 @@ rule save_data:
         rand_eval_logs  = expand(iqtree_tree_eval_prefix_rand + ".iqtree",seed=rand_seeds,allow_missing=True),
         
         eval_logs_collected = f"{iqtree_tree_eval_dir}AllEvalLogs.log",
+        # the eval trees in the order used to cluster the topologies
+        all_eval_trees = rules.collect_eval_trees.output.all_eval_trees,
 
         # Eval tree RFDistance logs
         eval_rfdistance = f"{iqtree_tree_eval_dir}eval.iqtree.rfDistances.log",
@@ -32,10 +34,11 @@ rule save_data:
 
         # IQ-Tree significance test results and clusters
         iqtree_results  = f"{output_files_iqtree_dir}significance.iqtree",
-        clusters        = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.pkl",
+        clusters        = f"{output_files_iqtree_dir}filteredEvalTrees.clusters.tsv",
 
         # MSA Features
         msa_features = f"{output_files_dir}msa_features.json",
+        column_entropies = f"{output_files_dir}column_entropies.npy",
 
         # Parsimony Trees and logs
         parsimony_trees = f"{output_files_parsimony_trees}AllParsimonyTrees.trees",
@@ -47,6 +50,7 @@ rule save_data:
     params:
         iqtree_command = iqtree_command,
         msa             = lambda wildcards: msas[wildcards.msa],
+        data_type       = lambda wildcards: data_types[wildcards.msa],
     script:
         "scripts/save_data.py"
 
@@ -1,33 +1,66 @@
 import json
 
+import numpy as np
+
 from predict.msa import MSA
 from predict.iqtree import IQTree
 
 msa_file = snakemake.params.msa
 model = snakemake.params.model
+memory_budget = snakemake.params.memory_budget
+cache_dir = snakemake.params.cache_dir
 
-msa = MSA(msa_file)
+# for partitioned MSAs, the model is the path to the RAxML-NG partition file
+partitions = model if snakemake.params.partitioned else None
 
-# the Biopython DistanceCalculator does not support morphological data
-# so for morphological data we cannot compute the treelikeness at the moment
-# compute_treelikeness = msa.data_type != "MORPH"
+msa = MSA(
+    msa_file, memory_budget=memory_budget, cache_dir=cache_dir, partitions=partitions
+)
 
 # iqtree = IQTree(snakemake.params.iqtree_command)
 
 # patterns, gaps, invariant = iqtree.get_patterns_gaps_invariant(msa_file, model)
 
+if partitions is not None:
+    # the features of all partitions and the aggregated features are computed in a single batched pass
+    partition_features = msa.compute_partition_features()
+    features = partition_features.total
+else:
+    # all features are computed in a single pass over the MSA
+    features = msa.compute_features(n_workers=snakemake.threads)
+
 msa_features = {
-    "taxa": msa.n_taxa,
-    "sites": msa.n_sites,
-    "patterns": msa.n_patterns,  # cached_property → không cần dấu ()
-    "gaps": msa.proportion_gaps,
-    "invariant": msa.proportion_invariant,
-    "entropy": msa.entropy(),  # hàm thường → cần gọi với ()
-    # "column_entropies": msa.column_entropy(),  # nếu có hàm này
-    "bollback": msa.bollback_multinomial(),
-    # "treelikeness": msa.treelikeness_score() if compute_treelikeness else None,
+    "taxa": features.n_taxa,
+    "sites": features.n_sites,
+    "patterns": features.n_patterns,
+    "gaps": features.proportion_gaps,
+    "invariant": features.proportion_invariant,
+    "entropy": features.entropy,
+    "bollback": features.bollback,
+    # distances are computed on bit-packed sequences, so this works for all data types
+    "treelikeness": (
+        msa.treelikeness_score(n_threads=snakemake.threads, seed=0)
+        if msa.n_taxa >= 4
+        else None
+    ),
 }
 
+if partitions is not None:
+    msa_features["partitions"] = {
+        name: {
+            "sites": features.n_sites,
+            "patterns": features.n_patterns,
+            "gaps": features.proportion_gaps,
+            "invariant": features.proportion_invariant,
+            "entropy": features.entropy,
+            "bollback": features.bollback,
+        }
+        for name, features in partition_features.partitions.items()
+    }
+
 # lưu kết quả vào file json
 with open(snakemake.output.msa_features, "w") as f:
     json.dump(msa_features, f)
+
+# the column entropies are stored as binary float32 array instead of a JSON list
+np.save(snakemake.output.column_entropies, msa.column_entropy())
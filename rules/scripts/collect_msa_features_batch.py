@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+
+from predict.collection import MSACollection
+
+msa_files = snakemake.params.msas
+memory_budget = snakemake.params.memory_budget
+cache_dir = snakemake.params.cache_dir
+
+# the outputs are in the same order as the MSA files
+output_files = dict(zip(msa_files, snakemake.output.msa_features))
+column_entropy_files = dict(zip(msa_files, snakemake.output.column_entropies))
+
+collection = MSACollection(
+    msa_files,
+    memory_budget=memory_budget,
+    cache_dir=cache_dir,
+    n_workers=snakemake.threads,
+)
+
+# feature values of MSAs whose features cannot be computed
+EMPTY_FEATURES = {
+    "taxa": None,
+    "sites": None,
+    "patterns": None,
+    "gaps": None,
+    "invariant": None,
+    "entropy": None,
+    "bollback": None,
+    "treelikeness": None,
+}
+
+errors = {}
+# the results are written as soon as they are available
+for result in collection.iter_features(column_entropies=True, treelikeness=True):
+    if result.error is not None:
+        # a failed MSA must not fail the whole job, otherwise Snakemake deletes the outputs of all MSAs
+        errors[result.msa_file] = result.error
+        msa_features = dict(EMPTY_FEATURES, error=result.error)
+        column_entropies = np.empty(0, dtype=np.float32)
+    else:
+        features = result.features
+        msa_features = {
+            "taxa": features.n_taxa,
+            "sites": features.n_sites,
+            "patterns": features.n_patterns,
+            "gaps": features.proportion_gaps,
+            "invariant": features.proportion_invariant,
+            "entropy": features.entropy,
+            "bollback": features.bollback,
+            "treelikeness": result.treelikeness,
+            "error": None,
+        }
+        column_entropies = result.column_entropies
+
+    with open(output_files[result.msa_file], "w") as f:
+        json.dump(msa_features, f)
+
+    # the column entropies are stored as binary float32 array instead of a JSON list
+    np.save(column_entropy_files[result.msa_file], column_entropies)
+
+# the MSAs whose features could not be computed, mapped to the error message
+with open(snakemake.output.errors, "w") as f:
+    json.dump(errors, f, indent=2)
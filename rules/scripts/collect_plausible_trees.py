@@ -1,19 +1,15 @@
-import pickle
-from iqtree_statstest_parser import get_iqtree_results, get_iqtree_results_for_eval_tree_str
+from iqtree_statstest_parser import get_iqtree_results, get_iqtree_results_for_eval_tree_id, get_cluster_index
+from predict.rfdistance import read_trees
 
 
 iqtree_results = get_iqtree_results(snakemake.input.iqtree_results)
-with open(snakemake.input.clusters, "rb") as f:
-    clusters = pickle.load(f)
+eval_trees = read_trees(snakemake.input.eval_trees)
+clusters = get_cluster_index(snakemake.input.clusters, eval_trees)
 
-eval_trees = open(snakemake.input.eval_trees).readlines()
 plausible_trees = []
 
-for newick_eval in eval_trees:
-    if not newick_eval:
-        continue
-
-    statstest_results, _ = get_iqtree_results_for_eval_tree_str(iqtree_results, newick_eval, clusters)
+for i, newick_eval in enumerate(eval_trees):
+    statstest_results, _ = get_iqtree_results_for_eval_tree_id(iqtree_results, i, clusters)
     plausible = statstest_results["plausible"]
 
     if plausible:
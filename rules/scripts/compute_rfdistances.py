@@ -0,0 +1,25 @@
+from predict.rfdistance import compute_rfdistances, read_trees
+
+trees = read_trees(snakemake.input[0])
+
+# all RF distances are computed in-process instead of running `iqtree -rf_all`
+rfdistances = compute_rfdistances(trees)
+
+# pairwise absolute RF distances in the format of the IQ-TREE .rfdist file
+with open(snakemake.output.rfDist, "w") as f:
+    f.write(f"{rfdistances.n_trees} {rfdistances.n_trees}\n")
+    for i, row in enumerate(rfdistances.distances):
+        f.write(f"Tree{i} " + " ".join(map(str, row)) + "\n")
+
+# IQ-TREE cannot compute RF distances for less than two trees, so the previous rules wrote a dummy log with one
+# topology for sets of no or a single (plausible) tree; this value is kept for sets without any tree
+num_topos = max(rfdistances.num_topos, 1)
+
+with open(snakemake.output.rfDist_log, "w") as f:
+    f.write(f"Number of unique topologies in this tree set: {num_topos}\n")
+    f.write(
+        f"Average absolute RF distance in this tree set: {rfdistances.avg_rfdist}\n"
+    )
+    f.write(
+        f"Average relative RF distance in this tree set: {rfdistances.avg_rel_rfdist}\n"
+    )
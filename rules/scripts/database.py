@@ -54,9 +54,12 @@ class Dataset(P.Model):
     proportion_gaps = P.FloatField(null=True)
     proportion_invariant = P.FloatField(null=True)
     entropy = P.FloatField(null=True)
-    # column_entropies = JSONField(null=True)
+    # column entropies as little-endian float16 blob, see predict.msa.encode_column_entropies
+    column_entropies = P.BlobField(null=True)
+    column_entropy_quantiles = JSONField(null=True)
+    column_entropy_histogram = JSONField(null=True)
     bollback = P.FloatField(null=True)
-    # treelikeness = P.FloatField(null=True)
+    treelikeness = P.FloatField(null=True)
 
     # Parsimony Trees Features
     avg_rfdist_parsimony = P.FloatField(null=True)
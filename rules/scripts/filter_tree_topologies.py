@@ -1,70 +1,25 @@
 from custom_types import *
-from utils import read_file_contents
-from raxmlng_parser import get_raxmlng_rfdist_results
-
-import pickle
-
-
-def get_rfdist_clusters(log_path, all_trees):
-    content = read_file_contents(log_path)
-    clusters = []
-
-    for line in content:
-        line = line.strip()
-        if not line.startswith("["):
-            continue
-        # the line is a string representation of a list of ints
-        # like this: [1, 2, 3, 4, ]
-        tree_ids = eval(line)
-        cluster = set()
-
-        for id in tree_ids:
-            cluster.add(all_trees[id])
-
-        clusters.append(cluster)
-
-    return clusters
+from predict.rfdistance import TopologyClusters, cluster_topologies, read_trees
 
 
 def filter_tree_topologies(
         eval_trees: List[Newick],
-        log_path: FilePath,
-):
-    num_trees = len(eval_trees)
-
-    if num_trees > 1:
-        num_topos, _, _ = get_raxmlng_rfdist_results(log_path)
-
-        if num_topos > 1:
-            clusters = get_rfdist_clusters(log_path, eval_trees)
-
-            assert len(clusters) == num_topos
-        else:
-            clusters = [set(eval_trees)]
-
-    else:
-        clusters = [set(eval_trees)]
+) -> Tuple[List[Newick], TopologyClusters]:
+    # trees with the same unrooted topology (regardless of rooting, order, and branch lengths) form a cluster
+    clusters = cluster_topologies(eval_trees)
 
     # for each cluster: keep only one tree as representative of the cluster
-    unique_trees = [next(iter(cluster)) for cluster in clusters]
-
-    # sanity checks
-    assert sum([len(s) for s in clusters]) <= num_trees
+    unique_trees = [eval_trees[i] for i in clusters.representatives]
 
     return unique_trees, clusters
 
 
 if __name__ == "__main__":
-    eval_trees = [l.strip() for l in open(snakemake.input.all_eval_trees).readlines()]
-    log_file = snakemake.input.eval_trees_rfdistances_log
+    eval_trees = read_trees(snakemake.input.all_eval_trees)
 
-    unique_trees, clusters = filter_tree_topologies(
-            eval_trees=eval_trees,
-            log_path=log_file,
-    )
+    unique_trees, clusters = filter_tree_topologies(eval_trees=eval_trees)
 
     with open(snakemake.output.filtered_trees, "w") as f:
         f.write("\n".join(unique_trees))
 
-    with open(snakemake.output.clusters, "wb") as f:
-        pickle.dump(clusters, f)
\ No newline at end of file
+    clusters.save(snakemake.output.clusters)
@@ -1,6 +1,5 @@
 import numpy as np
 import regex
-from tempfile import TemporaryDirectory
 import warnings
 
 from custom_types import *
@@ -10,7 +9,7 @@ from utils import (
     read_file_contents,
 )
 
-from predict import iqtree
+from predict.rfdistance import compute_rfdistances
 
 
 def get_iqtree_llh(iqtree_file: FilePath) -> float:
@@ -108,17 +107,19 @@ def get_iqtree_runtimes(log_file: FilePath) -> List[float]:
 def rel_rfdistance_starting_final(
     newick_starting: Newick,
     newick_final: Newick,
-    iqtree_executable: Executable = "iqtree",
 ) -> float:
-    with TemporaryDirectory() as tmpdir:
-        iqtree = iqtree(iqtree_executable)
-        trees = tmpdir + ".trees"
-        with open(trees, "w") as f:
-            f.write(newick_starting.strip() + "\n" + newick_final.strip())
+    return compute_rfdistances([newick_starting, newick_final]).avg_rel_rfdist
 
-        _, rel_rfdist, _ = iqtree.get_rfdistance_results(trees)
 
-        return rel_rfdist
+def get_iqtree_rfdist_results(log_file: FilePath) -> Tuple[int, float, float]:
+    """
+    Parses the log written by compute_rfdistances.py and returns the number of unique topologies,
+    the average relative RF distance and the average absolute RF distance of the tree set.
+    """
+    num_topos = get_single_value_from_file(log_file, "Number of unique topologies in this tree set:")
+    rel_rfdist = get_single_value_from_file(log_file, "Average relative RF distance in this tree set:")
+    abs_rfdist = get_single_value_from_file(log_file, "Average absolute RF distance in this tree set:")
+    return int(num_topos), rel_rfdist, abs_rfdist
 
 
 def get_model_parameter_estimates(iqtree_file: FilePath) -> Tuple[str, str, str]:
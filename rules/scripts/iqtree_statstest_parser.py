@@ -1,6 +1,9 @@
 import regex
 import warnings
 
+from custom_types import *
+from predict.rfdistance import TopologyClusters, TopologyIndex
+
 # define some regex stuff
 blanks = r"\s+"  # matches >=1  subsequent whitespace characters
 sign = r"[-+]?"  # contains either a '-' or a '+' symbol or none of both
@@ -215,10 +218,19 @@ def get_iqtree_results(iqtree_file):
     return results
 
 
-def get_iqtree_results_for_eval_tree_str(iqtree_results, eval_tree_str, clusters):
-    # returns the results for this eval_tree_id as well as the cluster ID
-    for i, cluster in enumerate(clusters):
-        if eval_tree_str.strip() in cluster:
-            return iqtree_results[i], i
+def get_cluster_index(cluster_file: FilePath, eval_trees: List[Newick]) -> TopologyIndex:
+    # builds the index from the topology of a tree to its cluster ID (= row of the IQ-TREE test results) once per dataset
+    # the eval trees need to be in the order used for the clustering (AllEvalTrees.trees)
+    return TopologyIndex(eval_trees, TopologyClusters.load(cluster_file))
+
+
+def get_iqtree_results_for_eval_tree_str(iqtree_results, eval_tree_str, clusters: TopologyIndex):
+    # returns the results for the topology of this eval tree as well as the cluster ID
+    cluster_id = clusters.cluster_of(eval_tree_str)
+    return iqtree_results[cluster_id], cluster_id
+
 
-    raise ValueError("This newick_string belongs to no cluster. newick_str: ", eval_tree_str[:10])
\ No newline at end of file
+def get_iqtree_results_for_eval_tree_id(iqtree_results, eval_tree_id, clusters: TopologyIndex):
+    # returns the results for the eval tree with this index in AllEvalTrees.trees as well as the cluster ID
+    cluster_id = clusters.cluster_of_tree(eval_tree_id)
+    return iqtree_results[cluster_id], cluster_id
@@ -1,10 +1,9 @@
 import json
 import numpy as np
-import pickle
 import uuid
 
 from database import *
-from iqtree_statstest_parser import get_iqtree_results, get_iqtree_results_for_eval_tree_str
+from iqtree_statstest_parser import get_iqtree_results, get_iqtree_results_for_eval_tree_id, get_cluster_index
 from iqtree_parser import (
     get_all_iqtree_llhs,
     get_iqtree_llh,
@@ -19,15 +18,10 @@ from iqtree_parser import (
 
 from iqtree_parser import get_iqtree_rfdist_results
 
-from tree_metrics import (
-    get_total_branch_length_for_tree,
-    get_min_branch_length_for_tree,
-    get_max_branch_length_for_tree,
-    get_std_branch_lengths_for_tree,
-    get_avg_branch_lengths_for_tree,
-)
+from predict.msa import encode_column_entropies, summarize_column_entropies
+from predict.rfdistance import read_trees
+from tree_metrics import get_tree_stats
 
-from predict.msa import MSA
 
 db.init(snakemake.output.database)
 db.connect()
@@ -62,12 +56,14 @@ eval_rfdistance = snakemake.input.eval_rfdistance
 plausible_rfdistance = snakemake.input.plausible_rfdistance
 plausible_trees_collected = snakemake.input.plausible_trees_collected
 iqtree_results = get_iqtree_results(snakemake.input.iqtree_results)
-with open(snakemake.input.clusters, "rb") as f:
-    clusters = pickle.load(f)
+# the index is built from AllEvalTrees.trees, which was used to cluster the topologies
+clusters = get_cluster_index(snakemake.input.clusters, read_trees(snakemake.input.all_eval_trees))
 
 # msa features
 with open(snakemake.input.msa_features) as f:
     msa_features = json.load(f)
+column_entropies = np.load(snakemake.input.column_entropies)
+column_entropy_summary = summarize_column_entropies(column_entropies)
 
 # parsimony trees
 parsimony_trees = snakemake.input.parsimony_trees
@@ -81,7 +77,8 @@ parsimony_scores = get_all_parsimony_scores(parsimony_logs)
 parsimony_runtimes = get_iqtree_runtimes(parsimony_logs)
 
 num_searches = len(pars_search_trees) + len(rand_search_trees)
-data_type = MSA(snakemake.params.msa).data_type
+# the data type is inferred once when building the workflow, so the MSA does not need to be parsed again
+data_type = snakemake.params.data_type
 
 # for the starting tree features, we simply take the first parsimony tree inference
 single_tree = pars_search_trees[0]
@@ -93,6 +90,7 @@ starting_llh = get_iqtree_starting_llh(single_tree_log)
 final_llh = get_iqtree_llh(single_tree_log)
 newick_starting = open(single_tree_starting).readline()
 newick_final = open(single_tree).readline()
+final_tree_stats = get_tree_stats(newick_final)
 rate_het, base_freq, subst_rates = get_model_parameter_estimates(single_tree_log)
 
 num_topos_search, avg_rfdist_search, _ = get_iqtree_rfdist_results(search_rfdistance)
@@ -132,16 +130,16 @@ dataset_dbobj = Dataset.create(
     num_fast_spr_rounds             = fast_spr,
     llh_starting_tree               = starting_llh,
     llh_final_tree                  = final_llh,
-    rfdistance_starting_final       = rel_rfdistance_starting_final(newick_starting, newick_final, iqtree_command),
+    rfdistance_starting_final       = rel_rfdistance_starting_final(newick_starting, newick_final),
     llh_difference_starting_final   = final_llh - starting_llh,
     rate_heterogeneity_final        = rate_het,
     eq_frequencies_final            = base_freq,
     substitution_rates_final        = subst_rates,
-    average_branch_length_final     = get_avg_branch_lengths_for_tree(newick_final),
-    std_branch_length_final         = get_std_branch_lengths_for_tree(newick_final),
-    total_branch_length_final       = get_total_branch_length_for_tree(newick_final),
-    minimum_branch_length_final     = get_min_branch_length_for_tree(newick_final),
-    maximum_branch_length_final     = get_max_branch_length_for_tree(newick_final),
+    average_branch_length_final     = final_tree_stats.average_branch_length,
+    std_branch_length_final         = final_tree_stats.std_branch_length,
+    total_branch_length_final       = final_tree_stats.total_branch_length,
+    minimum_branch_length_final     = final_tree_stats.minimum_branch_length,
+    maximum_branch_length_final     = final_tree_stats.maximum_branch_length,
     newick_starting                 = newick_starting,
     newick_final                    = newick_final,
 
@@ -152,7 +150,9 @@ dataset_dbobj = Dataset.create(
     proportion_gaps         = msa_features["gaps"],
     proportion_invariant    = msa_features["invariant"],
     entropy                 = msa_features["entropy"],
-    column_entropies        = msa_features["column_entropies"],
+    column_entropies        = encode_column_entropies(column_entropies),
+    column_entropy_quantiles= column_entropy_summary.quantiles.tolist(),
+    column_entropy_histogram= column_entropy_summary.histogram.tolist(),
     bollback                = msa_features["bollback"],
     treelikeness            = msa_features["treelikeness"],
 
@@ -164,12 +164,15 @@ dataset_dbobj = Dataset.create(
 )
 # fmt: on
 
-def save_iqtree_tree(search_trees, search_logs, eval_trees, eval_logs, starting_type):
+def save_iqtree_tree(search_trees, search_logs, eval_trees, eval_logs, starting_type, first_eval_tree_id):
+    # first_eval_tree_id is the index of the first of the eval trees in AllEvalTrees.trees
     plausible_llhs = []
 
-    for (search_tree, search_log, eval_tree, eval_log) in zip(search_trees, search_logs, eval_trees, eval_logs):
+    for i, (search_tree, search_log, eval_tree, eval_log) in enumerate(zip(search_trees, search_logs, eval_trees, eval_logs)):
         newick_eval = open(eval_tree).readline()
-        statstest_results, cluster_id = get_iqtree_results_for_eval_tree_str(iqtree_results, newick_eval, clusters)
+        statstest_results, cluster_id = get_iqtree_results_for_eval_tree_id(
+            iqtree_results, first_eval_tree_id + i, clusters
+        )
         tests = statstest_results["tests"]
 
         IQTree.create(
@@ -214,8 +217,11 @@ def save_iqtree_tree(search_trees, search_logs, eval_trees, eval_logs, starting_
     return plausible_llhs
 
 # store the parsimony and random raxml-ng trees in the database
-plausible_llhs_pars = save_iqtree_tree(pars_search_trees, pars_search_logs, pars_eval_trees, pars_eval_logs, "parsimony")
-plausible_llhs_rand = save_iqtree_tree(rand_search_trees, rand_search_logs, rand_eval_trees, rand_eval_logs, "random")
+# AllEvalTrees.trees contains the parsimony eval trees followed by the random eval trees (see collect_eval_trees)
+plausible_llhs_pars = save_iqtree_tree(pars_search_trees, pars_search_logs, pars_eval_trees, pars_eval_logs, "parsimony", 0)
+plausible_llhs_rand = save_iqtree_tree(
+    rand_search_trees, rand_search_logs, rand_eval_trees, rand_eval_logs, "random", len(pars_eval_trees)
+)
 
 plausible_llhs = plausible_llhs_pars + plausible_llhs_rand
 dataset_dbobj.update(
@@ -2,6 +2,7 @@ from Bio import Phylo
 import numpy as np
 
 from custom_types import *
+from predict.newick import get_tree_stats, parse_newick
 
 
 def get_tree_object(newick_str: Newick):
@@ -10,30 +11,26 @@ def get_tree_object(newick_str: Newick):
 
 
 def get_all_branch_lengths_for_tree(newick_str: Newick) -> List[float]:
-    tree = get_tree_object(newick_str)
-    return [node.branch_length for node in tree.find_clades(branch_length=True)]
+    # the non-zero branch lengths in postorder
+    branch_lengths = parse_newick(newick_str).branch_lengths
+    return branch_lengths[~np.isnan(branch_lengths) & (branch_lengths != 0)].tolist()
 
 
 def get_total_branch_length_for_tree(newick_str: Newick) -> float:
-    all_brlens = get_all_branch_lengths_for_tree(newick_str)
-    return sum(all_brlens)
+    return get_tree_stats(newick_str).total_branch_length
 
 
 def get_min_branch_length_for_tree(newick_str: Newick) -> float:
-    all_brlens = get_all_branch_lengths_for_tree(newick_str)
-    return min(all_brlens)
+    return get_tree_stats(newick_str).minimum_branch_length
 
 
 def get_max_branch_length_for_tree(newick_str: Newick) -> float:
-    all_brlens = get_all_branch_lengths_for_tree(newick_str)
-    return max(all_brlens)
+    return get_tree_stats(newick_str).maximum_branch_length
 
 
 def get_avg_branch_lengths_for_tree(newick_str: Newick) -> float:
-    all_brlens = get_all_branch_lengths_for_tree(newick_str)
-    return np.mean(all_brlens)
+    return get_tree_stats(newick_str).average_branch_length
 
 
 def get_std_branch_lengths_for_tree(newick_str: Newick) -> float:
-    all_brlens = get_all_branch_lengths_for_tree(newick_str)
-    return np.std(all_brlens)
\ No newline at end of file
+    return get_tree_stats(newick_str).std_branch_length
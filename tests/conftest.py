@@ -0,0 +1,7 @@
+import pathlib
+import sys
+
+# the tests import the `predict` package and the Snakemake scripts like the pipeline does
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "rules" / "scripts"))
@@ -0,0 +1,169 @@
+import json
+import pathlib
+import runpy
+from dataclasses import replace
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from predict.collection import MSACollection
+from predict.custom_errors import PyPythiaException
+from predict.msa import parse_msa
+
+BATCH_SCRIPT = (
+    pathlib.Path(__file__).resolve().parent.parent
+    / "rules"
+    / "scripts"
+    / "collect_msa_features_batch.py"
+)
+
+
+def _write_phylip(path, raw):
+    with path.open("w") as f:
+        f.write(f"{raw.shape[0]} {raw.shape[1]}\n")
+        for i, sequence in enumerate(raw):
+            f.write(f"taxon{i} {sequence.tobytes().decode()}\n")
+
+
+@pytest.fixture
+def msa_files(tmp_path):
+    # MSAs of different sizes and data types, and a file that is not an MSA
+    rng = np.random.default_rng(0)
+    files = []
+    for i, (n_taxa, n_sites, chars) in enumerate(
+        [
+            (6, 50, b"ACGT-"),
+            (4, 200, b"ACGTN-"),
+            (12, 80, b"ACDEFGHIKLMNPQRSTVWY-"),
+            (5, 30, b"0123-"),
+            (3, 40, b"ACGT"),
+        ]
+    ):
+        msa_file = tmp_path / f"msa{i}.phy"
+        _write_phylip(
+            msa_file, rng.choice(np.frombuffer(chars, "S1"), (n_taxa, n_sites))
+        )
+        files.append(msa_file)
+    invalid_file = tmp_path / "msa5.phy"
+    invalid_file.write_text("this is not an MSA\n")
+    files.append(invalid_file)
+    return files
+
+
+def _expected_features(msa_file):
+    return replace(parse_msa(msa_file).compute_features(), timings=None)
+
+
+def test_glob_pattern(msa_files, tmp_path):
+    collection = MSACollection(str(tmp_path / "*.phy"))
+    assert collection.msa_files == [str(msa_file) for msa_file in msa_files]
+    assert len(collection) == len(msa_files)
+
+    with pytest.raises(PyPythiaException):
+        MSACollection(str(tmp_path / "*.fasta"))
+
+
+@pytest.mark.parametrize("n_workers", [None, 3])
+def test_iter_features(msa_files, n_workers):
+    collection = MSACollection(msa_files, n_workers=n_workers)
+    results = {
+        result.msa_file: result
+        for result in collection.iter_features(column_entropies=True, treelikeness=True)
+    }
+    assert sorted(results) == sorted(collection.msa_files)
+
+    for msa_file in msa_files[:-1]:
+        result = results[str(msa_file)]
+        msa = parse_msa(msa_file)
+        assert result.error is None
+        assert result.data_type == msa.data_type
+        assert replace(result.features, timings=None) == _expected_features(msa_file)
+        np.testing.assert_array_equal(result.column_entropies, msa.column_entropy())
+        if msa.n_taxa >= 4:
+            assert result.treelikeness == msa.treelikeness_score(n_threads=1, seed=0)
+        else:
+            assert result.treelikeness is None
+
+    invalid = results[str(msa_files[-1])]
+    assert invalid.features is None and invalid.data_type is None
+    assert invalid.error
+
+
+def test_compute_features_table(msa_files, tmp_path):
+    output_file = tmp_path / "features.jsonl"
+    collection = MSACollection(msa_files, n_workers=2)
+    table = collection.compute_features(output_file, as_dataframe=False)
+
+    assert table["msa_file"].tolist() == collection.msa_files
+    for i, msa_file in enumerate(msa_files[:-1]):
+        expected = _expected_features(msa_file)
+        assert table["error"][i] is None
+        assert table["data_type"][i] == parse_msa(msa_file).data_type.value
+        for field in ["n_taxa", "n_sites", "n_patterns", "entropy", "bollback"]:
+            assert table[field][i] == getattr(expected, field)
+    assert table["error"][-1]
+    assert table["n_taxa"][-1] == -1 and np.isnan(table["entropy"][-1])
+
+    def reject_constant(constant):
+        raise ValueError(f"invalid JSON constant {constant}")
+
+    # the JSON Lines file is valid JSON, i.e. contains null instead of NaN
+    rows = [
+        json.loads(line, parse_constant=reject_constant)
+        for line in output_file.read_text().splitlines()
+    ]
+    rows = {row["msa_file"]: row for row in rows}
+    assert sorted(rows) == sorted(collection.msa_files)
+    invalid = rows[str(msa_files[-1])]
+    assert invalid["error"] and invalid["n_taxa"] is None and invalid["entropy"] is None
+    for i, msa_file in enumerate(msa_files[:-1]):
+        assert rows[str(msa_file)]["n_patterns"] == table["n_patterns"][i]
+
+
+def test_compute_features_dataframe(msa_files):
+    pytest.importorskip("pandas")
+    collection = MSACollection(msa_files)
+    df = collection.compute_features()
+    table = collection.compute_features(as_dataframe=False)
+    assert df["msa_file"].tolist() == collection.msa_files
+    np.testing.assert_array_equal(df["n_sites"].to_numpy(), table["n_sites"])
+
+
+def test_batch_script_captures_errors(msa_files, tmp_path):
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    output = SimpleNamespace(
+        msa_features=[output_dir / f"{f.stem}.json" for f in msa_files],
+        column_entropies=[output_dir / f"{f.stem}.npy" for f in msa_files],
+        errors=output_dir / "errors.json",
+    )
+    snakemake = SimpleNamespace(
+        params=SimpleNamespace(
+            msas=[str(f) for f in msa_files], memory_budget=None, cache_dir=None
+        ),
+        output=output,
+        threads=2,
+    )
+    runpy.run_path(str(BATCH_SCRIPT), init_globals={"snakemake": snakemake})
+
+    errors = json.loads(output.errors.read_text())
+    assert list(errors) == [str(msa_files[-1])]
+
+    invalid = json.loads(output.msa_features[-1].read_text())
+    assert invalid["error"] == errors[str(msa_files[-1])]
+    assert invalid["taxa"] is None and invalid["entropy"] is None
+    assert np.load(output.column_entropies[-1]).shape == (0,)
+
+    for msa_file, features_file, entropies_file in zip(
+        msa_files[:-1], output.msa_features, output.column_entropies
+    ):
+        msa_features = json.loads(features_file.read_text())
+        expected = _expected_features(msa_file)
+        assert msa_features["error"] is None
+        assert msa_features["sites"] == expected.n_sites
+        assert msa_features["patterns"] == expected.n_patterns
+        assert msa_features["entropy"] == expected.entropy
+        np.testing.assert_array_equal(
+            np.load(entropies_file), parse_msa(msa_file).column_entropy()
+        )
@@ -0,0 +1,112 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from predict.custom_types import DataType
+from predict.msa import AA_AMBIGUITY_MAP, DNA_AMBIGUITY_MAP, GAP, MSA
+
+# characters of the generated MSAs including ambiguity codes and gaps
+CHARS = {
+    DataType.DNA: b"ACGTACGTACGTURYKMSWBDHVN-?",
+    DataType.AA: b"ACDEFGHIKLMNPQRSTVWYACDEFGHIKLMNPQRSTVWYBZJX-",
+    DataType.MORPH: b"01234560123456-?",
+}
+
+
+def _random_msa(data_type: DataType, tmp_path, n_taxa: int = 9, n_sites: int = 300):
+    # sequences derived from a common ancestor, so that most distances are not saturated
+    rng = np.random.default_rng(0)
+    chars = np.frombuffer(CHARS[data_type], dtype="S1")
+    raw = np.repeat(rng.choice(chars, (1, n_sites)), n_taxa, axis=0)
+    mutated = rng.random(raw.shape) < np.linspace(0.05, 0.6, n_taxa)[:, np.newaxis]
+    raw[mutated] = rng.choice(chars, np.count_nonzero(mutated))
+    # a taxon without any site shared with the first taxon
+    raw[-1, : n_sites // 2] = b"-"
+    raw[0, n_sites // 2 :] = b"-"
+
+    msa_file = tmp_path / "msa.phy"
+    with msa_file.open("w") as f:
+        f.write(f"{n_taxa} {n_sites}\n")
+        for i, sequence in enumerate(raw):
+            f.write(f"taxon{i} {sequence.tobytes().decode()}\n")
+    return MSA(msa_file, data_type=data_type)
+
+
+def _reference_distances(msa: MSA, corrected: bool) -> np.ndarray:
+    # naive site-by-site distances: two characters match if they can be resolved to a common state,
+    # sites with a character that can be resolved to any state (gaps, N, X) are not compared
+    sequences = msa.sequences
+    if msa.data_type == DataType.DNA:
+        # U is normalized to T when parsing the MSA
+        charmap = {nt: chars for nt, chars in DNA_AMBIGUITY_MAP.items() if nt != b"U"}
+    elif msa.data_type == DataType.AA:
+        charmap = AA_AMBIGUITY_MAP
+    else:
+        states = sorted(set(sequences.flat) - {GAP})
+        charmap = {state: {ord(state), ord(GAP)} for state in states}
+    n_states = len(charmap)
+    resolved = {
+        char: {state for state, chars in charmap.items() if ord(char) in chars}
+        for char in set(sequences.flat)
+    }
+
+    distances = np.zeros((msa.n_taxa, msa.n_taxa))
+    for i, j in itertools.combinations_with_replacement(range(msa.n_taxa), 2):
+        comparable = mismatches = 0
+        for a, b in zip(sequences[i], sequences[j]):
+            if len(resolved[a]) == n_states or len(resolved[b]) == n_states:
+                continue
+            comparable += 1
+            mismatches += not resolved[a] & resolved[b]
+        if not comparable:
+            distance = math.nan
+        elif i == j:
+            # the distance of a taxon to itself is zero, even for characters that cannot be resolved to any state
+            distance = 0.0
+        else:
+            distance = mismatches / comparable
+        if corrected and comparable:
+            b = (n_states - 1) / n_states
+            distance = -b * math.log(1 - distance / b) if distance < b else math.inf
+        distances[i, j] = distances[j, i] = distance
+    return distances
+
+
+def _reference_treelikeness(distances: np.ndarray) -> float:
+    deltas = []
+    for x, y, u, v in itertools.combinations(range(distances.shape[0]), 4):
+        m3, m2, m1 = sorted(
+            [
+                distances[x, y] + distances[u, v],
+                distances[x, u] + distances[y, v],
+                distances[x, v] + distances[y, u],
+            ]
+        )
+        if not math.isfinite(m1):
+            continue
+        deltas.append((m1 - m2) / (m1 - m3) if m1 > m3 else 0.0)
+    return float(np.mean(deltas))
+
+
+@pytest.mark.parametrize("data_type", list(CHARS), ids=lambda data_type: data_type.name)
+@pytest.mark.parametrize("corrected", [False, True], ids=["p", "jc"])
+def test_pairwise_distances_match_naive_reference(data_type, corrected, tmp_path):
+    msa = _random_msa(data_type, tmp_path)
+    reference = _reference_distances(msa, corrected)
+    distances = msa.pairwise_distances(corrected=corrected, n_threads=2)
+
+    assert np.isnan(distances[0, -1]) and np.isnan(distances[-1, 0])
+    np.testing.assert_allclose(distances, reference, rtol=1e-12)
+
+
+@pytest.mark.parametrize("data_type", list(CHARS), ids=lambda data_type: data_type.name)
+@pytest.mark.parametrize("corrected", [False, True], ids=["p", "jc"])
+def test_treelikeness_matches_naive_reference(data_type, corrected, tmp_path):
+    msa = _random_msa(data_type, tmp_path)
+    reference = _reference_treelikeness(_reference_distances(msa, corrected))
+    # the MSA has fewer than 10000 quartets, so all quartets are used
+    assert msa.treelikeness_score(corrected=corrected, n_threads=2) == pytest.approx(
+        reference, rel=1e-12
+    )
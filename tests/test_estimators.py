@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from predict.custom_types import DataType
+from predict.msa import MSA
+
+
+def _write_phylip(path, raw):
+    with path.open("w") as f:
+        f.write(f"{raw.shape[0]} {raw.shape[1]}\n")
+        for i, sequence in enumerate(raw):
+            f.write(f"taxon{i} {sequence.tobytes().decode()}\n")
+
+
+@pytest.fixture(scope="module")
+def msa(tmp_path_factory):
+    # DNA MSA whose features vary along the sites: a gappy first half, a nearly invariant third quarter,
+    # full-gap sites, and a random last quarter
+    rng = np.random.default_rng(0)
+    n_taxa, n_sites = 10, 8000
+    raw = rng.choice(np.frombuffer(b"ACGTRY", "S1"), (n_taxa, n_sites))
+    raw[:, :4000][rng.random((n_taxa, 4000)) < 0.4] = b"-"
+    raw[:, 4000:6000] = raw[0, 4000:6000]
+    raw[:, 4000:6000][rng.random((n_taxa, 2000)) < 0.05] = b"N"
+    raw[:, 100:150] = b"-"
+    msa_file = tmp_path_factory.mktemp("estimators") / "msa.phy"
+    _write_phylip(msa_file, raw)
+    return MSA(msa_file, data_type=DataType.DNA)
+
+
+ESTIMATED_FEATURES = ["proportion_gaps", "proportion_invariant", "entropy"]
+
+
+@pytest.mark.parametrize("n_strata", [1, 4])
+def test_confidence_intervals_reach_nominal_coverage(msa, n_strata):
+    features = msa.compute_features()
+    n_seeds = 60
+    covered = dict.fromkeys(ESTIMATED_FEATURES, 0)
+    for seed in range(n_seeds):
+        estimates = msa.estimate_features(
+            precision=0.02, n_strata=n_strata, batch_size=256, seed=seed
+        )
+        assert estimates.n_sampled_sites < msa.n_sites
+        for name in ESTIMATED_FEATURES:
+            estimate = getattr(estimates, name)
+            covered[name] += estimate.lower <= getattr(features, name) <= estimate.upper
+
+    # 95% intervals, i.e. about 3 of the 60 intervals are expected to miss the true value
+    for name, n_covered in covered.items():
+        assert n_covered >= 54, name
+
+
+def test_estimates_are_exact_if_all_sites_are_sampled(msa):
+    features = msa.compute_features()
+    estimates = msa.estimate_features(precision=0.0, n_strata=3, seed=0)
+
+    assert estimates.n_sampled_sites == msa.n_sites
+    for name in ESTIMATED_FEATURES:
+        estimate = getattr(estimates, name)
+        assert estimate.value == pytest.approx(getattr(features, name), rel=1e-12)
+        assert estimate.lower == pytest.approx(estimate.value, rel=1e-12)
+        assert estimate.upper == pytest.approx(estimate.value, rel=1e-12)
+
+
+@pytest.mark.parametrize("n_strata", [1, 3])
+def test_max_sites_truncates_the_sample(msa, n_strata):
+    estimates = msa.estimate_features(
+        precision=0.0, n_strata=n_strata, batch_size=128, max_sites=500, seed=1
+    )
+    assert estimates.n_sampled_sites == 500
+    for name in ESTIMATED_FEATURES:
+        estimate = getattr(estimates, name)
+        assert estimate.lower < estimate.value < estimate.upper
+
+
+def test_pattern_estimate(msa, tmp_path):
+    assert msa.estimate_features(seed=0).n_patterns is None
+
+    n_patterns = msa.compute_features().n_patterns
+    estimate = msa.estimate_features(estimate_patterns=True, seed=0).n_patterns
+    # relative standard error of about 0.8% with 2^14 registers
+    assert abs(estimate.value - n_patterns) / n_patterns < 0.035
+    assert estimate.lower <= n_patterns <= estimate.upper
+
+    # few patterns are estimated by linear counting, the full-gap pattern is not counted
+    raw = np.repeat(
+        np.random.default_rng(1).choice(np.frombuffer(b"ACGT", "S1"), (8, 40)),
+        25,
+        axis=1,
+    )
+    raw[:, :30] = b"-"
+    _write_phylip(tmp_path / "few.phy", raw)
+    few = MSA(tmp_path / "few.phy", data_type=DataType.DNA)
+    n_patterns = few.compute_features().n_patterns
+    assert n_patterns == 39
+    estimate = few.estimate_features(estimate_patterns=True, seed=0).n_patterns
+    assert estimate.value == pytest.approx(n_patterns, abs=1)
@@ -0,0 +1,390 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from predict.custom_types import DataType, FileFormat
+from predict.msa import (
+    AA_AMBIGUITY_MAP,
+    COLUMN_ENTROPY_BINS,
+    COLUMN_ENTROPY_QUANTILES,
+    DNA_AMBIGUITY_MAP,
+    DNA_GAP_CHARS,
+    GAP,
+    GAP_CHARS,
+    MSA,
+    decode_column_entropies,
+    deduplicate_sequences,
+    encode_column_entropies,
+    remove_full_gap_sequences,
+    summarize_column_entropies,
+)
+
+# characters of the generated MSAs, the gap characters are normalized to GAP when parsing
+CHARS = {
+    DataType.DNA: b"ACGTACGTACGTURYKMSWBDHVN-?.",
+    DataType.AA: b"ACDEFGHIKLMNPQRSTVWYBZ-?X*",
+    DataType.MORPH: b"0123456789-?",
+}
+
+
+def _normalize(raw: np.ndarray, data_type: DataType) -> np.ndarray:
+    # normalization of the baseline parser
+    sequences = raw.copy()
+    gap_chars = DNA_GAP_CHARS if data_type == DataType.DNA else GAP_CHARS
+    for char in gap_chars:
+        sequences[sequences == char] = GAP
+    if data_type == DataType.DNA:
+        sequences[sequences == b"U"] = b"T"
+    return sequences
+
+
+def _reference_features(sequences: np.ndarray, data_type: DataType) -> dict:
+    # the per-site feature implementations of the baseline MSA class
+    n_taxa, n_sites = sequences.shape
+    columns = [column.tobytes() for column in sequences.T]
+
+    unique_columns = set(columns)
+    n_patterns = len(unique_columns) - ((GAP * n_taxa) in unique_columns)
+
+    non_full_gap = sequences[:, ~np.all(sequences.T == GAP, axis=1)]
+    proportion_gaps = np.sum(non_full_gap == GAP) / non_full_gap.size
+
+    charmap = {DataType.DNA: DNA_AMBIGUITY_MAP, DataType.AA: AA_AMBIGUITY_MAP}
+    non_gap_site_count = invariant_count = 0
+    for column in columns:
+        site = set(column)
+        if site == {ord(GAP)}:
+            continue
+        non_gap_site_count += 1
+        if any(
+            site.issubset(allowed) for allowed in charmap.get(data_type, {}).values()
+        ):
+            invariant_count += 1
+
+    site_entropies = []
+    for column in columns:
+        counter = Counter(column)
+        counter.pop(ord(GAP), None)
+        counts = np.array(list(counter.values()))
+        probabilities = counts / np.sum(counts)
+        site_entropies.append(-np.sum(probabilities * np.log2(probabilities)))
+
+    pattern_counts = np.array(list(Counter(columns).values()))
+    pattern_entropy = np.sum(pattern_counts * np.log(pattern_counts))
+    return {
+        "n_patterns": n_patterns,
+        "proportion_gaps": proportion_gaps,
+        "proportion_invariant": invariant_count / non_gap_site_count,
+        "column_entropies": np.array(site_entropies),
+        "entropy": np.mean(site_entropies),
+        "pattern_entropy": pattern_entropy,
+        "bollback": pattern_entropy - n_sites * math.log(n_sites),
+    }
+
+
+def _random_msa(
+    data_type: DataType, n_taxa: int = 12, n_sites: int = 600, seed: int = 0
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    chars = np.frombuffer(CHARS[data_type], dtype="S1")
+    raw = rng.choice(chars, size=(n_taxa, n_sites))
+    # (nearly) invariant sites, repeated patterns, full-gap sites, and duplicate and full-gap sequences
+    raw[:, :100] = raw[0, :100]
+    raw[1::3, :100] = chars[-2]
+    raw[:, 100:200] = raw[:, 200:300]
+    raw[:, 300:310] = b"-"
+    raw[2] = raw[0]
+    raw[5] = b"-"
+    return raw
+
+
+@pytest.fixture(params=list(CHARS), ids=lambda data_type: data_type.name)
+def msa_file(request, tmp_path):
+    data_type = request.param
+    raw = _random_msa(data_type)
+    taxa = np.array([f"taxon{i}" for i in range(raw.shape[0])])
+    msa_file = tmp_path / "msa.phy"
+    with msa_file.open("w") as f:
+        f.write(f"{raw.shape[0]} {raw.shape[1]}\n")
+        for taxon, sequence in zip(taxa, raw):
+            f.write(f"{taxon} {sequence.tobytes().decode()}\n")
+    return msa_file, data_type, _normalize(raw, data_type)
+
+
+def _assert_features_match(features, reference: dict) -> None:
+    assert features.n_patterns == reference["n_patterns"]
+    for name in (
+        "proportion_gaps",
+        "proportion_invariant",
+        "entropy",
+        "pattern_entropy",
+        "bollback",
+    ):
+        assert getattr(features, name) == pytest.approx(reference[name], rel=1e-12)
+
+
+def test_parse_msa_normalizes_like_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    assert msa.data_type == data_type
+    assert msa.taxa.tolist() == [f"taxon{i}" for i in range(sequences.shape[0])]
+    np.testing.assert_array_equal(msa.sequences, sequences)
+
+
+def test_parse_fasta_matches_phylip(msa_file, tmp_path):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    fasta_file = tmp_path / "msa.fasta"
+    with fasta_file.open("w") as f:
+        for taxon, sequence in zip(msa.taxa, sequences):
+            # sequences wrapped over several lines
+            sequence = sequence.tobytes().decode()
+            lines = [sequence[i : i + 60] for i in range(0, len(sequence), 60)]
+            f.write(f">{taxon}\n" + "\n".join(lines) + "\n")
+
+    fasta_msa = MSA(fasta_file, data_type=data_type)
+    assert fasta_msa.taxa.tolist() == msa.taxa.tolist()
+    np.testing.assert_array_equal(fasta_msa.sequences, sequences)
+
+
+def test_data_type_is_inferred_like_baseline(msa_file):
+    msa_file, data_type, _ = msa_file
+    assert MSA(msa_file).data_type == data_type
+
+
+def test_proportion_invariant_matches_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    reference = _reference_features(sequences, data_type)
+    msa = MSA(msa_file, data_type=data_type)
+    assert msa.proportion_invariant == pytest.approx(
+        reference["proportion_invariant"], rel=1e-12
+    )
+
+
+def test_entropy_matches_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    reference = _reference_features(sequences, data_type)
+    msa = MSA(msa_file, data_type=data_type)
+    assert msa.entropy() == pytest.approx(reference["entropy"], rel=1e-12)
+
+
+def test_site_counts(msa_file):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    for site in (0, 150, 305, 599):
+        counts = Counter(sequences[:, site].tolist())
+        expected = [counts.get(char, 0) for char in msa.alphabet]
+        np.testing.assert_array_equal(msa.site_counts[site], expected)
+
+
+def test_pattern_features_match_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    reference = _reference_features(sequences, data_type)
+    msa = MSA(msa_file, data_type=data_type)
+    assert msa.n_patterns == reference["n_patterns"]
+    assert msa.pattern_entropy() == pytest.approx(
+        reference["pattern_entropy"], rel=1e-12
+    )
+    assert msa.bollback_multinomial() == pytest.approx(reference["bollback"], rel=1e-12)
+
+
+def test_site_patterns_reconstruct_the_msa(msa_file):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    patterns = msa.site_patterns
+
+    np.testing.assert_array_equal(
+        patterns.patterns[:, patterns.site_pattern_index], sequences
+    )
+    assert patterns.weights.sum() == sequences.shape[1]
+    assert patterns.patterns.shape[1] == len(
+        {column.tobytes() for column in sequences.T}
+    )
+
+
+def test_compute_features_matches_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    reference = _reference_features(sequences, data_type)
+    msa = MSA(msa_file, data_type=data_type)
+
+    _assert_features_match(msa.compute_features(), reference)
+    assert msa.proportion_gaps == pytest.approx(reference["proportion_gaps"], rel=1e-12)
+
+
+@pytest.mark.parametrize("memory_budget", [None, 2**14])
+def test_blocked_features_are_identical(msa_file, memory_budget):
+    msa_file, data_type, _ = msa_file
+    expected = MSA(msa_file, data_type=data_type).compute_features()
+    msa = MSA(msa_file, data_type=data_type, memory_budget=memory_budget)
+
+    assert msa.compute_features() == expected
+    assert msa.compute_features(memory_budget=2**12) == expected
+
+
+@pytest.mark.parametrize("memory_budget", [None, 2**14])
+def test_parallel_features_are_identical(msa_file, memory_budget):
+    msa_file, data_type, _ = msa_file
+    expected = MSA(msa_file, data_type=data_type).compute_features()
+    msa = MSA(msa_file, data_type=data_type, memory_budget=memory_budget)
+
+    assert msa.compute_features(n_workers=2) == expected
+    assert msa.compute_features(memory_budget=2**12, n_workers=2) == expected
+
+
+def test_duplicate_and_full_gap_sequences(msa_file):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+
+    assert msa.contains_full_gap_sequences()
+    assert msa.contains_duplicate_sequences()
+    assert msa.get_duplicate_groups() == {"taxon0": ["taxon2"]}
+
+    without_gaps = remove_full_gap_sequences(msa)
+    np.testing.assert_array_equal(
+        without_gaps.sequences, np.delete(sequences, 5, axis=0)
+    )
+    deduplicated = deduplicate_sequences(msa)
+    np.testing.assert_array_equal(
+        deduplicated.sequences, np.delete(sequences, 2, axis=0)
+    )
+    # the baseline kept the same sequences, sorted lexicographically
+    np.testing.assert_array_equal(
+        np.unique(deduplicated.sequences, axis=0), np.unique(sequences, axis=0)
+    )
+
+
+def test_appended_features_match_full_computation(msa_file):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    n_taxa, n_sites = sequences.shape
+    taxa = msa.taxa
+
+    appended = MSA(taxa[:-3], sequences[:-3, :400].copy(), data_type, "appended")
+    for start in range(400, n_sites, 70):
+        appended.append_sites(sequences[:-3, start : start + 70])
+    appended.append_sequences(taxa[-3:], sequences[-3:])
+
+    expected = msa.compute_features()
+    features = appended.compute_features()
+    assert features.n_patterns == expected.n_patterns
+    for name in (
+        "proportion_gaps",
+        "proportion_invariant",
+        "entropy",
+        "pattern_entropy",
+        "bollback",
+    ):
+        assert getattr(features, name) == pytest.approx(
+            getattr(expected, name), rel=1e-12
+        )
+
+
+def test_column_entropy_matches_baseline(msa_file):
+    msa_file, data_type, sequences = msa_file
+    reference = _reference_features(sequences, data_type)
+    msa = MSA(msa_file, data_type=data_type)
+
+    np.testing.assert_allclose(
+        msa.column_entropy(), reference["column_entropies"], rtol=1e-6, atol=1e-7
+    )
+
+
+def test_column_entropy_encoding_round_trip(msa_file):
+    msa_file, data_type, _ = msa_file
+    rng = np.random.default_rng(0)
+    # column entropies of the MSA, tiny (subnormal in float16) and large (up to 6 bits for 64 states) entropies
+    column_entropies = np.concatenate(
+        [
+            MSA(msa_file, data_type=data_type).column_entropy(),
+            np.array([0.0, 1e-7, 3e-5, 2**-14, 1.0, 6.0], dtype=np.float32),
+            rng.uniform(0, 6, 1000).astype(np.float32),
+        ]
+    )
+    blob = encode_column_entropies(column_entropies)
+    decoded = decode_column_entropies(blob)
+
+    assert len(blob) == 2 * column_entropies.shape[0]
+    assert decoded.dtype == np.float32
+    # float16 rounding: relative error of at most 2^-11 for normal values, absolute error of at most 2^-25 below
+    np.testing.assert_allclose(decoded, column_entropies, rtol=2**-11, atol=2**-25)
+    assert decoded[column_entropies == 0].max() == 0
+    assert decode_column_entropies(encode_column_entropies(decoded)).tobytes() == (
+        decoded.tobytes()
+    )
+    assert decode_column_entropies(encode_column_entropies(np.empty(0))).shape == (0,)
+
+
+def test_summarize_column_entropies(msa_file):
+    msa_file, data_type, _ = msa_file
+    column_entropies = MSA(msa_file, data_type=data_type).column_entropy()
+    # entropies above the last bin edge are counted in the last bin
+    column_entropies = np.append(column_entropies, np.float32(7.5))
+    summary = summarize_column_entropies(column_entropies)
+
+    np.testing.assert_allclose(
+        summary.quantiles,
+        [np.quantile(column_entropies, q) for q in COLUMN_ENTROPY_QUANTILES],
+    )
+    assert summary.quantiles[-1] == pytest.approx(7.5)
+    assert summary.histogram.sum() == column_entropies.shape[0]
+    assert summary.histogram.shape == (COLUMN_ENTROPY_BINS.shape[0] - 1,)
+    for i, (low, high) in enumerate(zip(COLUMN_ENTROPY_BINS, COLUMN_ENTROPY_BINS[1:])):
+        in_bin = (column_entropies >= low) & (column_entropies < high)
+        if i == len(COLUMN_ENTROPY_BINS) - 2:
+            in_bin |= column_entropies >= high
+        assert summary.histogram[i] == np.count_nonzero(in_bin)
+
+    empty = summarize_column_entropies(np.empty(0, dtype=np.float32))
+    assert np.all(np.isnan(empty.quantiles))
+    assert empty.quantiles.shape == (len(COLUMN_ENTROPY_QUANTILES),)
+    np.testing.assert_array_equal(
+        empty.histogram, np.zeros(COLUMN_ENTROPY_BINS.shape[0] - 1)
+    )
+
+
+def test_cache_round_trip(msa_file, tmp_path):
+    msa_file, data_type, sequences = msa_file
+    cache_dir = tmp_path / "cache"
+    expected = MSA(msa_file, data_type=data_type).compute_features()
+
+    MSA(msa_file, data_type=data_type, cache_dir=cache_dir).compute_features()
+    cached = MSA(msa_file, data_type=data_type, cache_dir=cache_dir)
+    assert cached._cache_file is not None
+    np.testing.assert_array_equal(cached.sequences, sequences)
+    assert cached.compute_features() == expected
+
+
+def test_cache_updates_do_not_rewrite_the_matrix(msa_file, tmp_path):
+    msa_file, data_type, _ = msa_file
+    cache_dir = tmp_path / "cache"
+    msa = MSA(msa_file, data_type=data_type, cache_dir=cache_dir)
+    cache_file = msa._cache_file
+    stat = cache_file.stat()
+
+    features = msa.compute_features()
+    deduplicate_sequences(msa)
+    assert cache_file.stat().st_ino == stat.st_ino
+    assert cache_file.stat().st_mtime_ns == stat.st_mtime_ns
+
+    # the results computed later are loaded from the sidecar file
+    cached = MSA(msa_file, data_type=data_type, cache_dir=cache_dir)
+    assert cached._cached_features == features
+    assert "sequence_index" in cached.__dict__
+
+
+def test_cache_is_opt_in(msa_file):
+    msa_file, data_type, _ = msa_file
+    assert MSA(msa_file, data_type=data_type)._cache_file is None
+
+
+def test_write_round_trip(msa_file, tmp_path):
+    msa_file, data_type, sequences = msa_file
+    msa = MSA(msa_file, data_type=data_type)
+    for file_format in (FileFormat.PHYLIP, FileFormat.FASTA):
+        output_file = tmp_path / f"written.{file_format.value}"
+        msa.write(output_file, file_format)
+        np.testing.assert_array_equal(
+            MSA(output_file, data_type=data_type).sequences, sequences
+        )
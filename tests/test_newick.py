@@ -0,0 +1,63 @@
+import io
+import pathlib
+
+import numpy as np
+import pytest
+from Bio import Phylo
+
+from predict.newick import get_tree_stats, parse_newick
+
+EXAMPLE_TREES = pathlib.Path(__file__).resolve().parent.parent / "example.trees"
+
+
+def _random_newick(n_taxa: int, seed: int) -> str:
+    # random binary tree with random (some zero or missing) branch lengths
+    rng = np.random.default_rng(seed)
+    subtrees = [f"t{i}:{rng.exponential(0.1):.6f}" for i in range(n_taxa)]
+    while len(subtrees) > 3:
+        i, j = sorted(rng.choice(len(subtrees), 2, replace=False))
+        right, left = subtrees.pop(j), subtrees.pop(i)
+        length = ["", ":0", f":{rng.exponential(0.05):.6f}"][rng.integers(3)]
+        subtrees.append(f"({left},{right}){length}")
+    return f"({','.join(subtrees)});"
+
+
+def _bio_branch_lengths(newick_str: str) -> list[float]:
+    # the branch lengths the baseline tree_metrics functions were computed from
+    tree = Phylo.read(io.StringIO(newick_str), "newick")
+    return [clade.branch_length for clade in tree.find_clades(branch_length=True)]
+
+
+def _newick_strs() -> list[str]:
+    example_trees = EXAMPLE_TREES.read_text().split()
+    return example_trees + [
+        _random_newick(n_taxa, seed) for seed, n_taxa in enumerate([4, 10, 57, 300])
+    ]
+
+
+@pytest.mark.parametrize("newick_str", _newick_strs())
+def test_parse_newick_matches_biopython(newick_str):
+    tree = parse_newick(newick_str)
+    bio_tree = Phylo.read(io.StringIO(newick_str), "newick")
+
+    assert sorted(tree.taxa) == sorted(clade.name for clade in bio_tree.get_terminals())
+    assert np.count_nonzero(tree.parents == -1) == 1
+    branch_lengths = tree.branch_lengths[
+        ~np.isnan(tree.branch_lengths) & (tree.branch_lengths != 0)
+    ]
+    np.testing.assert_allclose(
+        np.sort(branch_lengths), np.sort(_bio_branch_lengths(newick_str))
+    )
+
+
+@pytest.mark.parametrize("newick_str", _newick_strs())
+def test_tree_stats_match_baseline(newick_str):
+    stats = get_tree_stats(newick_str)
+    branch_lengths = _bio_branch_lengths(newick_str)
+
+    assert stats.n_taxa == len(parse_newick(newick_str).taxa)
+    assert stats.total_branch_length == pytest.approx(sum(branch_lengths))
+    assert stats.minimum_branch_length == pytest.approx(min(branch_lengths))
+    assert stats.maximum_branch_length == pytest.approx(max(branch_lengths))
+    assert stats.average_branch_length == pytest.approx(np.mean(branch_lengths))
+    assert stats.std_branch_length == pytest.approx(np.std(branch_lengths))
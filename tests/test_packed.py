@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from predict.custom_types import DataType
+from predict.msa import MSA, deduplicate_sequences, remove_full_gap_sequences
+from predict.packed import PackedDNA
+
+
+def _random_dna(ambiguity: float, seed: int = 0) -> MSA:
+    rng = np.random.default_rng(seed)
+    n_taxa, n_sites = 16, 1001
+    codes = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), size=(n_taxa, n_sites))
+    ambiguous = rng.random((n_taxa, n_sites)) < ambiguity
+    codes[ambiguous] = rng.choice(
+        np.frombuffer(b"RYKMSWBDHV-", dtype=np.uint8), size=np.count_nonzero(ambiguous)
+    )
+    codes[:, :50] = codes[0, :50]
+    codes[:, 50:60] = ord("-")
+    codes[3] = codes[1]
+    codes[7] = ord("-")
+    taxa = np.array([f"taxon{i}" for i in range(n_taxa)])
+    return MSA(taxa, codes, DataType.DNA, "random")
+
+
+@pytest.fixture(
+    params=[(0.01, 2), (0.01, 4), (0.3, None)], ids=["2-bit", "4-bit", "auto"]
+)
+def msas(request):
+    ambiguity, bits = request.param
+    msa = _random_dna(ambiguity)
+    packed = _random_dna(ambiguity)
+    packed.pack(bits)
+    assert packed.packed is not None
+    return msa, packed
+
+
+def test_pack_round_trip(msas):
+    msa, packed = msas
+    np.testing.assert_array_equal(packed.codes, msa.codes)
+    np.testing.assert_array_equal(packed.packed.unpack(100, 357), msa.codes[:, 100:357])
+    sites = np.array([0, 5, 64, 65, 500, 1000])
+    np.testing.assert_array_equal(packed.packed.take(sites), msa.codes[:, sites])
+    np.testing.assert_array_equal(packed.packed.unpack_sequence(4), msa.codes[4])
+    np.testing.assert_array_equal(
+        PackedDNA.from_codes(msa.codes, packed.packed.bits).unpack(), msa.codes
+    )
+
+
+def test_packed_features_match_unpacked(msas):
+    msa, packed = msas
+    assert packed.compute_features() == msa.compute_features()
+    assert (
+        packed.compute_features(memory_budget=2**12, n_workers=2)
+        == msa.compute_features()
+    )
+    np.testing.assert_array_equal(packed.column_entropy(), msa.column_entropy())
+    np.testing.assert_array_equal(packed.site_counts, msa.site_counts)
+    np.testing.assert_array_equal(packed.pairwise_distances(), msa.pairwise_distances())
+    assert packed.treelikeness_score(seed=0) == msa.treelikeness_score(seed=0)
+
+
+def test_packed_patterns_and_sequence_index_match_unpacked(msas):
+    msa, packed = msas
+    for name in ("patterns", "weights", "site_pattern_index"):
+        np.testing.assert_array_equal(
+            getattr(packed.site_patterns, name), getattr(msa.site_patterns, name)
+        )
+    for name in ("representatives", "full_gap"):
+        np.testing.assert_array_equal(
+            getattr(packed.sequence_index, name), getattr(msa.sequence_index, name)
+        )
+    np.testing.assert_array_equal(
+        remove_full_gap_sequences(packed).codes, remove_full_gap_sequences(msa).codes
+    )
+    np.testing.assert_array_equal(
+        deduplicate_sequences(packed).codes, deduplicate_sequences(msa).codes
+    )
+
+
+def test_packed_data_matrix_is_read_only(msas):
+    _, packed = msas
+    with pytest.raises(ValueError):
+        packed.codes[0, 0] = ord("A")
+    with pytest.raises(ValueError):
+        packed.sequences[0, 0] = b"A"
+
+
+def test_appending_to_packed_msa(msas):
+    msa, packed = msas
+    new_sites = msa.sequences[:, :30].copy()
+    msa.append_sites(new_sites)
+    packed.append_sites(new_sites)
+    assert packed.compute_features() == msa.compute_features()
+    np.testing.assert_array_equal(packed.codes, msa.codes)
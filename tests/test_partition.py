@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from predict.custom_types import DataType
+from predict.msa import MSA
+from predict.partition import parse_partition_file
+
+RAXMLNG_PARTITIONS = """GTR+G, dna = 1-100, 151-200
+LG+G4, prot = 201-400
+GTR+G, codon = 102-150\\3
+"""
+
+NEXUS_PARTITIONS = """#NEXUS
+begin sets;
+    charset dna = 1-100 151-200;
+    charset prot = msa.phy: 201-400;
+    charset codon = 102-150\\3;
+    charpartition mine = GTR+G:dna, LG+G4:prot, GTR+G:codon;
+end;
+"""
+
+
+def _write_phylip(path, taxa, raw):
+    with path.open("w") as f:
+        f.write(f"{raw.shape[0]} {raw.shape[1]}\n")
+        for taxon, sequence in zip(taxa, raw):
+            f.write(f"{taxon} {sequence.tobytes().decode()}\n")
+
+
+@pytest.fixture
+def partitioned(tmp_path):
+    # protein MSA whose first 200 sites are nucleotides, including N which is a gap in DNA but a state in AA data
+    rng = np.random.default_rng(0)
+    n_taxa = 10
+    raw = np.concatenate(
+        [
+            rng.choice(np.frombuffer(b"ACGTN-", dtype="S1"), size=(n_taxa, 200)),
+            rng.choice(np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY-X", "S1"), (n_taxa, 200)),
+        ],
+        axis=1,
+    )
+    raw[:, 10:20] = raw[0, 10:20]
+    raw[:, 300:305] = b"-"
+    taxa = np.array([f"taxon{i}" for i in range(n_taxa)])
+    msa_file = tmp_path / "msa.phy"
+    _write_phylip(msa_file, taxa, raw)
+    partition_file = tmp_path / "partitions.txt"
+    partition_file.write_text(RAXMLNG_PARTITIONS)
+    return msa_file, partition_file, taxa, raw
+
+
+def test_parse_partition_file(partitioned, tmp_path):
+    _, partition_file, _, _ = partitioned
+    partitions = parse_partition_file(partition_file)
+
+    assert [p.name for p in partitions] == ["dna", "prot", "codon"]
+    assert [p.data_type for p in partitions] == [
+        DataType.DNA,
+        DataType.AA,
+        DataType.DNA,
+    ]
+    np.testing.assert_array_equal(
+        partitions[0].sites, np.r_[np.arange(0, 100), np.arange(150, 200)]
+    )
+    np.testing.assert_array_equal(partitions[1].sites, np.arange(200, 400))
+    np.testing.assert_array_equal(partitions[2].sites, np.arange(101, 150, 3))
+
+    nexus_file = tmp_path / "partitions.nex"
+    nexus_file.write_text(NEXUS_PARTITIONS)
+    nexus_partitions = parse_partition_file(nexus_file)
+    assert [(p.name, p.model, p.data_type) for p in nexus_partitions] == [
+        (p.name, p.model, p.data_type) for p in partitions
+    ]
+    for nexus_partition, partition in zip(nexus_partitions, partitions):
+        np.testing.assert_array_equal(nexus_partition.sites, partition.sites)
+
+
+def test_partition_features_match_sliced_msas(partitioned, tmp_path):
+    msa_file, partition_file, taxa, raw = partitioned
+    msa = MSA(msa_file, data_type=DataType.AA, partitions=partition_file)
+    partition_features = msa.compute_partition_features()
+
+    assert list(partition_features.partitions) == ["dna", "prot", "codon"]
+    for partition in msa.partitions:
+        # the sites of the partition parsed on their own with the data type of the partition
+        sliced_file = tmp_path / f"{partition.name}.phy"
+        _write_phylip(sliced_file, taxa, raw[:, partition.sites])
+        sliced = MSA(sliced_file, data_type=partition.data_type)
+        expected = sliced.compute_features()
+
+        assert partition_features.partitions[partition.name] == expected
+        partition_msa = msa.get_partition(partition.name)
+        assert partition_msa.data_type == partition.data_type
+        np.testing.assert_array_equal(partition_msa.codes, sliced.codes)
+        assert partition_msa.compute_features() == expected
+
+    total = partition_features.total
+    n_sites = [f.n_sites for f in partition_features.partitions.values()]
+    assert total.n_sites == sum(n_sites) == 150 + 200 + 17
+    assert total.entropy == pytest.approx(
+        np.average(
+            [f.entropy for f in partition_features.partitions.values()],
+            weights=n_sites,
+        )
+    )
+
+
+def test_partition_features_total_matches_unpartitioned(partitioned, tmp_path):
+    msa_file, _, _, _ = partitioned
+    # partitions of the data type of the MSA covering all sites
+    partition_file = tmp_path / "all.txt"
+    partition_file.write_text(
+        "LG, first = 1-150, 301-400\nLG, odd = 151-300\\2\nLG, even = 152-300\\2\n"
+    )
+    msa = MSA(msa_file, data_type=DataType.AA, partitions=partition_file)
+    assert sum(p.n_sites for p in msa.partitions) == msa.n_sites
+
+    total = msa.compute_partition_features(memory_budget=2**12).total
+    assert total == MSA(msa_file, data_type=DataType.AA).compute_features()
+
+
+def test_invalid_partitions(partitioned, tmp_path):
+    msa_file, _, _, _ = partitioned
+    partition_file = tmp_path / "overlapping.txt"
+    partition_file.write_text("LG, a = 1-200\nLG, b = 150-400\n")
+    with pytest.raises(Exception, match="overlap"):
+        MSA(msa_file, partitions=partition_file)
+
+    partition_file.write_text("LG, a = 1-500\n")
+    with pytest.raises(Exception, match="exceeds"):
+        MSA(msa_file, partitions=partition_file)
@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import predict.probe
+from predict.custom_types import DataType, FileFormat
+from predict.msa import parse_msa
+from predict.probe import probe_msa, probe_msas
+
+# characters of the generated MSAs, including lowercase, ambiguity, and gap characters
+CHARS = {
+    DataType.DNA: b"ACGTacgtURYKMSWBDHVN-?.",
+    DataType.AA: b"ACDEFGHIKLMNPQRSTVWYacdBZX-?*",
+    DataType.MORPH: b"0123456789-?",
+}
+
+
+def _write_msa(path, data_type, file_format, n_taxa=7, n_sites=130, seed=0):
+    rng = np.random.default_rng(seed)
+    raw = rng.choice(np.frombuffer(CHARS[data_type], "S1"), (n_taxa, n_sites))
+    sequences = [sequence.tobytes().decode() for sequence in raw]
+    with path.open("w") as f:
+        if file_format == FileFormat.PHYLIP:
+            f.write(f" {n_taxa} {n_sites}\n")
+            for i, sequence in enumerate(sequences):
+                f.write(f"taxon{i}  {sequence}\n")
+        else:
+            for i, sequence in enumerate(sequences):
+                # FASTA records with line breaks within the sequence
+                f.write(f">taxon{i}\n{sequence[:60]}\n{sequence[60:]}\n")
+    return path
+
+
+@pytest.fixture
+def msa_files(tmp_path):
+    files = []
+    for data_type in CHARS:
+        for file_format, suffix in [
+            (FileFormat.PHYLIP, "phy"),
+            (FileFormat.FASTA, "fasta"),
+        ]:
+            path = tmp_path / f"{data_type.value}.{suffix}"
+            files.append(_write_msa(path, data_type, file_format))
+    return files
+
+
+def test_probe_matches_parse_msa(msa_files):
+    for msa_file in msa_files:
+        msa = parse_msa(msa_file)
+        for max_bytes in [2**24, None]:
+            probed = probe_msa(msa_file, max_bytes=max_bytes)
+            assert probed.file_format == (
+                FileFormat.FASTA if msa_file.suffix == ".fasta" else FileFormat.PHYLIP
+            )
+            assert (probed.n_taxa, probed.n_sites) == (msa.n_taxa, msa.n_sites)
+            assert probed.data_type == msa.data_type
+            assert probed.raxmlng_model == msa.get_raxmlng_model()
+
+
+def test_manifest_is_reused_until_the_files_change(msa_files, tmp_path, monkeypatch):
+    manifest_file = tmp_path / "manifest.json"
+    probed_files = []
+
+    def counting_probe_msa(msa_file, *args, **kwargs):
+        probed_files.append(msa_file.name)
+        return probe_msa(msa_file, *args, **kwargs)
+
+    monkeypatch.setattr(predict.probe, "probe_msa", counting_probe_msa)
+
+    metadata = probe_msas(msa_files, manifest_file)
+    assert sorted(probed_files) == sorted(f.name for f in msa_files)
+    assert list(metadata) == [str(f) for f in msa_files]
+    assert len(json.loads(manifest_file.read_text())["entries"]) == len(msa_files)
+
+    # unchanged files are read from the manifest
+    probed_files.clear()
+    assert probe_msas(msa_files, manifest_file) == metadata
+    assert probed_files == []
+
+    # a file with a different size
+    _write_msa(msa_files[0], DataType.DNA, FileFormat.PHYLIP, n_sites=200)
+    # a file with the same size but a different modification time
+    stat = msa_files[1].stat()
+    _write_msa(msa_files[1], DataType.DNA, FileFormat.FASTA, seed=1)
+    os.utime(msa_files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert msa_files[1].stat().st_size == stat.st_size
+
+    probed_files.clear()
+    updated = probe_msas(msa_files, manifest_file)
+    assert probed_files == [msa_files[0].name, msa_files[1].name]
+    assert updated[str(msa_files[0])].n_sites == 200
+    for msa_file in msa_files:
+        assert updated[str(msa_file)] == probe_msa(msa_file)
+
+    # the updated manifest is used by the next call
+    probed_files.clear()
+    assert probe_msas(msa_files, manifest_file) == updated
+    assert probed_files == []
+
+    # another scan bound invalidates the entries
+    probe_msas(msa_files[:1], manifest_file, max_bytes=None)
+    assert probed_files == [msa_files[0].name]
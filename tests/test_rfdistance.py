@@ -0,0 +1,139 @@
+import io
+import itertools
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from Bio import Phylo
+
+from predict.rfdistance import (
+    TopologyClusters,
+    TopologyIndex,
+    cluster_topologies,
+    compute_rfdistances,
+    read_trees,
+)
+
+IQTREE = shutil.which("iqtree2") or shutil.which("iqtree")
+
+
+def _random_newick(taxa: list[str], rng: np.random.Generator) -> str:
+    # random binary tree with branch lengths, randomly rooted at a trifurcation
+    subtrees = [f"{taxon}:{rng.exponential(0.1):.4f}" for taxon in taxa]
+    while len(subtrees) > 3:
+        i, j = sorted(rng.choice(len(subtrees), 2, replace=False))
+        right, left = subtrees.pop(j), subtrees.pop(i)
+        subtrees.append(f"({left},{right}):{rng.exponential(0.1):.4f}")
+    return f"({','.join(subtrees)});"
+
+
+def _reroot(newick_str: str, taxon: str) -> str:
+    # the same unrooted topology with another rooting and child order
+    tree = Phylo.read(io.StringIO(newick_str), "newick")
+    tree.root_with_outgroup(taxon)
+    for clade in tree.find_clades():
+        clade.clades.reverse()
+    return tree.format("newick").strip()
+
+
+def _bipartitions(newick_str: str) -> set[frozenset[str]]:
+    # non-trivial bipartitions of the unrooted tree, each as the side not containing the first taxon (Bio.Phylo)
+    tree = Phylo.read(io.StringIO(newick_str), "newick")
+    taxa = frozenset(clade.name for clade in tree.get_terminals())
+    first = min(taxa)
+    bipartitions = set()
+    for clade in tree.find_clades():
+        side = frozenset(leaf.name for leaf in clade.get_terminals())
+        if first in side:
+            side = taxa - side
+        if 1 < len(side) < len(taxa) - 1:
+            bipartitions.add(side)
+    return bipartitions
+
+
+@pytest.fixture
+def trees():
+    rng = np.random.default_rng(0)
+    taxa = [f"t{i}" for i in range(12)]
+    trees = [_random_newick(taxa, rng) for _ in range(8)]
+    # repeated topologies with other rootings, child orders, and branch lengths
+    trees += [_reroot(trees[1], "t3"), _reroot(trees[4], "t7"), trees[1]]
+    return trees
+
+
+def test_rfdistances_match_bipartitions(trees):
+    rfdistances = compute_rfdistances(trees)
+    bipartitions = [_bipartitions(tree) for tree in trees]
+    expected = np.array([[len(a ^ b) for b in bipartitions] for a in bipartitions])
+
+    np.testing.assert_array_equal(rfdistances.distances, expected)
+    n_taxa = 12
+    assert rfdistances.max_rfdist == 2 * (n_taxa - 3)
+    pairs = expected[np.triu_indices(len(trees), k=1)]
+    assert rfdistances.avg_rfdist == pytest.approx(pairs.mean())
+    assert rfdistances.avg_rel_rfdist == pytest.approx(
+        pairs.mean() / (2 * (n_taxa - 3))
+    )
+    assert rfdistances.num_topos == len(set(map(frozenset, bipartitions)))
+    # the rerooted and repeated trees have the topologies of the first eight trees
+    assert rfdistances.num_topos == 8
+
+
+def test_topology_clusters(trees, tmp_path):
+    rfdistances = compute_rfdistances(trees)
+    clusters = cluster_topologies(trees)
+
+    np.testing.assert_array_equal(clusters.clusters, rfdistances.topologies)
+    assert clusters.num_topos == rfdistances.num_topos
+    for i, j in itertools.combinations(range(len(trees)), 2):
+        assert (clusters.clusters[i] == clusters.clusters[j]) == (
+            rfdistances.distances[i, j] == 0
+        )
+    np.testing.assert_array_equal(
+        clusters.clusters[clusters.representatives], np.arange(clusters.num_topos)
+    )
+
+    cluster_file = tmp_path / "clusters.tsv"
+    clusters.save(cluster_file)
+    loaded = TopologyClusters.load(cluster_file)
+    np.testing.assert_array_equal(loaded.clusters, clusters.clusters)
+    np.testing.assert_array_equal(loaded.representatives, clusters.representatives)
+
+
+def test_topology_index(trees):
+    clusters = cluster_topologies(trees)
+    index = TopologyIndex(trees, clusters)
+
+    for i, tree in enumerate(trees):
+        assert index.cluster_of_tree(i) == clusters.clusters[i]
+        assert index.cluster_of(tree) == clusters.clusters[i]
+        # unknown Newick strings of a clustered topology are looked up by their topology key
+        assert index.cluster_of(_reroot(tree, "t5")) == clusters.clusters[i]
+
+
+def test_rfdistances_of_small_tree_sets():
+    assert compute_rfdistances([]).num_topos == 0
+    single = compute_rfdistances(["((A,B),(C,D),E);"])
+    assert single.num_topos == 1
+    assert single.avg_rel_rfdist == 0.0
+
+
+@pytest.mark.skipif(IQTREE is None, reason="IQ-TREE is not installed")
+def test_rfdistances_match_iqtree(trees, tmp_path):
+    trees_file = tmp_path / "trees.nwk"
+    trees_file.write_text("\n".join(trees) + "\n")
+    subprocess.run(
+        [IQTREE, "-rf_all", "-t", str(trees_file), "-pre", str(tmp_path / "rf")],
+        check=True,
+        capture_output=True,
+    )
+    lines = (tmp_path / "rf.rfdist").read_text().split("\n")[1:]
+    expected = np.array(
+        [line.split()[1:] for line in lines if line.strip()], dtype=np.int64
+    )
+
+    assert read_trees(trees_file) == trees
+    np.testing.assert_array_equal(
+        compute_rfdistances(read_trees(trees_file)).distances, expected
+    )
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from predict.custom_errors import PyPythiaException
+from predict.newick import get_tree_stats, parse_newick
+from predict.rfdistance import cluster_topologies, compute_rfdistances
+from predict.treeset import CompactTree, TreeSet
+
+
+def _random_newick(taxa: list[str], rng: np.random.Generator) -> str:
+    # random binary tree with branch lengths, randomly rooted at a trifurcation
+    subtrees = [f"{taxon}:{rng.exponential(0.1):.6f}" for taxon in taxa]
+    while len(subtrees) > 3:
+        i, j = sorted(rng.choice(len(subtrees), 2, replace=False))
+        right, left = subtrees.pop(j), subtrees.pop(i)
+        subtrees.append(f"({left},{right}):{rng.exponential(0.1):.6f}")
+    return f"({','.join(subtrees)});"
+
+
+@pytest.fixture
+def trees():
+    rng = np.random.default_rng(0)
+    taxa = [f"t{i}" for i in range(15)]
+    trees = [_random_newick(taxa, rng) for _ in range(10)]
+    return trees + [
+        # a repeated topology, other taxa, quoted taxon names, and missing branch lengths
+        trees[3],
+        _random_newick(taxa[5:] + ["x1", "x2"], rng),
+        "(('taxon a':0.5,'it''s':0.25):1,t1,(t2,t3)inner:0.125);",
+    ]
+
+
+def _assert_same_tree(tree: CompactTree, newick_str: str):
+    expected = parse_newick(newick_str)
+    np.testing.assert_array_equal(tree.parents, expected.parents)
+    np.testing.assert_array_equal(tree.taxa, expected.taxa)
+    np.testing.assert_array_equal(
+        tree.branch_lengths, expected.branch_lengths.astype(np.float32)
+    )
+
+
+def test_from_newick(trees):
+    treeset = TreeSet.from_newick(trees)
+    assert len(treeset) == len(trees)
+    # the taxa are in order of first occurrence
+    first_occurrence = list(
+        dict.fromkeys(taxon for tree in trees for taxon in parse_newick(tree).taxa)
+    )
+    assert treeset.taxa.tolist() == first_occurrence
+    assert {"x1", "x2", "taxon a", "it's"} <= set(treeset.taxa)
+    for tree, newick_str in zip(treeset, trees):
+        _assert_same_tree(tree, newick_str)
+    _assert_same_tree(treeset[-1], trees[-1])
+    with pytest.raises(IndexError):
+        treeset[len(trees)]
+
+
+def test_to_newick_round_trip(trees):
+    for newick_str in trees:
+        tree = CompactTree.from_newick(newick_str)
+        written = tree.to_newick()
+        # the labels of inner nodes are discarded, the branch lengths are written with float32 precision
+        _assert_same_tree(CompactTree.from_newick(written), newick_str)
+        assert CompactTree.from_newick(written).to_newick() == written
+    assert TreeSet.from_newick(trees).to_newick() == [
+        CompactTree.from_newick(newick_str).to_newick() for newick_str in trees
+    ]
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_load_round_trip(trees, tmp_path, mmap):
+    treeset = TreeSet.from_newick(trees)
+    treeset_file = tmp_path / "trees.bin"
+    treeset.save(treeset_file)
+    loaded = TreeSet.load(treeset_file, mmap=mmap)
+
+    assert isinstance(loaded.parents, np.memmap) == mmap
+    np.testing.assert_array_equal(loaded.taxa, treeset.taxa)
+    for name in ["offsets", "parents", "taxon_ids", "branch_lengths"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(treeset, name))
+    assert loaded.nbytes == treeset.nbytes
+    assert loaded.to_newick() == treeset.to_newick()
+
+    # an empty tree set
+    TreeSet.from_newick([]).save(treeset_file)
+    empty = TreeSet.load(treeset_file, mmap=mmap)
+    assert len(empty) == 0 and empty.total_branch_lengths().shape == (0,)
+
+    treeset_file.write_bytes(b"not a tree set")
+    with pytest.raises(PyPythiaException):
+        TreeSet.load(treeset_file, mmap=mmap)
+
+
+def test_total_branch_lengths(trees):
+    trees = trees + ["((A,B),(C,D));"]
+    totals = TreeSet.from_newick(trees).total_branch_lengths()
+    expected = [get_tree_stats(newick_str).total_branch_length for newick_str in trees]
+    np.testing.assert_allclose(totals, expected, rtol=1e-6)
+    assert totals[-1] == 0
+
+
+def test_rfdistances_match_newick_strings(trees):
+    # the trees with other taxa are not comparable
+    trees = trees[:11]
+    treeset = TreeSet.from_newick(trees)
+    expected = compute_rfdistances(trees)
+    rfdistances = treeset.rfdistances()
+
+    np.testing.assert_array_equal(rfdistances.distances, expected.distances)
+    assert rfdistances.num_topos == expected.num_topos == 10
+    assert rfdistances.avg_rel_rfdist == pytest.approx(expected.avg_rel_rfdist)
+
+    clusters = treeset.topology_clusters()
+    expected_clusters = cluster_topologies(trees)
+    np.testing.assert_array_equal(clusters.clusters, expected_clusters.clusters)
+    np.testing.assert_array_equal(
+        clusters.representatives, expected_clusters.representatives
+    )